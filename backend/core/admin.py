@@ -3,9 +3,34 @@ from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
+from django.db.models import Q
 from .models import User, StaffProfile, StudentProfile, Course
 
-class CustomUserAdmin(UserAdmin):
+
+class RollNumberSearchMixin:
+    """
+    Search terms that look like a roll number (one token mixing letters and
+    digits) are tried first as a prefix match on the unique username, which
+    PostgreSQL answers from its varchar_pattern_ops index instead of scanning
+    every row with ILIKE. When no username starts with the term, and for all
+    other terms (names, all-digit phone numbers), the regular search_fields
+    search runs, so substring and mobile number searches still work.
+    Used by the autocomplete widgets on the dues admin forms.
+    """
+    roll_number_lookup = 'username'
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if (term and ' ' not in term and '@' not in term
+                and any(ch.isdigit() for ch in term) and any(ch.isalpha() for ch in term)):
+            lookup = f'{self.roll_number_lookup}__startswith'
+            prefix_matches = queryset.filter(Q(**{lookup: term}) | Q(**{lookup: term.upper()}))
+            if prefix_matches.exists():
+                return prefix_matches, False
+        return super().get_search_results(request, queryset, search_term)
+
+
+class CustomUserAdmin(RollNumberSearchMixin, UserAdmin):
     list_display = ('username', 'email', 'full_name', 'user_type', 'is_active', 'last_login', 'date_joined')
     list_filter = ('is_student', 'is_staff', 'is_superuser', 'is_active', 'date_joined', 'last_login')
     search_fields = ('username', 'email', 'first_name', 'last_name')
@@ -82,7 +107,8 @@ class StaffProfileAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__email', 'user__first_name', 'user__last_name', 'phone_number')
     ordering = ('-join_date', 'user__username')
     readonly_fields = ('join_date', 'user_link')
-    raw_id_fields = ('user',)
+    autocomplete_fields = ('user',)
+    list_select_related = ('user',)
     
     fieldsets = (
         ('User Account', {
@@ -124,9 +150,16 @@ class StaffProfileAdmin(admin.ModelAdmin):
     user_link.short_description = "User Account"
 
 @admin.register(StudentProfile)
-class StudentProfileAdmin(admin.ModelAdmin):
+class StudentProfileAdmin(RollNumberSearchMixin, admin.ModelAdmin):
     list_display = ['user_roll_number', 'student_name', 'course', 'caste', 'gender', 'mobile_number', 'batch']
     search_fields = ['user__username', 'user__first_name', 'user__last_name', 'mobile_number']
+    autocomplete_fields = ['user']
+    ordering = ['user__username']
+    roll_number_lookup = 'user__username'
+
+    def get_queryset(self, request):
+        # __str__ and the autocomplete results both read user.username
+        return super().get_queryset(request).select_related('user', 'course')
 
     def user_roll_number(self, obj):
         return obj.user.username if obj.user else 'N/A'
@@ -1,35 +1,44 @@
 from django.contrib.auth.backends import ModelBackend
-from django.db.models import Q
 from .models import User
 
+
 class CustomAuthBackend(ModelBackend):
+    """
+    Staff log in with their email, students with their roll number (username).
+
+    The input shape decides which single indexed lookup to run, and unknown
+    users still pay one password hash so response time doesn't reveal which
+    accounts exist.
+    """
+
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            # Try to fetch the user by email or username (roll number)
-            user = User.objects.get(
-                Q(email=username) | Q(username=username)
-            )
-            
-            # Check if the user exists and password is correct
-            if user and user.check_password(password):
-                # For staff login (using email)
-                if '@' in str(username):
-                    if user.is_staff:
-                        return user
-                    return None  # Email login attempted but user is not staff
-                
-                # For student login (using roll number stored in username)
-                else:
-                    if user.is_student:
-                        return user
-                    return None  # Roll number login attempted but user is not student
-            
+        if not username or password is None:
             return None
-        except User.DoesNotExist:
+        username = str(username).strip()
+        is_email = '@' in username
+
+        if is_email:
+            # Staff login (email)
+            # iexact: normalize_email only lower-cases the domain part
+            user = User.objects.filter(email__iexact=username, is_staff=True).first()
+        else:
+            # Student login (roll number stored in username)
+            user = User.objects.filter(username=username, is_student=True).first()
+
+        if user is None:
+            User().set_password(password)
             return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
 
     def get_user(self, user_id):
         try:
             return User.objects.get(pk=user_id)
         except User.DoesNotExist:
-            return None 
\ No newline at end of file
+            return None
+
+
+# Backend instance used by the API login views directly, so a failed login
+# doesn't fall through to ModelBackend for a second lookup and hash
+login_backend = CustomAuthBackend()
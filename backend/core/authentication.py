@@ -0,0 +1,218 @@
+"""
+Stateless JWT authentication.
+
+Login embeds the fields most views need (user type, department, profile id)
+as token claims. Authenticated requests then get a lightweight ClaimsUser
+built from the token instead of a `core.User` loaded by primary key; the full
+model is only fetched if a view touches an attribute the token doesn't carry.
+
+Authorization-relevant state (is_active, is_student, is_staff, is_superuser,
+department) is not trusted from the token, which may be weeks old: it comes
+from ActiveUserCache, refreshed from the database every
+JWT_ACTIVE_CHECK_SECONDS, so a demoted or deactivated user loses access
+within that window.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import StaffProfile, StudentProfile, User
+from .revocation import revoked_tokens
+
+
+def user_claims(user):
+    """Claims embedded in tokens issued to `user`"""
+    claims = {
+        'username': user.username,
+        'is_student': user.is_student,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+        'department': None,
+        'profile_id': None,
+    }
+    if user.is_student:
+        claims['profile_id'] = StudentProfile.objects.filter(user=user).values_list('id', flat=True).first()
+    elif user.is_staff:
+        profile = StaffProfile.objects.filter(user=user).values_list('id', 'department').first()
+        if profile:
+            claims['profile_id'], claims['department'] = profile
+    return claims
+
+
+class RevocableRefreshToken(RefreshToken):
+    """RefreshToken that fails verification once its JTI has been revoked"""
+
+    def verify(self):
+        super().verify()
+        if revoked_tokens.is_revoked(self.get(api_settings.JTI_CLAIM)):
+            raise TokenError(_("Token has been revoked"))
+
+
+def issue_tokens(user):
+    """Return a RefreshToken for `user` carrying the profile claims (copied into its access tokens)"""
+    refresh = RevocableRefreshToken.for_user(user)
+    for claim, value in user_claims(user).items():
+        refresh[claim] = value
+    return refresh
+
+
+class ClaimsUser(TokenUser):
+    """
+    Request user backed by token claims and the cached account state.
+
+    The role flags and department come from `account` (see ActiveUserCache)
+    when given, otherwise from the claims. id, username and profile_id are
+    read from the claims. Anything else, e.g. `email` or `student_profile`,
+    is read from the full User model, which is loaded once on first use.
+    Tokens issued before the claims existed fall back to the model.
+    """
+
+    def __init__(self, token, account=None):
+        super().__init__(token)
+        self.account = account
+
+    def _claim(self, name):
+        if self.account is not None and name in self.account:
+            return self.account[name]
+        if name in self.token:
+            return self.token[name]
+        return getattr(self.user, name)
+
+    @cached_property
+    def user(self):
+        """The full core.User row (one query, only when needed)"""
+        return User.objects.get(pk=self.id)
+
+    @cached_property
+    def username(self):
+        return self._claim('username')
+
+    @cached_property
+    def is_student(self):
+        return self._claim('is_student')
+
+    @cached_property
+    def is_staff(self):
+        return self._claim('is_staff')
+
+    @cached_property
+    def is_superuser(self):
+        return self._claim('is_superuser')
+
+    @cached_property
+    def department(self):
+        if self.account is not None:
+            return self.account['department']
+        return self.token.get('department')
+
+    @cached_property
+    def profile_id(self):
+        return self.token.get('profile_id')
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        return getattr(self.user, attr)
+
+    def __eq__(self, other):
+        if isinstance(other, TokenUser):
+            return self.id == other.id
+        if isinstance(other, User):
+            return self.id == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        return str(self.username)
+
+
+class ActiveUserCache:
+    """
+    Per-worker cache of each user's account state (is_active, role flags and
+    staff department), so a deactivated or demoted account is locked out
+    within `ttl` seconds without a query on every request.
+    """
+    fields = ('is_active', 'is_student', 'is_staff', 'is_superuser', 'staff_profile__department')
+
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def account(self, user_id):
+        """
+        Returns:
+            dict: is_active, is_student, is_staff, is_superuser and department
+                of the user, or None if it no longer exists
+        """
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry and now - entry[1] < self.ttl:
+            return entry[0]
+        row = User.objects.filter(pk=user_id).values_list(*self.fields).first()
+        account = None
+        if row is not None:
+            account = dict(zip(('is_active', 'is_student', 'is_staff', 'is_superuser'), row[:4]))
+            account['department'] = row[4] if account['is_staff'] else None
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[user_id] = (account, now)
+        return account
+
+    def is_active(self, user_id):
+        account = self.account(user_id)
+        return bool(account and account['is_active'])
+
+    def forget(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+active_users = ActiveUserCache(ttl=getattr(settings, 'JWT_ACTIVE_CHECK_SECONDS', 60))
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that returns a ClaimsUser instead of loading core.User
+    per request, and rejects revoked tokens (see core.revocation).
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        if revoked_tokens.is_revoked(validated_token.get(api_settings.JTI_CLAIM)):
+            raise InvalidToken(_("Token has been revoked"))
+
+        account = active_users.account(user_id)
+        if not (account and account['is_active']):
+            raise AuthenticationFailed(_("User is inactive or no longer exists"), code="user_inactive")
+
+        return ClaimsUser(validated_token, account)
+
+
+def authenticate_token(raw_token):
+    """
+    ClaimsUser for a raw access token, for views that don't go through DRF
+    authentication (e.g. async views). Raises InvalidToken or AuthenticationFailed.
+    """
+    authentication = StatelessJWTAuthentication()
+    return authentication.get_user(authentication.get_validated_token(raw_token))
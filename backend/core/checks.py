@@ -0,0 +1,26 @@
+"""System checks for settings the core app relies on"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose entries are private to one process
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Profile, dashboard and replica-stickiness invalidation only reach the
+    worker that made the change unless the default cache is shared
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        f"The default cache ({backend}) is private to each worker process.",
+        hint="Set CACHE_BACKEND to a shared cache (Redis, Memcached or the file cache "
+             "settings_production uses by default).",
+        id='core.E001',
+    )]
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the iteration count taken from settings.PASSWORD_HASH_ITERATIONS.
+
+    It keeps the standard 'pbkdf2_sha256' algorithm name, so existing hashes
+    verify as before; Django's must_update() sees the different iteration
+    count and re-hashes the password transparently on the user's next login.
+    Use `manage.py benchmark_login` to pick a cost for the login server.
+    """
+    iterations = getattr(settings, 'PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
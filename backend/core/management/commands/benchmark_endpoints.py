@@ -0,0 +1,106 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+
+from core.authentication import active_users
+from core.hashers import TunablePBKDF2PasswordHasher
+from core.models import StudentProfile, User
+from core.profile_cache import invalidate_profiles
+
+BENCH_USERNAME = '__endpoint_benchmark__'
+BENCH_PASSWORD = 'benchmark-password-1'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure login and profile latency with the configured database connection strategy '
+        'against opening a new connection per request'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and mode')
+        parser.add_argument(
+            '--iterations', type=int, default=settings.PASSWORD_HASH_ITERATIONS,
+            help='PBKDF2 iterations for the benchmark account (lower it to isolate connection cost)'
+        )
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username=BENCH_USERNAME).exists():
+            raise CommandError(f'{BENCH_USERNAME} already exists; remove it or wait for the other run to finish')
+        requests = options['requests']
+        db_settings = connection.settings_dict
+        configured_age = db_settings['CONN_MAX_AGE']
+        pooled = 'pool' in db_settings.get('OPTIONS', {})
+        if pooled:
+            # Closing hands the connection back to the pool, so there is no unpooled baseline
+            modes = [('psycopg pool', None)]
+        else:
+            modes = [('new connection per request', 0)]
+            if configured_age != 0:
+                modes.append((f'CONN_MAX_AGE={configured_age}', configured_age))
+
+        client = Client(HTTP_HOST=next((h for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost'))
+        original_iterations = TunablePBKDF2PasswordHasher.iterations
+        TunablePBKDF2PasswordHasher.iterations = options['iterations']
+        user = User.objects.create_user(BENCH_USERNAME, password=BENCH_PASSWORD, is_student=True)
+        StudentProfile.objects.create(user=user)
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        connection_created.connect(count_connection)
+        try:
+            login = {'username': BENCH_USERNAME, 'password': BENCH_PASSWORD}
+            tokens = client.post('/api/auth/student/login/', login).json()
+            auth = {'HTTP_AUTHORIZATION': f"Bearer {tokens['access']}"}
+
+            def login_request():
+                return client.post('/api/auth/student/login/', login)
+
+            def profile_request():
+                # Skip the profile and active-user caches so every request needs the database
+                invalidate_profiles([user.pk])
+                active_users.clear()
+                return client.get('/api/profile/', **auth)
+
+            self.stdout.write(f"{'endpoint':<10} {'mode':<28} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'connects':>9}")
+            for label, max_age in modes:
+                if max_age is not None:
+                    db_settings['CONN_MAX_AGE'] = max_age
+                connection.close()
+                for endpoint, send in (('login', login_request), ('profile', profile_request)):
+                    opened.clear()
+                    timings = self._measure(send, requests)
+                    self.stdout.write(
+                        f"{endpoint:<10} {label:<28} {statistics.fmean(timings):>8.2f} "
+                        f"{statistics.median(timings):>8.2f} {self._p95(timings):>8.2f} {len(opened):>9}"
+                    )
+        finally:
+            connection_created.disconnect(count_connection)
+            db_settings['CONN_MAX_AGE'] = configured_age
+            TunablePBKDF2PasswordHasher.iterations = original_iterations
+            User.objects.filter(pk=user.pk).delete()
+
+    def _measure(self, send, requests):
+        timings = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            # What the WSGI handler does around every request (the test client skips it)
+            close_old_connections()
+            response = send()
+            close_old_connections()
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"Unexpected status {response.status_code}")
+        return timings
+
+    @staticmethod
+    def _p95(timings):
+        ordered = sorted(timings)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
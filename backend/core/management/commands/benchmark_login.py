@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from core.hashers import TunablePBKDF2PasswordHasher
+from core.models import User
+
+BENCH_USERNAME = '__login_benchmark__'
+BENCH_PASSWORD = 'benchmark-password-1'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure single-core login throughput of the student login endpoint for one or more '
+        'password hasher costs (runs inside a transaction that is rolled back)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Logins per measurement')
+        parser.add_argument(
+            '--iterations', default=str(settings.PASSWORD_HASH_ITERATIONS),
+            help='Comma-separated PBKDF2 iteration counts to compare (default: current setting)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            iteration_counts = [int(value) for value in options['iterations'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError('--iterations must be a comma-separated list of integers')
+        requests = options['requests']
+        # The test client must send a Host that ALLOWED_HOSTS accepts
+        client = Client(HTTP_HOST=next((h for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost'))
+        original_iterations = TunablePBKDF2PasswordHasher.iterations
+
+        self.stdout.write(f"{'iterations':>12} {'ok logins/s':>12} {'failed/s':>10} {'ms/login':>9} {'queries':>8}")
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(BENCH_USERNAME, password=BENCH_PASSWORD, is_student=True)
+                for iterations in iteration_counts:
+                    TunablePBKDF2PasswordHasher.iterations = iterations
+                    # Re-hash at this cost so the logins measure it (and don't trigger a rehash)
+                    user.set_password(BENCH_PASSWORD)
+                    user.save(update_fields=['password'])
+
+                    ok_rate, ms, queries = self._measure(client, BENCH_PASSWORD, requests, expect=200)
+                    failed_rate, _, _ = self._measure(client, 'wrong-password', requests, expect=401)
+                    self.stdout.write(
+                        f"{iterations:>12} {ok_rate:>12.1f} {failed_rate:>10.1f} {ms:>9.1f} {queries:>8.1f}"
+                    )
+                raise Rollback()
+        except Rollback:
+            pass
+        finally:
+            TunablePBKDF2PasswordHasher.iterations = original_iterations
+
+        self.stdout.write(
+            'Figures are per core: the login view is CPU-bound on the hash, so a server with '
+            'N gunicorn workers on N cores handles roughly N times the ok logins/s.'
+        )
+
+    def _measure(self, client, password, requests, expect):
+        payload = {'username': BENCH_USERNAME, 'password': password}
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(requests):
+                response = client.post('/api/auth/student/login/', payload)
+                if response.status_code != expect:
+                    raise CommandError(f"Unexpected status {response.status_code} from login endpoint")
+            elapsed = time.perf_counter() - started
+        return requests / elapsed, elapsed / requests * 1000, len(queries) / requests
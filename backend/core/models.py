@@ -74,3 +74,15 @@ class StudentProfile(models.Model):
     def __str__(self):
         return f"{self.user.username}"
 
+
+
+class RevokedToken(models.Model):
+    """JTI of a JWT that must no longer be accepted (logout, compromised session)"""
+    jti = models.CharField(max_length=64, unique=True)
+    token_type = models.CharField(max_length=16)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.token_type} {self.jti}"
@@ -0,0 +1,71 @@
+"""
+Per-user cache for the profile endpoints.
+
+The frontend fetches /api/profile/ and /api/staff/profile/ on every page
+navigation. The rendered payload is cached per user together with a strong
+ETag (hash of the payload), so a repeat request either gets the cached body
+or, when the client sends the ETag back in If-None-Match, a bodiless 304.
+Entries are dropped by the signal handlers in core.signals whenever the
+user, their profile or their course changes.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+PROFILE_KINDS = ('profile', 'staff')
+
+
+def profile_cache_key(kind, user_id):
+    return f"profile:{kind}:{user_id}"
+
+
+def invalidate_profiles(user_ids):
+    """Drop the cached profile payloads of the given users"""
+    cache.delete_many([profile_cache_key(kind, user_id) for user_id in user_ids for kind in PROFILE_KINDS])
+
+
+def _etag(data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    return '"%s"' % hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def cached_profile_response(request, kind, build):
+    """
+    Serve a profile payload from the per-user cache, honouring If-None-Match.
+
+    Args:
+        request: The DRF request (its user must be authenticated)
+        kind: Which endpoint, one of PROFILE_KINDS
+        build: Callable returning (data, status code); only 200 responses are cached
+
+    Returns:
+        Response: 200 with the payload, 304 when the client's ETag matches, or the
+        uncached error response from `build`
+    """
+    key = profile_cache_key(kind, request.user.pk)
+    entry = cache.get(key)
+    if entry is None:
+        data, status_code = build()
+        if status_code != status.HTTP_200_OK:
+            return Response(data, status=status_code)
+        entry = (_etag(data), data)
+        cache.set(key, entry, getattr(settings, 'PROFILE_CACHE_SECONDS', 300))
+    etag, data = entry
+
+    client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in client_etags or '*' in client_etags:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    # Per-user content: browsers may keep it but must revalidate each time
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Authorization',))
+    return response
@@ -0,0 +1,156 @@
+"""
+JWT revocation without a query per request.
+
+Revoked JTIs live in the RevokedToken table. Each worker mirrors the
+unexpired ones into a Bloom filter that is topped up incrementally every few
+seconds, so the common "not revoked" answer is a few in-memory bit tests.
+Only a probable hit (a really revoked token, or a rare false positive) is
+confirmed against the database.
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one blake2b digest)"""
+
+    def __init__(self, capacity, false_positive_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class RevocationList:
+    """
+    Per-worker view of RevokedToken.
+
+    Args:
+        refresh_seconds: How often new revocations from other workers are pulled in
+        rebuild_seconds: How often the filter is rebuilt from scratch (drops expired JTIs)
+        overlap_seconds: Look-back on each incremental pull, so revocations committed
+            late by a slow transaction are not skipped
+    """
+
+    def __init__(self, refresh_seconds=5, rebuild_seconds=3600, overlap_seconds=60,
+                 false_positive_rate=0.001, min_capacity=4096, max_cached=10000):
+        self.refresh_seconds = refresh_seconds
+        self.rebuild_seconds = rebuild_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.false_positive_rate = false_positive_rate
+        self.min_capacity = min_capacity
+        self.max_cached = max_cached
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._filter = None
+        self._count = 0
+        self._high_water = None
+        self._built_at = self._refreshed_at = 0.0
+        # JTIs the database already answered for; `_clear` is dropped for any
+        # JTI that shows up in a later pull
+        self._revoked = set()
+        self._clear = set()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def _rebuild(self, now):
+        rows = list(
+            RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('jti', 'revoked_at')
+        )
+        bloom = BloomFilter(max(self.min_capacity, 2 * len(rows)), self.false_positive_rate)
+        for jti, _ in rows:
+            bloom.add(jti)
+        self._filter = bloom
+        self._count = len(rows)
+        self._high_water = max((revoked_at for _, revoked_at in rows), default=timezone.now())
+        self._revoked.clear()
+        self._clear.clear()
+        self._built_at = self._refreshed_at = now
+
+    def _pull(self, now):
+        rows = RevokedToken.objects.filter(revoked_at__gte=self._high_water - self.overlap).values_list('jti', 'revoked_at')
+        for jti, revoked_at in rows:
+            if jti not in self._filter:
+                self._filter.add(jti)
+                self._count += 1
+            self._clear.discard(jti)
+            self._high_water = max(self._high_water, revoked_at)
+        self._refreshed_at = now
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._filter is not None and now - self._refreshed_at < self.refresh_seconds:
+            return
+        with self._lock:
+            if self._filter is None or now - self._built_at >= self.rebuild_seconds \
+                    or self._count > self._filter.capacity:
+                self._rebuild(now)
+            elif now - self._refreshed_at >= self.refresh_seconds:
+                self._pull(now)
+
+    def is_revoked(self, jti):
+        """True if the token with this JTI has been revoked"""
+        if not jti:
+            return False
+        self._ensure_fresh()
+        if jti not in self._filter or jti in self._clear:
+            return False
+        if jti in self._revoked:
+            return True
+        revoked = RevokedToken.objects.filter(jti=jti).exists()
+        with self._lock:
+            cache = self._revoked if revoked else self._clear
+            if len(cache) >= self.max_cached:
+                cache.clear()
+            cache.add(jti)
+        return revoked
+
+    def revoke(self, token):
+        """
+        Record a validated simplejwt token as revoked.
+
+        The revoking worker sees it immediately; other workers within refresh_seconds.
+        """
+        jti = token[api_settings.JTI_CLAIM]
+        RevokedToken.objects.get_or_create(jti=jti, defaults={
+            'token_type': token.get(api_settings.TOKEN_TYPE_CLAIM, ''),
+            'user_id': token.get(api_settings.USER_ID_CLAIM),
+            'expires_at': datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc),
+        })
+        self._ensure_fresh()
+        with self._lock:
+            self._filter.add(jti)
+            self._clear.discard(jti)
+            self._revoked.add(jti)
+
+
+revoked_tokens = RevocationList(
+    refresh_seconds=getattr(settings, 'JWT_REVOCATION_REFRESH_SECONDS', 5),
+    rebuild_seconds=getattr(settings, 'JWT_REVOCATION_REBUILD_SECONDS', 3600),
+)
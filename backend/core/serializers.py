@@ -1,7 +1,10 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from .authentication import RevocableRefreshToken
+from utils.fieldsets import DynamicFieldsMixin
 from .models import User, StudentProfile, StaffProfile
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'is_student', 'is_staff', 'first_name', 'last_name')
@@ -23,7 +26,16 @@ class StaffLoginSerializer(serializers.Serializer):
         return data
 
 
-class StudentProfileSerializer(serializers.ModelSerializer):
+class RevocationAwareTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuses to mint access tokens from a revoked refresh token"""
+    token_class = RevocableRefreshToken
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+
+class StudentProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     course_name = serializers.CharField(source='course.name', read_only=True)
     
@@ -31,7 +43,7 @@ class StudentProfileSerializer(serializers.ModelSerializer):
         model = StudentProfile
         fields = ('id', 'user', 'course', 'course_name', 'caste', 'gender', 'mobile_number', 'batch')
 
-class StaffProfileSerializer(serializers.ModelSerializer):
+class StaffProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     department_display = serializers.CharField(source='get_department_display', read_only=True)
     
@@ -0,0 +1,29 @@
+"""
+Drop cached profile payloads (core.profile_cache) and this worker's cached
+account state (core.authentication.active_users) when their sources change
+"""
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .authentication import active_users
+from .models import Course, StaffProfile, StudentProfile, User
+from .profile_cache import invalidate_profiles
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_profile(sender, instance, **kwargs):
+    invalidate_profiles([instance.pk])
+    active_users.forget(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=StudentProfile)
+@receiver([post_save, post_delete], sender=StaffProfile)
+def invalidate_profile(sender, instance, **kwargs):
+    invalidate_profiles([instance.user_id])
+    active_users.forget(instance.user_id)
+
+
+@receiver([post_save, pre_delete], sender=Course)
+def invalidate_course_students(sender, instance, **kwargs):
+    # Student profiles embed the course name (pre_delete: the FK is nulled before post_delete)
+    invalidate_profiles(StudentProfile.objects.filter(course_id=instance.pk).values_list('user_id', flat=True))
@@ -1,3 +1,227 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .auth import login_backend
+from .checks import check_shared_cache
+from .authentication import active_users, authenticate_token, issue_tokens
+from .hashers import TunablePBKDF2PasswordHasher
+from .models import Course, RevokedToken, StaffProfile, StudentProfile, User
+from .revocation import BloomFilter, RevocationList, revoked_tokens
+
+
+class AdminSearchTests(APITestCase):
+    def setUp(self):
+        active_users.clear()
+        self.client.force_login(User.objects.create(username='admin@tu.in', is_staff=True, is_superuser=True))
+        self.course = Course.objects.create(name='MBA', course_duration='2')
+        self.ravi = self.create_student('21MBA0001', 'Ravi', '9876500001')
+        self.sita = self.create_student('21MBA0102', 'Sita', '9123400002')
+
+    def create_student(self, username, first_name, mobile_number):
+        user = User.objects.create(username=username, first_name=first_name, is_student=True)
+        return StudentProfile.objects.create(user=user, course=self.course, batch='2021-23', mobile_number=mobile_number)
+
+    def search(self, term):
+        response = self.client.get(reverse('admin:core_studentprofile_changelist'), {'q': term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return set(response.context['cl'].result_list)
+
+    def test_roll_number_prefix(self):
+        self.assertEqual(self.search('21mba01'), {self.sita})
+        self.assertEqual(self.search('21MBA0'), {self.ravi, self.sita})
+
+    def test_names_phone_numbers_and_substrings(self):
+        self.assertEqual(self.search('ravi'), {self.ravi})
+        self.assertEqual(self.search('98765'), {self.ravi})
+        # Looks like a roll number but matches no username prefix
+        self.assertEqual(self.search('MBA0102'), {self.sita})
+
+    def test_dues_autocomplete(self):
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'dues', 'model_name': 'hostelrecords', 'field_name': 'student', 'term': '21mba01',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['id'] for result in response.json()['results']], [str(self.sita.pk)])
+
+
+class TokenRoleChangeTests(APITestCase):
+    """Role flags come from the database, not from the (long-lived) token claims"""
+
+    def setUp(self):
+        active_users.clear()
+        self.staff_user = User.objects.create(username='clerk@tu.in', is_staff=True)
+        self.staff_profile = StaffProfile.objects.create(
+            user=self.staff_user, department='hostel', gender='M', phone_number='9000000000'
+        )
+        self.refresh = issue_tokens(self.staff_user)
+        # Staff-only endpoint that changes nothing for an empty id list
+        self.staff_url = reverse('library-records-bulk-clear')
+
+    def authenticate(self, access_token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token}')
+
+    def test_staff_token_reaches_staff_endpoint(self):
+        self.authenticate(self.refresh.access_token)
+        response = self.client.post(self.staff_url, {'ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_demoted_user_loses_staff_access(self):
+        self.authenticate(self.refresh.access_token)
+        self.staff_user.is_staff = False
+        self.staff_user.save()
+        response = self.client.post(self.staff_url, {'ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_refreshed_token_of_demoted_user_has_no_staff_access(self):
+        self.staff_user.is_staff = False
+        self.staff_user.save()
+        response = self.client.post(reverse('token-refresh'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.authenticate(response.data['access'])
+        response = self.client.post(self.staff_url, {'ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticate(self.refresh.access_token)
+        self.staff_user.is_active = False
+        self.staff_user.save()
+        response = self.client.post(self.staff_url, {'ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_department_follows_staff_profile(self):
+        self.staff_profile.department = 'librarian'
+        self.staff_profile.save()
+        user = authenticate_token(str(self.refresh.access_token))
+        self.assertEqual(user.department, 'librarian')
+        self.assertEqual(user.username, 'clerk@tu.in')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginTests(APITestCase):
+    def setUp(self):
+        active_users.clear()
+        self.staff_user = User.objects.create_user('Anita.Rao@TU.in', password='s3cret', is_staff=True)
+        StaffProfile.objects.create(user=self.staff_user, department='library', gender='F', phone_number='9000000001')
+        self.student_user = User.objects.create_user('21MBA0001', password='s3cret', is_student=True)
+
+    def test_staff_email_is_case_insensitive(self):
+        self.assertEqual(self.staff_user.email, 'Anita.Rao@tu.in')
+        for email in ('Anita.Rao@TU.in', 'anita.rao@tu.in', ' ANITA.RAO@tu.in '):
+            self.assertEqual(login_backend.authenticate(None, username=email, password='s3cret'), self.staff_user)
+        response = self.client.post(
+            reverse('staff-login'), {'email': 'anita.rao@tu.in', 'password': 's3cret'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['department'], 'library')
+
+    def test_each_login_path_only_finds_its_own_users(self):
+        self.assertIsNone(login_backend.authenticate(None, username='21MBA0001@tu.in', password='s3cret'))
+        self.assertIsNone(login_backend.authenticate(None, username='Anita.Rao@TU.in', password='wrong'))
+        self.assertEqual(
+            login_backend.authenticate(None, username='21MBA0001', password='s3cret'), self.student_user
+        )
+        self.staff_user.is_active = False
+        self.staff_user.save()
+        self.assertIsNone(login_backend.authenticate(None, username='Anita.Rao@TU.in', password='s3cret'))
+
+
+class PasswordHasherTests(TestCase):
+    def test_hashes_of_another_cost_are_upgraded(self):
+        hasher = TunablePBKDF2PasswordHasher()
+        old = hasher.encode('s3cret', hasher.salt(), iterations=hasher.iterations + 1)
+        self.assertTrue(hasher.verify('s3cret', old))
+        self.assertTrue(hasher.must_update(old))
+        self.assertFalse(hasher.must_update(hasher.encode('s3cret', hasher.salt())))
+
+
+class TokenRevocationTests(APITestCase):
+    def setUp(self):
+        active_users.clear()
+        revoked_tokens.clear()
+        self.addCleanup(revoked_tokens.clear)
+        self.staff_user = User.objects.create(username='clerk@tu.in', is_staff=True)
+        StaffProfile.objects.create(user=self.staff_user, department='hostel', gender='M', phone_number='9000000000')
+        self.refresh = issue_tokens(self.staff_user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def test_logout_revokes_both_tokens(self):
+        self.assertEqual(self.client.get(reverse('staff-profile')).status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('logout'), {'refresh': str(self.refresh)}, format='json')
+        self.assertLess(response.status_code, 300)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+
+        self.assertEqual(self.client.get(reverse('staff-profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        response = self.client.post(reverse('token-refresh'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_other_workers_pick_up_revocations(self):
+        other_worker = RevocationList(refresh_seconds=0)
+        jti = self.refresh['jti']
+        self.assertFalse(other_worker.is_revoked(jti))
+        revoked_tokens.revoke(self.refresh)
+        self.assertTrue(other_worker.is_revoked(jti))
+        self.assertFalse(other_worker.is_revoked(self.refresh.access_token['jti']))
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        values = [f'jti-{n}' for n in range(1000)]
+        for value in values:
+            bloom.add(value)
+        self.assertTrue(all(value in bloom for value in values))
+        self.assertLess(sum(f'other-{n}' in bloom for n in range(10000)), 100)
+
+
+class ProfileCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        active_users.clear()
+        self.staff_user = User.objects.create(username='clerk@tu.in', first_name='Anita', is_staff=True)
+        self.profile = StaffProfile.objects.create(
+            user=self.staff_user, department='hostel', gender='F', phone_number='9000000000'
+        )
+        self.client.force_authenticate(user=self.staff_user)
+        self.url = reverse('staff-profile')
+
+    def test_etag_revalidation(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_profile_changes_invalidate_the_cache(self):
+        etag = self.client.get(self.url)['ETag']
+        self.profile.phone_number = '9000000009'
+        self.profile.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class SharedCacheCheckTests(TestCase):
+    def test_per_process_cache_fails_the_deploy_check(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=locmem):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['core.E001'])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp'}}
+        with self.settings(CACHES=shared):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class BenchmarkEndpointsTests(TransactionTestCase):
+    def test_reports_each_endpoint_and_cleans_up(self):
+        output = StringIO()
+        call_command('benchmark_endpoints', requests=2, iterations=1, stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines[1:]], ['login', 'profile'])
+        self.assertFalse(User.objects.exists())
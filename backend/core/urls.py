@@ -18,6 +18,7 @@ urlpatterns = [
     path('auth/student/login/', views.StudentLoginView.as_view(), name='student-login'),
     path('auth/staff/login/', views.StaffLoginView.as_view(), name='staff-login'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('auth/logout/', views.LogoutView.as_view(), name='logout'),
     
     # Get logged-in user's profile (student or staff)
     # GET request returns:
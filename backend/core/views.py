@@ -7,14 +7,22 @@ from .models import StudentProfile, StaffProfile, User
 from .serializers import (
     StudentLoginSerializer,
     StaffLoginSerializer,
+    LogoutSerializer,
     StudentProfileSerializer,
     StaffProfileSerializer,
     UserSerializer
 )
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
+from .authentication import StatelessJWTAuthentication, issue_tokens
+from .profile_cache import cached_profile_response
+from .revocation import revoked_tokens
+from utils.fieldsets import SparseFieldsetMixin
+from utils.replica import ReplicaReadMixin, replica_reads
+from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import authenticate
+from .auth import login_backend
 import logging
 from rest_framework.decorators import api_view, permission_classes
 from django.db.models import Q
@@ -33,24 +41,15 @@ class StudentLoginView(APIView):
                 username = serializer.validated_data['username']  # This is the roll number
                 password = serializer.validated_data['password']
                 
-                # Check if user exists
-                try:
-                    user = User.objects.get(username=username)
-                except User.DoesNotExist:
-                    return Response(
-                        {'error': 'Invalid username or password'},
-                        status=status.HTTP_401_UNAUTHORIZED
-                    )
-                
-                # Authenticate user
-                user = authenticate(
+                # Single lookup + hash; see CustomAuthBackend
+                user = login_backend.authenticate(
                     request,
                     username=username,
                     password=password
                 )
                 
                 if user and user.is_student:
-                    refresh = RefreshToken.for_user(user)
+                    refresh = issue_tokens(user)
                     return Response({
                         'refresh': str(refresh),
                         'access': str(refresh.access_token),
@@ -80,22 +79,20 @@ class StaffLoginView(APIView):
             password = serializer.validated_data['password']
             
             # Use email as username for staff authentication
-            user = authenticate(
+            user = login_backend.authenticate(
                 request,
                 username=email,  # Use email as username
                 password=password
             )
             
             if user and user.is_staff:
-                refresh = RefreshToken.for_user(user)
-                # Get staff profile and department
-                staff_profile = StaffProfile.objects.get(user=user)
-                department = staff_profile.department
+                # Department and profile id travel in the token claims
+                refresh = issue_tokens(user)
                 
                 return Response({
                     'refresh': str(refresh),
                     'access': str(refresh.access_token),
-                    'department': department,
+                    'department': refresh['department'],
                 })
             else:
                 return Response(
@@ -108,30 +105,87 @@ class StaffLoginView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+class LogoutView(APIView):
+    """
+    Revoke the given refresh token, and the access token in the Authorization
+    header when there is one. Holding the refresh token is proof enough, so an
+    expired access token doesn't prevent logging out.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        serializer = LogoutSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Please provide the refresh token'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            refresh = RefreshToken(serializer.validated_data['refresh'])
+        except TokenError:
+            return Response(
+                {'error': 'Invalid or expired refresh token'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        revoked_tokens.revoke(refresh)
+
+        authenticator = StatelessJWTAuthentication()
+        header = authenticator.get_header(request)
+        raw_token = header and authenticator.get_raw_token(header)
+        if raw_token:
+            try:
+                access = authenticator.get_validated_token(raw_token)
+            except InvalidToken:
+                access = None
+            if access and access.get(jwt_settings.USER_ID_CLAIM) == refresh.get(jwt_settings.USER_ID_CLAIM):
+                revoked_tokens.revoke(access)
+
+        return Response(status=status.HTTP_205_RESET_CONTENT)
+
 class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-        if hasattr(user, 'student_profile'):
-            serializer = StudentProfileSerializer(user.student_profile)
-            return Response({
+        return cached_profile_response(request, 'profile', lambda: self.build_profile(request.user))
+
+    @staticmethod
+    def build_profile(user):
+        """Return (payload, status) for the user's student or staff profile"""
+        # Token claims say which profile to load, so this is a single query
+        profile_id = getattr(user, 'profile_id', None)
+        if profile_id and user.is_student:
+            profile = StudentProfile.objects.select_related('user', 'course').filter(pk=profile_id).first()
+            if profile:
+                return {
+                    'type': 'student',
+                    'profile': StudentProfileSerializer(profile).data
+                }, status.HTTP_200_OK
+        elif profile_id and user.is_staff:
+            profile = StaffProfile.objects.select_related('user').filter(pk=profile_id).first()
+            if profile:
+                return {
+                    'type': 'staff',
+                    'profile': StaffProfileSerializer(profile).data
+                }, status.HTTP_200_OK
+
+        # Tokens issued before profile claims existed
+        profile = StudentProfile.objects.select_related('user', 'course').filter(user_id=user.pk).first()
+        if profile:
+            return {
                 'type': 'student',
-                'profile': serializer.data
-            })
-        elif hasattr(user, 'staff_profile'):
-            serializer = StaffProfileSerializer(user.staff_profile)
-            return Response({
+                'profile': StudentProfileSerializer(profile).data
+            }, status.HTTP_200_OK
+        profile = StaffProfile.objects.select_related('user').filter(user_id=user.pk).first()
+        if profile:
+            return {
                 'type': 'staff',
-                'profile': serializer.data
-            })
-        return Response(
-            {'error': 'Profile not found'},
-            status=status.HTTP_404_NOT_FOUND
-        )
+                'profile': StaffProfileSerializer(profile).data
+            }, status.HTTP_200_OK
+        return {'error': 'Profile not found'}, status.HTTP_404_NOT_FOUND
 
 # ViewSets for better API coverage
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class UserViewSet(ReplicaReadMixin, SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
@@ -145,7 +199,7 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(is_staff=True)
         return queryset
 
-class StudentProfileViewSet(viewsets.ModelViewSet):
+class StudentProfileViewSet(ReplicaReadMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = StudentProfile.objects.all()
     serializer_class = StudentProfileSerializer
     permission_classes = [IsAuthenticated]
@@ -157,7 +211,7 @@ class StudentProfileViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(user__username__icontains=username)
         return queryset
 
-class StaffProfileViewSet(viewsets.ModelViewSet):
+class StaffProfileViewSet(ReplicaReadMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = StaffProfile.objects.all()
     serializer_class = StaffProfileSerializer
     permission_classes = [IsAuthenticated]
@@ -172,37 +226,38 @@ class StaffProfileViewSet(viewsets.ModelViewSet):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def staff_profile(request):
-    print("Staff profile request received")
-    print("User:", request.user)
-    print("Is authenticated:", request.user.is_authenticated)
-    print("Has staff_profile:", hasattr(request.user, 'staff_profile'))
-    
-    if not hasattr(request.user, 'staff_profile'):
-        print("User is not a staff member")
-        return Response({'error': 'User is not a staff member'}, status=403)
+    return cached_profile_response(request, 'staff', lambda: build_staff_profile(request.user))
+
+def build_staff_profile(user):
+    """Return (payload, status) for the staff_profile endpoint"""
+    profile_id = getattr(user, 'profile_id', None)
+    if profile_id and user.is_staff:
+        staff_profile = StaffProfile.objects.select_related('user').filter(pk=profile_id).first()
+    else:
+        staff_profile = StaffProfile.objects.select_related('user').filter(user_id=user.pk).first()
+
+    if staff_profile is None:
+        return {'error': 'User is not a staff member'}, 403
     
     try:
-        staff_profile = request.user.staff_profile
-        print("Staff profile found:", staff_profile)
-        print("Department:", staff_profile.department)
-        
+        user = staff_profile.user
         response_data = {
-            'id': request.user.id,
-            'email': request.user.email,
-            'username': request.user.username,
-            'name': request.user.get_full_name(),
+            'id': user.id,
+            'email': user.email,
+            'username': user.username,
+            'name': user.get_full_name(),
             'user_type': 'staff',
             'department': staff_profile.department,
             'phone_number': staff_profile.phone_number
         }
-        print("Response data:", response_data)
-        return Response(response_data)
+        return response_data, 200
     except Exception as e:
-        print("Error in staff_profile view:", str(e))
-        return Response({'error': str(e)}, status=500)
+        logger.error(f"Error in staff_profile view: {str(e)}")
+        return {'error': str(e)}, 500
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def search_students(request):
     query = request.GET.get('q', '')
     if not query:
@@ -1,5 +1,94 @@
 from django.contrib import admin
-from .models import FeeStructure, HostelRecords, LibraryRecords, LegacyAcademicRecords, SportsRecords
+from django.db.models import Q
+from django.contrib import messages
+from utils.paginators import EstimatedCountPaginator
+from .bulk import clear_dues
+from .models import FeeStructure, AcademicRecords, HostelRecords, HostelYearEntry, LibraryRecords, LegacyAcademicRecords, SportsRecords
+
+
+class AmountRangeFilter(admin.SimpleListFilter):
+    """Fixed amount buckets instead of one sidebar entry per distinct value"""
+    field_name = None
+    ranges = (
+        ('zero', 'No dues', 0, 0),
+        ('upto_500', '₹1 - ₹500', 0.01, 500),
+        ('upto_2000', '₹501 - ₹2,000', 500.01, 2000),
+        ('upto_10000', '₹2,001 - ₹10,000', 2000.01, 10000),
+        ('above_10000', 'Above ₹10,000', 10000.01, None),
+    )
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, label, _, _ in self.ranges]
+
+    def queryset(self, request, queryset):
+        for key, _, low, high in self.ranges:
+            if self.value() == key:
+                queryset = queryset.filter(**{f'{self.field_name}__gte': low})
+                if high is not None:
+                    queryset = queryset.filter(**{f'{self.field_name}__lte': high})
+                return queryset
+        return queryset
+
+
+class DueAmountRangeFilter(AmountRangeFilter):
+    title = 'due amount'
+    parameter_name = 'due_range'
+    field_name = 'due_amount'
+
+
+class FineAmountRangeFilter(AmountRangeFilter):
+    title = 'fine amount'
+    parameter_name = 'fine_range'
+    field_name = 'fine_amount'
+
+
+class HostelDueRangeFilter(AmountRangeFilter):
+    title = 'total due'
+    parameter_name = 'due_range'
+    field_name = 'due_total'
+
+
+class TCIssuedFilter(admin.SimpleListFilter):
+    title = 'TC issued'
+    parameter_name = 'tc_issued'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'Yes'), ('no', 'No')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.exclude(tc_number__isnull=True).exclude(tc_number='')
+        if self.value() == 'no':
+            return queryset.filter(Q(tc_number__isnull=True) | Q(tc_number=''))
+        return queryset
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist defaults for the big dues tables: no second COUNT(*) for the
+    "N total" link and planner-estimated counts when the list is unfiltered.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+def make_clear_action(name, description):
+    """Admin action that clears dues for the selection (or all matching rows) in one UPDATE"""
+    def clear_action(modeladmin, request, queryset):
+        updated = clear_dues(queryset)
+        modeladmin.message_user(
+            request, f"Updated {updated} {modeladmin.model._meta.verbose_name_plural}.", messages.SUCCESS
+        )
+    clear_action.__name__ = name
+    clear_action.short_description = description
+    clear_action.allowed_permissions = ('change',)
+    return clear_action
+
+
+waive_fines = make_clear_action('waive_fines', 'Waive fines of selected records')
+mark_paid = make_clear_action('mark_paid', 'Mark selected records as Paid')
+clear_due_amount = make_clear_action('clear_due_amount', 'Set due amount of selected records to zero')
 
 @admin.register(FeeStructure)
 class FeeStructureAdmin(admin.ModelAdmin):
@@ -9,32 +98,42 @@ class FeeStructureAdmin(admin.ModelAdmin):
 
 
 
+@admin.register(AcademicRecords)
+class AcademicRecordsAdmin(LargeTableAdmin):
+    list_display = ['roll_number', 'academic_year_label', 'fee_structure', 'paid_by_student', 'paid_by_govt', 'payment_status']
+    list_filter = ['payment_status', 'academic_year_label', 'student__course__name', 'student__batch']
+    search_fields = ['student__user__username', 'student__user__first_name', 'student__user__last_name']
+    autocomplete_fields = ['student']
+    readonly_fields = ['version']
+    actions = [mark_paid]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('student__user', 'fee_structure')
+
+    def roll_number(self, obj):
+        return obj.student.user.username if obj.student and obj.student.user else 'N/A'
+    roll_number.short_description = 'Roll Number'
+    roll_number.admin_order_field = 'student__user__username'
+
+class HostelYearEntryInline(admin.TabularInline):
+    """Year-wise amounts; saved after the record itself, so the record's version is bumped too"""
+    model = HostelYearEntry
+    fields = ['year', 'mess_bill', 'scholarship']
+    extra = 0
+
 @admin.register(HostelRecords)
-class HostelRecordsAdmin(admin.ModelAdmin):
-    list_display = ['student_name', 'roll_number', 'total_mess_bill', 'total_scholarship', 'total_due', 'deposit']
-    list_filter = ['student__course__name', 'student__batch']
+class HostelRecordsAdmin(LargeTableAdmin):
+    inlines = [HostelYearEntryInline]
+    list_display = ['student_name', 'roll_number', 'mess_bill_total', 'scholarship_total', 'due_total', 'deposit']
+    list_filter = ['student__course__name', 'student__batch', HostelDueRangeFilter]
     search_fields = ['student__user__username', 'student__user__first_name', 'student__user__last_name']
+    autocomplete_fields = ['student']
     readonly_fields = ['student_name', 'roll_number', 'total_mess_bill', 'total_scholarship', 'total_challan_paid', 'total_due']
     
     fieldsets = (
         ('Student Information', {
             'fields': ('student', 'student_name', 'roll_number')
         }),
-        ('1st Year', {
-            'fields': ('first_year_mess_bill', 'first_year_scholarship')
-        }),
-        ('2nd Year', {
-            'fields': ('second_year_mess_bill', 'second_year_scholarship')
-        }),
-        ('3rd Year', {
-            'fields': ('third_year_mess_bill', 'third_year_scholarship')
-        }),
-        ('4th Year', {
-            'fields': ('fourth_year_mess_bill', 'fourth_year_scholarship')
-        }),
-        ('5th Year', {
-            'fields': ('fifth_year_mess_bill', 'fifth_year_scholarship')
-        }),
         ('Payments', {
             'fields': ('deposit', 'renewal_amount', 'f_challan1', 'f_challan2')
         }),
@@ -45,7 +144,7 @@ class HostelRecordsAdmin(admin.ModelAdmin):
     )
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('student__user', 'student__course')
+        return super().get_queryset(request).select_related('student__user', 'student__course').with_totals()
     
     def student_name(self, obj):
         if obj.student and obj.student.user:
@@ -61,12 +160,30 @@ class HostelRecordsAdmin(admin.ModelAdmin):
     roll_number.short_description = 'Roll Number'
     roll_number.admin_order_field = 'student__user__username'
 
+    def mess_bill_total(self, obj):
+        return obj.mess_bill_total
+    mess_bill_total.short_description = 'Total mess bill'
+    mess_bill_total.admin_order_field = 'mess_bill_total'
+
+    def scholarship_total(self, obj):
+        return obj.scholarship_total
+    scholarship_total.short_description = 'Total scholarship'
+    scholarship_total.admin_order_field = 'scholarship_total'
+
+    def due_total(self, obj):
+        return obj.due_total
+    due_total.short_description = 'Total due'
+    due_total.admin_order_field = 'due_total'
+
 @admin.register(LibraryRecords)
-class LibraryRecordsAdmin(admin.ModelAdmin):
+class LibraryRecordsAdmin(LargeTableAdmin):
     list_display = ['student_name', 'roll_number', 'book_id', 'borrowing_date', 'fine_amount']
-    list_filter = ['borrowing_date', 'student__course__name']
+    list_filter = ['borrowing_date', FineAmountRangeFilter, 'student__course__name']
     search_fields = ['student__user__username', 'student__user__first_name', 'student__user__last_name', 'book_id']
+    autocomplete_fields = ['student']
     readonly_fields = ['created_at', 'updated_at', 'student_name', 'roll_number']
+    ordering = ['-borrowing_date', '-id']
+    actions = [waive_fines]
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('student__user', 'student__course')
@@ -86,19 +203,21 @@ class LibraryRecordsAdmin(admin.ModelAdmin):
     roll_number.admin_order_field = 'student__user__username'
 
 @admin.register(LegacyAcademicRecords)
-class LegacyAcademicRecordsAdmin(admin.ModelAdmin):
+class LegacyAcademicRecordsAdmin(LargeTableAdmin):
     list_display = [
         'student_name', 'roll_number', 'due_amount', 'tc_number', 'tc_issued_date'
     ]
     list_filter = [
-        'tc_number', 'tc_issued_date', 'student__course__name'
+        TCIssuedFilter, DueAmountRangeFilter, 'tc_issued_date', 'student__course__name'
     ]
     search_fields = [
         'student__user__username', 'student__user__first_name', 
         'student__user__last_name', 'tc_number'
     ]
+    autocomplete_fields = ['student']
     readonly_fields = ['formatted_due_amount', 'student_name', 'roll_number']
     ordering = ['student__user__username']
+    actions = [clear_due_amount]
     
     fieldsets = (
         ('Student Information', {
@@ -134,8 +253,19 @@ class LegacyAcademicRecordsAdmin(admin.ModelAdmin):
     formatted_due_amount.short_description = 'Formatted Due Amount'
 
 @admin.register(SportsRecords)
-class SportsRecordsAdmin(admin.ModelAdmin):
-    list_display = ['student', 'equipment_name', 'borrowing_date', 'fine_amount']
-    list_filter = ['borrowing_date']
+class SportsRecordsAdmin(LargeTableAdmin):
+    list_display = ['roll_number', 'equipment_name', 'borrowing_date', 'fine_amount']
+    list_filter = ['borrowing_date', FineAmountRangeFilter]
     search_fields = ['student__user__username', 'equipment_name']
+    autocomplete_fields = ['student']
     readonly_fields = ['created_at', 'updated_at']
+    ordering = ['-borrowing_date', '-id']
+    actions = [waive_fines]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('student__user')
+
+    def roll_number(self, obj):
+        return obj.student.user.username if obj.student and obj.student.user else 'N/A'
+    roll_number.short_description = 'Student'
+    roll_number.admin_order_field = 'student__user__username'
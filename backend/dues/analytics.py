@@ -0,0 +1,175 @@
+"""
+Columnar (Apache Arrow IPC / Parquet) export of the dues tables for analysis.
+
+Each dataset is one dues table joined with its student's dimensions. Rows
+are read with values_list().iterator() and turned into typed Arrow column
+arrays one chunk at a time (amounts as decimal128, dates as date32), which
+are appended to the output file as record batches, so memory is bounded by
+the chunk size. pyarrow (in requirements.txt) is imported on first use, so
+the rest of the app still runs where it isn't installed.
+"""
+from .exports import academic_totals
+from .models import AcademicRecords, HostelRecords, LegacyAcademicRecords, LibraryRecords, SportsRecords, YEAR_PREFIXES
+
+CHUNK_SIZE = 20000
+FORMATS = ('arrow', 'parquet')
+
+STUDENT_DIMENSIONS = [
+    ('roll_number', 'student__user__username', 'string'),
+    ('first_name', 'student__user__first_name', 'string'),
+    ('last_name', 'student__user__last_name', 'string'),
+    ('course', 'student__course__name', 'string'),
+    ('batch', 'student__batch', 'string'),
+    ('caste', 'student__caste', 'string'),
+    ('gender', 'student__gender', 'string'),
+]
+
+# name -> (queryset factory, [(column, values_list lookup, type)])
+DATASETS = {
+    'hostel': (lambda: HostelRecords.objects.with_year_columns().with_totals(), [
+        ('id', 'id', 'int64'),
+        *STUDENT_DIMENSIONS,
+        *(
+            column
+            for year, prefix in enumerate(YEAR_PREFIXES, start=1)
+            for column in (
+                (f'{prefix}_year_mess_bill', f'year{year}_mess_bill', 'int64'),
+                (f'{prefix}_year_scholarship', f'year{year}_scholarship', 'int64'),
+            )
+        ),
+        ('deposit', 'deposit', 'int64'),
+        ('renewal_amount', 'renewal_amount', 'int64'),
+        ('f_challan1', 'f_challan1', 'int64'),
+        ('f_challan2', 'f_challan2', 'int64'),
+        ('mess_bill_total', 'mess_bill_total', 'int64'),
+        ('scholarship_total', 'scholarship_total', 'int64'),
+        ('due_total', 'due_total', 'int64'),
+        ('updated_at', 'updated_at', 'timestamp'),
+    ]),
+    'academic': (lambda: academic_totals(AcademicRecords.objects.all()), [
+        ('id', 'id', 'int64'),
+        *STUDENT_DIMENSIONS,
+        ('academic_year_label', 'academic_year_label', 'string'),
+        ('fee_academic_year', 'fee_structure__academic_year', 'string'),
+        ('fee_category', 'fee_structure__category', 'string'),
+        ('total_fee', 'total_fee', 'int64'),
+        ('paid_by_govt', 'paid_by_govt', 'int64'),
+        ('paid_by_student', 'paid_by_student', 'int64'),
+        ('due_amount', 'due', 'int64'),
+        ('payment_status', 'payment_status', 'string'),
+    ]),
+    'library': (lambda: LibraryRecords.objects.all(), [
+        ('id', 'id', 'int64'),
+        *STUDENT_DIMENSIONS,
+        ('book_id', 'book_id', 'string'),
+        ('borrowing_date', 'borrowing_date', 'date'),
+        ('fine_amount', 'fine_amount', 'decimal'),
+        ('updated_at', 'updated_at', 'timestamp'),
+    ]),
+    'sports': (lambda: SportsRecords.objects.all(), [
+        ('id', 'id', 'int64'),
+        *STUDENT_DIMENSIONS,
+        ('equipment_name', 'equipment_name', 'string'),
+        ('borrowing_date', 'borrowing_date', 'date'),
+        ('fine_amount', 'fine_amount', 'decimal'),
+        ('updated_at', 'updated_at', 'timestamp'),
+    ]),
+    'legacy': (lambda: LegacyAcademicRecords.objects.all(), [
+        ('id', 'id', 'int64'),
+        *STUDENT_DIMENSIONS,
+        ('due_amount', 'due_amount', 'decimal'),
+        ('tc_number', 'tc_number', 'string'),
+        ('tc_issued_date', 'tc_issued_date', 'date'),
+        ('source_roll_number', 'source_roll_number', 'string'),
+        ('source_name', 'source_name', 'string'),
+        ('match_confidence', 'match_confidence', 'confidence'),
+    ]),
+}
+
+
+class ArrowUnavailable(RuntimeError):
+    """pyarrow is not installed"""
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ArrowUnavailable('Columnar exports need pyarrow (pip install pyarrow)')
+    return pyarrow
+
+
+def _arrow_type(pa, kind):
+    return {
+        'int64': pa.int64(),
+        'string': pa.string(),
+        'date': pa.date32(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+        # DecimalField(max_digits=10, decimal_places=2) / (4, 3)
+        'decimal': pa.decimal128(10, 2),
+        'confidence': pa.decimal128(4, 3),
+    }[kind]
+
+
+def schema(dataset):
+    """Arrow schema of `dataset`"""
+    pa = _pyarrow()
+    _, columns = DATASETS[dataset]
+    return pa.schema([pa.field(name, _arrow_type(pa, kind)) for name, _, kind in columns])
+
+
+def record_batches(dataset, chunk_size=CHUNK_SIZE):
+    """Yield the rows of `dataset` as Arrow RecordBatches of up to `chunk_size` rows"""
+    pa = _pyarrow()
+    queryset, columns = DATASETS[dataset]
+    batch_schema = schema(dataset)
+    rows = queryset().order_by('pk').values_list(*(lookup for _, lookup, _ in columns)).iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                break
+        if not chunk:
+            return
+        # Transpose the chunk into one typed array per column
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*chunk), batch_schema)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=batch_schema)
+        if len(chunk) < chunk_size:
+            return
+
+
+def write_dataset(dataset, sink, file_format='parquet', chunk_size=CHUNK_SIZE):
+    """
+    Write `dataset` to `sink` (a path or a binary file object) batch by batch.
+
+    Args:
+        dataset: One of DATASETS
+        sink: Output path or writable binary file
+        file_format: 'arrow' (IPC file, uncompressed) or 'parquet' (zstd)
+        chunk_size: Rows per record batch
+
+    Returns:
+        int: Number of rows written
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset: {dataset}")
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format: {file_format}")
+    pa = _pyarrow()
+    batch_schema = schema(dataset)
+    if file_format == 'parquet':
+        writer = pa.parquet.ParquetWriter(sink, batch_schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(sink, batch_schema)
+    rows = 0
+    try:
+        for batch in record_batches(dataset, chunk_size):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+    return rows
@@ -0,0 +1,67 @@
+"""
+Set-based bulk updates over a selection of dues records.
+
+Both the admin actions and the bulk_clear API lock and collect the ids of the
+selection in one query and update them with one UPDATE ... WHERE id IN (...)
+statement, so clearing 10k rows never loads an instance into Python.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import AcademicRecords, LegacyAcademicRecords, LibraryRecords, SportsRecords
+from .payments import fee_total_subquery
+from .signals import records_changed
+
+# What "clearing" means for each dues model. Academic records get the unpaid
+# remainder of their fee posted as paid by the student, so the status stays
+# Paid when dues.payments.recompute_payment_status next looks at the amounts
+CLEAR_VALUES = {
+    LibraryRecords: {'fine_amount': 0},
+    SportsRecords: {'fine_amount': 0},
+    AcademicRecords: {
+        'paid_by_student': Greatest(
+            F('paid_by_student'), Coalesce(fee_total_subquery() - F('paid_by_govt'), F('paid_by_student'))
+        ),
+        'payment_status': 'Paid',
+    },
+    LegacyAcademicRecords: {'due_amount': 0},
+}
+
+
+def bulk_update_selection(queryset, values):
+    """
+    Apply `values` to every row of `queryset` in a single UPDATE.
+
+    Versioned models get their version bumped and models with updated_at get
+    it refreshed, matching what a per-record save would do.
+
+    Returns:
+        int: Number of rows updated
+    """
+    model = queryset.model
+    changes = dict(values)
+    field_names = {f.name for f in model._meta.concrete_fields}
+    if 'version' in field_names:
+        changes['version'] = F('version') + 1
+    if 'updated_at' in field_names:
+        changes['updated_at'] = timezone.now()
+    # The selection may carry joins, annotations and ordering from the
+    # changelist or viewset filters, and may filter on the very columns being
+    # cleared (has_dues, amount ranges), so it would select nothing once the
+    # UPDATE has run: collect its ids first, for the UPDATE and the receivers
+    selection = queryset.order_by().values('pk')
+    with transaction.atomic():
+        ids = list(
+            model.objects.select_for_update().filter(pk__in=selection).order_by('pk').values_list('pk', flat=True)
+        )
+        updated = model.objects.filter(pk__in=ids).update(**changes) if ids else 0
+        if updated:
+            records_changed.send(sender=model, queryset=model.objects.filter(pk__in=ids))
+    return updated
+
+
+def clear_dues(queryset):
+    """Clear the dues of every record in the selection (see CLEAR_VALUES)"""
+    return bulk_update_selection(queryset, CLEAR_VALUES[queryset.model])
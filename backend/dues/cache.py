@@ -0,0 +1,75 @@
+"""
+Caching of the department dashboard aggregates.
+
+Every staff member of a department sees the same statistics, so the
+dashboard endpoints are cached per URL (path + normalized query string) in
+a TwoTierCache. Entries depend on namespaces named after the models they
+read; dues.signals bumps a namespace whenever one of its models is saved or
+deleted, or a set-based writer sends records_changed.
+"""
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from rest_framework.response import Response
+
+from utils.caching import TwoTierCache
+from utils.transactions import CommitBatch
+from .models import AcademicRecords, HostelRecords, LegacyAcademicRecords, LibraryRecords, SportsRecords
+
+MODEL_NAMESPACES = {
+    AcademicRecords: 'academic',
+    HostelRecords: 'hostel',
+    LegacyAcademicRecords: 'legacy',
+    LibraryRecords: 'library',
+    SportsRecords: 'sports',
+}
+# Student, user and course rows are embedded in every dashboard
+STUDENT_NAMESPACE = 'students'
+
+dashboard_cache = TwoTierCache(
+    'dashboard',
+    timeout=getattr(settings, 'DASHBOARD_CACHE_SECONDS', 300),
+    version_ttl=getattr(settings, 'DASHBOARD_CACHE_VERSION_TTL', 2),
+)
+
+
+# Bumps wait for commit: bumping earlier would let a concurrent request cache
+# pre-commit data under the new version. Bumps within one transaction are
+# coalesced, so deleting thousands of rows bumps each namespace once.
+_pending_bumps = CommitBatch(lambda namespaces: dashboard_cache.bump(*namespaces))
+
+
+def invalidate_namespaces(*namespaces):
+    """Bump `namespaces` once the current transaction commits"""
+    _pending_bumps.add(*namespaces)
+
+
+def invalidate_dashboards(*models):
+    """Invalidate the cached dashboards that read any of `models`"""
+    invalidate_namespaces(*(MODEL_NAMESPACES[model] for model in models))
+
+
+def cached_dashboard(*models):
+    """
+    Cache a GET action's 200 responses per URL until one of `models` (or any
+    student/user/course) changes. Error responses are not cached.
+    """
+    namespaces = tuple(MODEL_NAMESPACES[model] for model in models) + (STUDENT_NAMESPACE,)
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            response = None
+
+            def compute():
+                nonlocal response
+                response = view_method(self, request, *args, **kwargs)
+                return response.data, response.status_code == 200
+
+            query = urlencode(sorted(request.query_params.lists()), doseq=True)
+            data = dashboard_cache.get_or_compute(namespaces, f"{request.path}?{query}", compute)
+            # Hand back the view's own response when it was just computed (keeps error statuses)
+            return response if response is not None else Response(data)
+        return wrapper
+    return decorator
@@ -0,0 +1,147 @@
+"""
+Combined staff landing-page summary (/api/dues/summary/).
+
+The five department aggregates are independent queries, so the async view
+runs them concurrently on a small shared thread pool and the page costs the
+slowest query rather than the sum of five requests. Each section has its own
+timeout: a slow or failing department comes back as {"error": ...} and the
+others are still returned. Sections are cached in the dashboard cache under
+their department's namespace, like the per-department dashboards.
+
+DRF views can't be async, so the request goes through the authentication,
+permission and throttle checks of an APIView (_SummaryAccess) on a thread
+before the sections are gathered.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.views import APIView
+
+from ssp.db_router import reads_from
+from utils.replica import read_alias_for
+from .cache import STUDENT_NAMESPACE, dashboard_cache
+from .exports import academic_totals
+from .models import AcademicRecords, HostelRecords, LegacyAcademicRecords, LibraryRecords, SportsRecords
+from .permissions import IsAdminOrStaff
+
+logger = logging.getLogger(__name__)
+
+# name -> (queryset factory, due expression); names are dues.cache namespaces
+SECTIONS = {
+    'hostel': (lambda: HostelRecords.objects.with_totals(), 'due_total'),
+    'library': (lambda: LibraryRecords.objects.all(), 'fine_amount'),
+    'sports': (lambda: SportsRecords.objects.all(), 'fine_amount'),
+    'academic': (lambda: academic_totals(AcademicRecords.objects.all()), 'due'),
+    'legacy': (lambda: LegacyAcademicRecords.objects.all(), 'due_amount'),
+}
+
+SECTION_TIMEOUT = getattr(settings, 'DASHBOARD_SECTION_TIMEOUT', 5)
+
+# Shared by all requests of the process, so it also caps the number of
+# dashboard queries (and database connections) running at once
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'DASHBOARD_SUMMARY_THREADS', 10), thread_name_prefix='dues-summary'
+)
+
+
+def _aggregate(name):
+    queryset, due = SECTIONS[name]
+    totals = queryset().order_by().aggregate(
+        total_records=Count('id'),
+        records_with_dues=Count('id', filter=Q(**{f'{due}__gt': 0})),
+        records_without_dues=Count('id', filter=Q(**{due: 0})),
+        total_due_amount=Coalesce(Sum(due), 0, output_field=DecimalField(max_digits=14, decimal_places=2)),
+    )
+    totals['total_due_amount'] = float(totals['total_due_amount'])
+    return totals
+
+
+def section_summary(name, alias=None):
+    """
+    Summary counts of one department (runs on a pool thread).
+
+    On PostgreSQL the query is given a statement timeout matching the section
+    timeout, so an abandoned query doesn't keep holding its pool thread.
+    """
+    def compute():
+        connection = connections[alias or 'default']
+        if connection.vendor != 'postgresql':
+            return _aggregate(name), True
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL statement_timeout = %s', [int(SECTION_TIMEOUT * 1000)])
+            return _aggregate(name), True
+
+    try:
+        with reads_from(alias):
+            return dashboard_cache.get_or_compute((name, STUDENT_NAMESPACE), f"summary:{name}", compute)
+    finally:
+        # Pool threads live outside the request cycle: release their connections here
+        close_old_connections()
+
+
+async def _section(name, alias):
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(_executor, section_summary, name, alias), SECTION_TIMEOUT)
+    except asyncio.TimeoutError:
+        return {'error': f'Timed out after {SECTION_TIMEOUT}s'}
+    except Exception:
+        logger.exception("Dashboard summary section %s failed", name)
+        return {'error': 'Failed to load this section'}
+
+
+class _SummaryAccess(APIView):
+    """Authentication, permissions and throttles of the summary (the default authenticators and throttles)"""
+    permission_classes = [IsAdminOrStaff]
+
+
+def _check_access(request):
+    """
+    Run the _SummaryAccess checks on `request`.
+
+    Returns:
+        tuple: (DRF Request, None) when allowed, else (None, rendered error Response)
+    """
+    view = _SummaryAccess()
+    view.args, view.kwargs, view.format_kwarg = (), {}, None
+    view.headers = view.default_response_headers
+    drf_request = view.initialize_request(request)
+    view.request = drf_request
+    try:
+        view.initial(drf_request)
+    except Exception as exc:
+        response = view.finalize_response(drf_request, view.handle_exception(exc))
+        return None, response.render()
+    return drf_request, None
+
+
+@require_GET
+async def dues_summary(request):
+    """
+    GET /api/dues/summary/ (staff)
+
+    {"sections": {"hostel": {total_records, records_with_dues,
+    records_without_dues, total_due_amount}, "library": ..., "sports": ...,
+    "academic": ..., "legacy": ...}, "complete": <every section answered>}
+
+    Runs under ASGI or WSGI; under ASGI the wait doesn't hold a worker thread.
+    """
+    drf_request, denied = await sync_to_async(_check_access)(request)
+    if denied is not None:
+        return denied
+    alias = await sync_to_async(read_alias_for)(drf_request)
+    results = await asyncio.gather(*(_section(name, alias) for name in SECTIONS))
+    sections = dict(zip(SECTIONS, results))
+    return JsonResponse({
+        'sections': sections,
+        'complete': not any('error' in section for section in sections.values()),
+    })
@@ -0,0 +1,90 @@
+"""
+Change notifications for the dues event stream (/api/dues/events/).
+
+dues.signals queues (department, student) pairs as records are saved or
+deleted; once the transaction commits they are turned into one event per
+student carrying the student's new outstanding amount in that department,
+with one aggregate query per department, and published to the broker.
+Bulk writes touching many students publish a single 'bulk' event telling
+dashboards to reload.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.models import StudentProfile
+from utils.events import get_broker
+from utils.transactions import CommitBatch
+from .exports import academic_totals
+from .models import AcademicRecords, HostelRecords, LegacyAcademicRecords, LibraryRecords, SportsRecords
+
+logger = logging.getLogger(__name__)
+
+# Bulk writes touching more students than this publish one 'bulk' event
+MAX_STUDENT_EVENTS = 200
+
+
+def _outstanding(department, student_ids):
+    """student id -> outstanding amount in `department`"""
+    if department == 'hostel':
+        rows = HostelRecords.objects.with_totals().filter(student_id__in=student_ids).values_list('student_id', 'due_total')
+    else:
+        queryset, due = {
+            'academic': (academic_totals(AcademicRecords.objects.all()), 'due'),
+            'library': (LibraryRecords.objects.all(), 'fine_amount'),
+            'sports': (SportsRecords.objects.all(), 'fine_amount'),
+            'legacy': (LegacyAcademicRecords.objects.all(), 'due_amount'),
+        }[department]
+        rows = (
+            queryset.filter(student_id__in=student_ids).order_by()
+            .values('student_id').annotate(total=Sum(due)).values_list('student_id', 'total')
+        )
+    return dict(rows)
+
+
+def _flush(items):
+    try:
+        broker = get_broker()
+        students = defaultdict(set)
+        for department, student_id in items:
+            students[department].add(student_id)
+        rolls = dict(
+            StudentProfile.objects.filter(pk__in={pk for ids in students.values() for pk in ids if pk})
+            .values_list('pk', 'user__username')
+        )
+        now = timezone.now().isoformat()
+        for department, student_ids in students.items():
+            if None in student_ids:
+                broker.publish({'type': 'bulk', 'model': department, 'at': now})
+                student_ids = student_ids - {None}
+            amounts = _outstanding(department, student_ids)
+            for student_id in student_ids:
+                broker.publish({
+                    'type': 'changed',
+                    'model': department,
+                    'student': rolls.get(student_id),
+                    'outstanding': str(amounts.get(student_id) or Decimal(0)),
+                    'at': now,
+                })
+    except Exception:
+        # The write has committed; a lost notification must not fail the request
+        logger.exception("Publishing dues change events failed")
+
+
+_pending_events = CommitBatch(_flush)
+
+
+def publish_later(department, student_ids):
+    """
+    Publish the new outstanding amounts of `student_ids` in `department` once
+    the transaction commits; None (or too many students) publishes a 'bulk' event.
+    """
+    if not get_broker().has_subscribers():
+        return
+    if student_ids is None or len(student_ids) > MAX_STUDENT_EVENTS:
+        _pending_events.add((department, None))
+    else:
+        _pending_events.add(*((department, student_id) for student_id in student_ids if student_id is not None))
@@ -0,0 +1,215 @@
+"""
+Consolidated no-dues workbook of a batch: one sheet per department.
+
+Every sheet is streamed from the database with .iterator() into a temporary
+CSV by its own (spawned) worker process, so the sheets are queried in parallel and
+no process ever holds more than one chunk of rows. The CSVs are then copied
+row by row into a write-only openpyxl workbook (or zipped as they are), so
+memory stays constant whatever the size of the batch.
+"""
+import csv
+import os
+import tempfile
+import zipfile
+from concurrent.futures import as_completed
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+from django.db import connections
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Concat
+from openpyxl import Workbook
+
+from utils.processes import spawn_pool
+
+from .models import YEAR_PREFIXES, AcademicRecords, HostelRecords, LegacyAcademicRecords, LibraryRecords, SportsRecords
+
+CHUNK_SIZE = 2000
+
+STUDENT_COLUMNS = [
+    ('Roll Number', 'student__user__username', str),
+    ('Name', 'student_name', str),
+    ('Course', 'student__course__name', str),
+    ('Caste', 'student__caste', str),
+]
+
+
+def _student_name():
+    return Concat('student__user__first_name', Value(' '), 'student__user__last_name')
+
+
+def academic_totals(queryset):
+    """Annotate total_fee and due (same formula as AcademicRecords.due_amount, 0 without a fee structure)"""
+    fee = (
+        Coalesce('fee_structure__tuition_fee', 0) + Coalesce('fee_structure__special_fee', 0)
+        + Coalesce('fee_structure__exam_fee', 0)
+    )
+    return queryset.annotate(total_fee=fee, due=fee - F('paid_by_govt') - F('paid_by_student'))
+
+
+@dataclass(frozen=True)
+class SheetSpec:
+    title: str
+    model: type
+    # (header, values_list lookup, type the CSV cell is converted back to)
+    columns: list
+    # queryset -> queryset annotated with the computed columns
+    annotate: object = None
+
+    def records(self, batch):
+        return self.model.objects.filter(student__batch=batch)
+
+    def rows(self, queryset):
+        """values_list() of the sheet's columns over `queryset` (no model instances)"""
+        if self.annotate:
+            queryset = self.annotate(queryset)
+        return queryset.annotate(student_name=_student_name()).values_list(*(lookup for _, lookup, _ in self.columns))
+
+    @property
+    def headers(self):
+        return [header for header, _, _ in self.columns]
+
+
+HOSTEL_SHEET = SheetSpec('Hostel', HostelRecords, STUDENT_COLUMNS + [
+    column
+    for year, prefix in enumerate(YEAR_PREFIXES, start=1)
+    for column in (
+        (f'{prefix.title()} Year Mess Bill', f'year{year}_mess_bill', int),
+        (f'{prefix.title()} Year Scholarship', f'year{year}_scholarship', int),
+    )
+] + [
+    ('Deposit', 'deposit', int),
+    ('Renewal Amount', 'renewal_amount', int),
+    ('Challan 1', 'f_challan1', int),
+    ('Challan 2', 'f_challan2', int),
+    ('Total Mess Bill', 'mess_bill_total', int),
+    ('Total Scholarship', 'scholarship_total', int),
+    ('Total Due', 'due_total', int),
+], annotate=lambda queryset: queryset.with_year_columns().with_totals())
+
+LIBRARY_SHEET = SheetSpec('Library', LibraryRecords, STUDENT_COLUMNS + [
+    ('Book ID', 'book_id', str),
+    ('Borrowing Date', 'borrowing_date', date.fromisoformat),
+    ('Fine Amount', 'fine_amount', Decimal),
+])
+
+SPORTS_SHEET = SheetSpec('Sports', SportsRecords, STUDENT_COLUMNS + [
+    ('Equipment', 'equipment_name', str),
+    ('Borrowing Date', 'borrowing_date', date.fromisoformat),
+    ('Fine Amount', 'fine_amount', Decimal),
+])
+
+ACADEMIC_SHEET = SheetSpec('Academic', AcademicRecords, STUDENT_COLUMNS + [
+    ('Year', 'academic_year_label', str),
+    ('Total Fee', 'total_fee', int),
+    ('Paid By Govt', 'paid_by_govt', int),
+    ('Paid By Student', 'paid_by_student', int),
+    ('Due Amount', 'due', int),
+    ('Payment Status', 'payment_status', str),
+    ('Remarks', 'remarks', str),
+], annotate=academic_totals)
+
+LEGACY_SHEET = SheetSpec('Legacy', LegacyAcademicRecords, STUDENT_COLUMNS + [
+    ('Due Amount', 'due_amount', Decimal),
+    ('TC Number', 'tc_number', str),
+    ('TC Issued Date', 'tc_issued_date', date.fromisoformat),
+    ('Source Roll Number', 'source_roll_number', str),
+    ('Source Name', 'source_name', str),
+])
+
+SHEETS = [HOSTEL_SHEET, LIBRARY_SHEET, SPORTS_SHEET, ACADEMIC_SHEET, LEGACY_SHEET]
+
+
+def write_sheet_csv(index, batch, directory):
+    """
+    Stream one sheet of `batch` into a CSV in `directory`.
+
+    Returns:
+        tuple: (sheet index, CSV path, row count)
+    """
+    spec = SHEETS[index]
+    rows = spec.rows(spec.records(batch).order_by('student__user__username', 'pk')).iterator(chunk_size=CHUNK_SIZE)
+    path = os.path.join(directory, f'{index}-{spec.title.lower()}.csv')
+    count = 0
+    with open(path, 'w', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(spec.headers)
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row])
+            count += 1
+    return index, path, count
+
+
+def _write_sheet_in_worker(index, batch, directory):
+    try:
+        return write_sheet_csv(index, batch, directory)
+    finally:
+        connections.close_all()
+
+
+def _typed(row, converters):
+    return [convert(value) if value != '' else None for value, convert in zip(row, converters)]
+
+
+def _assemble_xlsx(sheet_files, path):
+    workbook = Workbook(write_only=True)
+    for index, csv_path in sheet_files:
+        spec = SHEETS[index]
+        converters = [convert for _, _, convert in spec.columns]
+        sheet = workbook.create_sheet(spec.title)
+        with open(csv_path, newline='') as handle:
+            reader = csv.reader(handle)
+            sheet.append(next(reader))
+            for row in reader:
+                sheet.append(_typed(row, converters))
+    workbook.save(path)
+
+
+def _assemble_zip(sheet_files, path, batch):
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, csv_path in sheet_files:
+            archive.write(csv_path, f'{batch}-{SHEETS[index].title.lower()}.csv')
+
+
+def build_no_dues_workbook(batch, path, file_format='xlsx', workers=len(SHEETS), progress=None):
+    """
+    Write the consolidated no-dues export of `batch` to `path`.
+
+    Args:
+        batch: Student batch (e.g. '2021-23')
+        path: Output file (.xlsx, or .zip of CSVs)
+        file_format: 'xlsx' or 'zip'
+        workers: Processes used to stream the sheets (0 = in-process, one after another)
+        progress: Optional callable(done, total, message)
+
+    Returns:
+        dict: Sheet title -> row count
+    """
+    if file_format not in ('xlsx', 'zip'):
+        raise ValueError(f"Unknown export format: {file_format}")
+    report = progress or (lambda done, total, message: None)
+    total = len(SHEETS) + 1
+    counts, files = {}, {}
+
+    with tempfile.TemporaryDirectory(prefix='no-dues-') as directory:
+        if workers > 0:
+            # Spawned, not forked: this also runs inside the threaded job workers
+            with spawn_pool(min(workers, len(SHEETS)), django_setup=True) as pool:
+                futures = [pool.submit(_write_sheet_in_worker, index, batch, directory) for index in range(len(SHEETS))]
+                for done, future in enumerate(as_completed(futures), start=1):
+                    index, csv_path, count = future.result()
+                    files[index], counts[SHEETS[index].title] = csv_path, count
+                    report(done, total, f'{SHEETS[index].title} sheet ready')
+        else:
+            for index in range(len(SHEETS)):
+                _, files[index], counts[SHEETS[index].title] = write_sheet_csv(index, batch, directory)
+                report(index + 1, total, f'{SHEETS[index].title} sheet ready')
+
+        sheet_files = sorted(files.items())
+        if file_format == 'xlsx':
+            _assemble_xlsx(sheet_files, path)
+        else:
+            _assemble_zip(sheet_files, path, batch)
+    report(total, total, 'Export written')
+    return counts
@@ -0,0 +1,82 @@
+"""
+Year-wise hostel ledger (HostelYearEntry): one row per record and year of
+study, the source of truth for mess bills and scholarships.
+
+Year-level questions ("3rd-year mess bills of the 2021 batch") and the
+per-record totals (HostelRecordsQuerySet.with_totals) are indexed GROUP BY
+queries over the entries, and a sixth year is just another row. The former
+per-year columns of HostelRecords survive as compatibility attributes on the
+model; copy_year_columns() moves their data into the ledger before the
+migration that drops them runs.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, Sum
+
+from .models import HostelRecords, HostelYearEntry, YEAR_FIELDS
+
+
+def year_totals(records=None):
+    """
+    Mess bill and scholarship totals per year of study, from the ledger.
+
+    Args:
+        records: HostelRecords queryset to total (e.g. one batch), or None for all
+
+    Returns:
+        list: [{'year', 'records', 'mess_bill', 'scholarship'}] by year
+    """
+    entries = HostelYearEntry.objects.all()
+    if records is not None:
+        entries = entries.filter(record__in=records.order_by().values('pk'))
+    return list(
+        entries.order_by('year').values('year').annotate(
+            records=Count('record_id'), mess_bill=Sum('mess_bill'), scholarship=Sum('scholarship'),
+        )
+    )
+
+
+def copy_year_columns(using=DEFAULT_DB_ALIAS):
+    """
+    Move the amounts of the former per-year columns of HostelRecords
+    (first_year_mess_bill ... fifth_year_scholarship) into the ledger.
+
+    Called before every migrate (dues.signals), so the data is copied before
+    the generated migration removes the columns; once they are gone this is
+    a no-op. Copied columns are zeroed, so running it again never overwrites
+    entries written since.
+
+    Returns:
+        int: Number of entries written
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    records_table, entries_table = HostelRecords._meta.db_table, HostelYearEntry._meta.db_table
+    columns_by_year = {}
+    for field, (year, amount) in YEAR_FIELDS.items():
+        columns_by_year.setdefault(year, {})[amount] = field
+
+    written = 0
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+        if records_table not in tables or entries_table not in tables:
+            return 0
+        columns = {column.name for column in connection.introspection.get_table_description(cursor, records_table)}
+        for year, fields in sorted(columns_by_year.items()):
+            if not set(fields.values()) <= columns:
+                continue
+            mess_bill, scholarship = quote(fields['mess_bill']), quote(fields['scholarship'])
+            has_amounts = f"COALESCE({mess_bill}, 0) <> 0 OR COALESCE({scholarship}, 0) <> 0"
+            cursor.execute(
+                f"DELETE FROM {quote(entries_table)} WHERE year = %s AND record_id IN "
+                f"(SELECT id FROM {quote(records_table)} WHERE {has_amounts})",
+                [year],
+            )
+            cursor.execute(
+                f"INSERT INTO {quote(entries_table)} (record_id, year, mess_bill, scholarship) "
+                f"SELECT id, %s, COALESCE({mess_bill}, 0), COALESCE({scholarship}, 0) "
+                f"FROM {quote(records_table)} WHERE {has_amounts}",
+                [year],
+            )
+            written += cursor.rowcount
+            cursor.execute(f"UPDATE {quote(records_table)} SET {mess_bill} = 0, {scholarship} = 0 WHERE {has_amounts}")
+    return written
@@ -0,0 +1,35 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dues.analytics import DATASETS, FORMATS, ArrowUnavailable, write_dataset
+
+
+class Command(BaseCommand):
+    help = 'Write the dues tables (joined with student dimensions) as typed Parquet or Arrow IPC files for analysis'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'datasets', nargs='*',
+            help=f"Datasets to export: {', '.join(DATASETS)} (default: all)"
+        )
+        parser.add_argument('--format', choices=FORMATS, default='parquet', help='Output format')
+        parser.add_argument('--output-dir', default='.', help='Directory the files are written to')
+
+    def handle(self, *args, **options):
+        unknown = set(options['datasets']) - set(DATASETS)
+        if unknown:
+            raise CommandError(f"Unknown dataset(s): {', '.join(sorted(unknown))}")
+        os.makedirs(options['output_dir'], exist_ok=True)
+        for dataset in options['datasets'] or DATASETS:
+            started = time.monotonic()
+            path = os.path.join(options['output_dir'], f"{dataset}.{options['format']}")
+            try:
+                rows = write_dataset(dataset, path, options['format'])
+            except ArrowUnavailable as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(
+                f"{dataset}: {rows} rows -> {path} ({os.path.getsize(path) / 1024:.0f} KiB, "
+                f"{time.monotonic() - started:.2f}s)"
+            ))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dues.exports import SHEETS, build_no_dues_workbook
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the consolidated no-dues workbook of a batch (hostel, library, sports, academic and '
+        'legacy sheets), streaming each sheet in its own process'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('batch', help='Student batch, e.g. 2021-23')
+        parser.add_argument('--output', help='Output path (default: no-dues-<batch>.xlsx/.zip)')
+        parser.add_argument('--format', choices=['xlsx', 'zip'], default='xlsx', help='XLSX workbook or zip of CSVs')
+        parser.add_argument('--workers', type=int, default=len(SHEETS), help='Processes streaming the sheets (0 = in-process)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        path = options['output'] or f"no-dues-{options['batch']}.{options['format']}"
+        counts = build_no_dues_workbook(
+            options['batch'], path, file_format=options['format'], workers=options['workers'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {path} in {time.monotonic() - started:.1f}s"))
+        for title, count in counts.items():
+            self.stdout.write(f"  {title}: {count} rows")
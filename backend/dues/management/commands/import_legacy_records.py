@@ -0,0 +1,297 @@
+import csv
+import hashlib
+import re
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from openpyxl import load_workbook
+
+from core.models import StudentProfile
+from dues.models import LegacyAcademicRecords
+from dues.signals import records_changed
+from utils.processes import spawn_pool
+from utils.student_matching import (
+    StudentIndex, fuzzy_match_rows, fuzzy_match_rows_in_worker, init_match_worker,
+    normalize_batch, normalize_name, normalize_roll_number,
+)
+
+# Accepted header spellings (lower-cased, alphanumerics only) for each column
+COLUMN_ALIASES = {
+    'roll_number': ['rollno', 'rollnumber', 'roll', 'hallticketno', 'hallticketnumber', 'htno', 'admissionno'],
+    'name': ['name', 'studentname', 'nameofthestudent', 'candidatename'],
+    'batch': ['batch', 'admissionyear', 'yearofadmission', 'year'],
+    'due_amount': ['dueamount', 'due', 'dues', 'balance', 'amount', 'amountdue'],
+    'tc_number': ['tcno', 'tcnumber', 'tc'],
+    'tc_issued_date': ['tcissueddate', 'tcdate', 'tcissuedon', 'dateoftc'],
+}
+
+
+def _header_key(value):
+    return re.sub(r'[^a-z0-9]', '', str(value or '').lower())
+
+
+def _parse_amount(value):
+    if value in (None, ''):
+        return Decimal('0')
+    try:
+        return Decimal(str(value).replace(',', '').replace('₹', '').strip()).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return Decimal('0')
+
+
+def _source_key(roll, name, batch, due_amount, tc_number):
+    """
+    Stable identity of a workbook row for upserts, independent of its position:
+    the roll number with the TC number when there are both, else a hash of the
+    row's normalised roll number, name, batch, TC number and amount
+    """
+    roll = normalize_roll_number(roll)
+    if roll and tc_number:
+        return f"{roll}|tc:{tc_number}"
+    content = '\x1f'.join([roll, normalize_name(name), batch or '', tc_number or '', f"{due_amount:.2f}"])
+    return f"row:{hashlib.blake2b(content.encode(), digest_size=16).hexdigest()}"
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not value:
+        return None
+    for fmt in ('%d-%m-%Y', '%d/%m/%Y', '%Y-%m-%d', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(str(value).strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+# Columns refreshed when a row is imported again. A student linked earlier is
+# kept when the row no longer matches, and a cleared due is not brought back
+# (see _keep_existing)
+UPSERT_FIELDS = [
+    'student', 'due_amount', 'tc_number', 'tc_issued_date', 'source_roll_number', 'source_name',
+    'match_confidence', 'updated_at',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Import legacy academic dues from the Admissions Excel workbook and link rows to student profiles. '
+        'Rows are keyed by roll number + TC number (or by their content), so re-importing updates them in place'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('workbook', help='Path to the .xlsx workbook')
+        parser.add_argument('--sheet', help='Worksheet name (defaults to the active sheet)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows matched and inserted per batch')
+        parser.add_argument('--workers', type=int, default=4, help='Processes used for fuzzy matching (0 = in-process)')
+        parser.add_argument('--min-confidence', type=float, default=0.9, help='Minimum fuzzy score to accept a match')
+        parser.add_argument('--min-margin', type=float, default=0.05, help='Required lead over the runner-up candidate')
+        parser.add_argument('--report', help='Write a per-row match report (CSV) to this path')
+        parser.add_argument('--dry-run', action='store_true', help='Match and report without inserting records')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            workbook = load_workbook(options['workbook'], read_only=True, data_only=True)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot open workbook: {e}")
+        if options['sheet'] and options['sheet'] not in workbook.sheetnames:
+            workbook.close()
+            raise CommandError(
+                f"No sheet named {options['sheet']!r}; the workbook has: {', '.join(workbook.sheetnames)}"
+            )
+        sheet = workbook[options['sheet']] if options['sheet'] else workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        columns = self._resolve_columns(next(rows, None))
+
+        index = StudentIndex.build(
+            StudentProfile.objects.values_list(
+                'id', 'user__username', 'user__first_name', 'user__last_name', 'batch'
+            ).iterator(chunk_size=10000)
+        )
+        self.stdout.write(f"Indexed {len(index)} student profiles")
+
+        self.stats = {'rows': 0, 'exact': 0, 'fuzzy': 0, 'unmatched': 0, 'written': 0, 'kept_cleared': 0}
+        self.confidence_buckets = {'1.000': 0, '0.95-0.999': 0, '0.90-0.949': 0, '<0.90': 0}
+        report_file = open(options['report'], 'w', newline='') if options['report'] else None
+        report = csv.writer(report_file) if report_file else None
+        if report:
+            report.writerow(['row', 'roll_number', 'name', 'matched_roll_number', 'method', 'confidence'])
+
+        # Matching is pure Python, so workers need no Django setup. They are
+        # spawned, not forked, since the command also runs in threaded job workers.
+        # The index goes to each worker once, through the initializer
+        pool = spawn_pool(
+            options['workers'], initializer=init_match_worker, initargs=(index,)
+        ) if options['workers'] > 0 else None
+        try:
+            chunk = []
+            for row_number, row in enumerate(rows, start=2):
+                if not any(cell not in (None, '') for cell in row):
+                    continue
+                chunk.append((row_number, row))
+                if len(chunk) >= options['chunk_size']:
+                    self._process_chunk(chunk, columns, index, pool, report, options)
+                    chunk = []
+            if chunk:
+                self._process_chunk(chunk, columns, index, pool, report, options)
+            if self.stats['written']:
+                # One refresh of caches and snapshots for the whole import
+                records_changed.send(sender=LegacyAcademicRecords)
+        finally:
+            if pool:
+                pool.shutdown()
+            if report_file:
+                report_file.close()
+            workbook.close()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {self.stats['rows']} rows in {elapsed:.1f}s "
+            f"({self.stats['rows'] / elapsed if elapsed else 0:.0f} rows/s)"
+        ))
+        self.stdout.write(
+            f"  exact: {self.stats['exact']}  fuzzy: {self.stats['fuzzy']}  unmatched: {self.stats['unmatched']}"
+        )
+        self.stdout.write('  confidence: ' + '  '.join(f"{k}: {v}" for k, v in self.confidence_buckets.items()))
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run - no records were inserted'))
+        else:
+            self.stdout.write(f"  written (new or updated): {self.stats['written']}")
+            if self.stats['kept_cleared']:
+                self.stdout.write(f"  kept cleared: {self.stats['kept_cleared']} rows whose dues were cleared since")
+
+    def _resolve_columns(self, header):
+        """Map logical column names to positions in the header row"""
+        if not header:
+            raise CommandError('Workbook is empty')
+        positions = {_header_key(cell): i for i, cell in enumerate(header) if cell is not None}
+        columns = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in positions:
+                    columns[field] = positions[alias]
+                    break
+        if 'roll_number' not in columns and 'name' not in columns:
+            raise CommandError('Workbook needs a roll number or a student name column')
+        if 'due_amount' not in columns:
+            raise CommandError('Workbook needs a due amount column')
+        return columns
+
+    def _process_chunk(self, chunk, columns, index, pool, report, options):
+        def cell(row, field):
+            position = columns.get(field)
+            return row[position] if position is not None and position < len(row) else None
+
+        parsed = {}
+        pending = []
+        for row_number, row in chunk:
+            raw_roll = cell(row, 'roll_number')
+            raw_name = cell(row, 'name')
+            roll = normalize_roll_number(raw_roll)
+            name = normalize_name(raw_name)
+            batch = normalize_batch(cell(row, 'batch'))
+            student_id = index.exact(roll)
+            parsed[row_number] = {
+                'roll': str(raw_roll).strip() if raw_roll not in (None, '') else None,
+                'name': str(raw_name).strip() if raw_name not in (None, '') else None,
+                'batch': batch,
+                'student_id': student_id,
+                'confidence': 1.0 if student_id else None,
+                'method': 'exact' if student_id else 'unmatched',
+                'due_amount': _parse_amount(cell(row, 'due_amount')),
+                'tc_number': str(cell(row, 'tc_number')).strip() if cell(row, 'tc_number') not in (None, '') else None,
+                'tc_issued_date': _parse_date(cell(row, 'tc_issued_date')),
+            }
+            if not student_id and name:
+                pending.append((row_number, name, roll, batch))
+
+        if pending:
+            for row_number, student_id, confidence in self._fuzzy_match(pending, index, pool, options):
+                parsed[row_number]['confidence'] = confidence
+                if student_id:
+                    parsed[row_number]['student_id'] = student_id
+                    parsed[row_number]['method'] = 'fuzzy'
+
+        # Keyed so a row repeated within the chunk is written once (last wins)
+        records = {}
+        for row_number, data in parsed.items():
+            self.stats['rows'] += 1
+            self.stats[data['method']] += 1
+            self._bucket(data['confidence'] if data['student_id'] else None)
+            if report:
+                report.writerow([
+                    row_number, data['roll'] or '', data['name'] or '',
+                    index.rolls.get(data['student_id'], ''), data['method'],
+                    f"{data['confidence']:.3f}" if data['confidence'] is not None else '',
+                ])
+            key = _source_key(data['roll'], data['name'], data['batch'], data['due_amount'], data['tc_number'])
+            records[key] = LegacyAcademicRecords(
+                source_key=key,
+                student_id=data['student_id'],
+                due_amount=data['due_amount'],
+                tc_number=data['tc_number'],
+                tc_issued_date=data['tc_issued_date'],
+                source_roll_number=data['roll'],
+                source_name=data['name'],
+                match_confidence=Decimal(str(data['confidence'])) if data['student_id'] else None,
+            )
+
+        if not options['dry_run']:
+            with transaction.atomic():
+                self._keep_existing(records)
+                LegacyAcademicRecords.objects.bulk_create(
+                    list(records.values()), batch_size=1000,
+                    update_conflicts=True, unique_fields=['source_key'], update_fields=UPSERT_FIELDS,
+                )
+            self.stats['written'] += len(records)
+
+    def _keep_existing(self, records):
+        """
+        Carry over what clerks changed on rows imported before: the linked
+        student of a row that now fails to match, and a cleared (zero) due
+        """
+        existing = LegacyAcademicRecords.objects.select_for_update().filter(
+            source_key__in=list(records)
+        ).values_list('source_key', 'student_id', 'match_confidence', 'due_amount')
+        for key, student_id, confidence, due_amount in existing:
+            record = records[key]
+            if record.student_id is None and student_id is not None:
+                record.student_id, record.match_confidence = student_id, confidence
+            if due_amount == 0 and record.due_amount:
+                record.due_amount = due_amount
+                self.stats['kept_cleared'] += 1
+
+    def _fuzzy_match(self, pending, index, pool, options):
+        """Group pending rows by blocking key and score each group against its block only"""
+        by_block = {}
+        for row_number, name, roll, batch in pending:
+            block_key, _ = index.block_for(name, batch)
+            by_block.setdefault(block_key, []).append((row_number, name, roll, block_key))
+
+        # Rows of a block stay together so each task scans few distinct blocks
+        rows = [row for block_rows in by_block.values() for row in block_rows]
+        tasks = [rows[start:start + 500] for start in range(0, len(rows), 500)]
+        min_confidence, min_margin = options['min_confidence'], options['min_margin']
+        if pool:
+            results = pool.map(fuzzy_match_rows_in_worker, [(task, min_confidence, min_margin) for task in tasks])
+        else:
+            results = (fuzzy_match_rows((task, index, min_confidence, min_margin)) for task in tasks)
+        for task_result in results:
+            yield from task_result
+
+    def _bucket(self, confidence):
+        if confidence is None or confidence < 0.9:
+            self.confidence_buckets['<0.90'] += 1
+        elif confidence >= 1.0:
+            self.confidence_buckets['1.000'] += 1
+        elif confidence >= 0.95:
+            self.confidence_buckets['0.95-0.999'] += 1
+        else:
+            self.confidence_buckets['0.90-0.949'] += 1
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from dues.models import DeletedRecord
+
+
+class Command(BaseCommand):
+    help = 'Delete delta-sync tombstones older than DELTA_SYNC_TOMBSTONE_DAYS (run daily)'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=getattr(settings, 'DELTA_SYNC_TOMBSTONE_DAYS', 30))
+        deleted, _ = DeletedRecord.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Purged {deleted} deleted-record tombstones'))
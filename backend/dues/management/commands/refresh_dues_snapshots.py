@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dues.snapshots import MODEL_DEPARTMENTS, refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the per-department dues snapshots from the raw records and mark them built, '
+        'so statistics are read from them (deploy runs this after migrate). Signals keep them '
+        'current; run this periodically (e.g. nightly) to repair drift from out-of-band writes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'departments', nargs='*',
+            help=f"Departments to refresh: {', '.join(sorted(MODEL_DEPARTMENTS.values()))} (default: all)"
+        )
+
+    def handle(self, *args, **options):
+        known = sorted(MODEL_DEPARTMENTS.values())
+        unknown = set(options['departments']) - set(known)
+        if unknown:
+            raise CommandError(f"Unknown department(s): {', '.join(sorted(unknown))}")
+        for department in options['departments'] or known:
+            started = time.monotonic()
+            groups = refresh_snapshots(department)
+            self.stdout.write(self.style.SUCCESS(
+                f"{department}: {groups} groups in {time.monotonic() - started:.2f}s"
+            ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dues.sync import FEEDS, read_feed, sync_feed
+
+
+class Command(BaseCommand):
+    help = 'Incrementally sync a weekly library or sports dump, writing only inserts, updates and deletes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('feed', choices=sorted(FEEDS), help='Which department feed the file contains')
+        parser.add_argument('path', help='Path to the CSV dump')
+        parser.add_argument('--keep-missing', action='store_true',
+                            help='Do not delete stored records that are absent from the dump (partial feeds)')
+        parser.add_argument('--allow-mass-delete', action='store_true',
+                            help='Delete missing records even if that is more than FEED_SYNC_MAX_DELETE_FRACTION of them')
+        parser.add_argument('--dry-run', action='store_true', help='Report the diff without writing')
+
+    def handle(self, *args, **options):
+        try:
+            rows = read_feed(options['path'], FEEDS[options['feed']])
+            result = sync_feed(
+                options['feed'], rows,
+                delete_missing=not options['keep_missing'],
+                dry_run=options['dry_run'],
+                allow_mass_delete=options['allow_mass_delete'],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['feed'].title()} sync: {result.inserted} inserted, {result.updated} updated, "
+            f"{result.deleted} deleted, {result.unchanged} unchanged"
+        ))
+        if result.invalid_rows:
+            self.stdout.write(self.style.WARNING(f"  skipped {result.invalid_rows} unparseable rows"))
+        if result.unknown_students:
+            sample = ', '.join(sorted(result.unknown_rolls)[:10])
+            self.stdout.write(self.style.WARNING(
+                f"  skipped {result.unknown_students} rows for unknown roll numbers (e.g. {sample})"
+            ))
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run - no changes were written'))
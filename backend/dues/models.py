@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import FilteredRelation
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from core.models import StudentProfile, User, StaffProfile
 from utils.constants import COURSE_CHOICES, DURATION_CHOICES
@@ -15,7 +17,28 @@ class FeeStructure(models.Model):
     def __str__(self):
         return f"{self.course_name} - {self.academic_year}"
 
-class AcademicRecords(models.Model):
+class VersionedModel(models.Model):
+    """
+    Records with an optimistic lock version: every save of an existing row
+    bumps it in SQL, as do the serializers' conditional UPDATEs and the
+    set-based writers in dues.payments and dues.bulk
+    """
+    version = models.PositiveIntegerField(default=0, help_text="Optimistic lock version, bumped on every write")
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        self.version = models.F('version') + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=['version'])
+
+
+class AcademicRecords(VersionedModel):
     student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE)
     fee_structure = models.ForeignKey(FeeStructure, on_delete=models.CASCADE , null=True, blank=True)
     paid_by_govt = models.IntegerField(default=0)
@@ -23,6 +46,12 @@ class AcademicRecords(models.Model):
     academic_year_label = models.CharField(max_length=2, choices=[('1', '1st Year'), ('2', '2nd Year')], default="1")
     payment_status = models.CharField(max_length=20, choices=[("Processing", "Processing"), ("Unpaid", "Unpaid"), ("Paid", "Paid")], default="Unpaid")
     remarks = models.TextField(blank=True, null=True)
+    # Nullable so existing rows need no backfill; they count as unchanged for ?since= delta sync
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['updated_at', 'id'], name='academic_updated_idx')]
+
     def __str__(self):
         return f"{self.student} - Year {self.academic_year_label}"
 
@@ -30,32 +59,83 @@ class AcademicRecords(models.Model):
     def due_amount(self):
         return (self.fee_structure.tuition_fee or 0) + (self.fee_structure.special_fee or 0) + (self.fee_structure.exam_fee or 0) - (self.paid_by_govt + self.paid_by_student)
 
-class HostelRecords(models.Model):
+# The years HostelRecords used to have columns for; their names live on as
+# compatibility attributes (first_year_mess_bill ... fifth_year_scholarship)
+YEAR_PREFIXES = ('first', 'second', 'third', 'fourth', 'fifth')
+
+# Compatibility attribute -> (year of study, HostelYearEntry amount field)
+YEAR_FIELDS = {
+    f'{prefix}_year_{amount}': (year, amount)
+    for year, prefix in enumerate(YEAR_PREFIXES, start=1)
+    for amount in ('mess_bill', 'scholarship')
+}
+
+
+class HostelRecordsQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        Annotate the per-record totals in SQL so they can be filtered and sorted:
+        mess_bill_total, scholarship_total, challan_total and due_total
+        (same formulas as the total_* properties). The year sums are a
+        GROUP BY record over HostelYearEntry, served by its (record, year) index.
+        """
+        years = HostelYearEntry.objects.filter(record=models.OuterRef('pk')).order_by().values('record')
+        mess_bill = Coalesce(models.Subquery(years.annotate(total=models.Sum('mess_bill')).values('total')), 0)
+        scholarship = Coalesce(models.Subquery(years.annotate(total=models.Sum('scholarship')).values('total')), 0)
+        challan = Coalesce('f_challan1', 0) + Coalesce('f_challan2', 0)
+        return self.annotate(
+            mess_bill_total=mess_bill,
+            scholarship_total=scholarship,
+            challan_total=challan,
+            due_total=mess_bill - models.F('deposit') - challan - scholarship,
+        )
+
+    def with_year_columns(self, years=range(1, len(YEAR_PREFIXES) + 1)):
+        """
+        Annotate year{n}_mess_bill and year{n}_scholarship for each of `years`
+        (one LEFT JOIN per year on the (record, year) index), for flat exports.
+        """
+        annotations = {}
+        for year in years:
+            entry = f'year{year}_entry'
+            annotations[entry] = FilteredRelation('year_entries', condition=models.Q(year_entries__year=year))
+            annotations[f'year{year}_mess_bill'] = Coalesce(f'{entry}__mess_bill', 0)
+            annotations[f'year{year}_scholarship'] = Coalesce(f'{entry}__scholarship', 0)
+        return self.annotate(**annotations)
+
+
+def year_amount(year, amount):
+    """Compatibility attribute for a former per-year column, read from and written to the year entries"""
+    def getter(record):
+        return record.year_amounts().get(year, {}).get(amount, 0)
+
+    def setter(record, value):
+        record.set_year_amount(year, amount, value)
+
+    return property(getter, setter, doc=f"Year {year} {amount.replace('_', ' ')} (HostelYearEntry)")
+
+
+class HostelRecords(VersionedModel):
     """
-    Hostel records for passed-out students - one record per student with year-wise columns.
-    Maps directly to CSV columns: 1st_yearmessbill, 1st_years/ship, etc.
+    Hostel records for passed-out students - one record per student. The
+    year-wise amounts are HostelYearEntry rows, one per year of study, so a
+    longer course needs no schema change; first_year_mess_bill ...
+    fifth_year_scholarship remain as attributes for the CSV columns
+    (1st_yearmessbill, 1st_years/ship, etc.) and older API clients.
     """
     student = models.OneToOneField(StudentProfile, on_delete=models.CASCADE, related_name='hostel_records')
-    
-    # 1st Year Data
-    first_year_mess_bill = models.IntegerField(default=0, help_text="1st year mess bill")
-    first_year_scholarship = models.IntegerField(default=0, help_text="1st year scholarship")
-    
-    # 2nd Year Data
-    second_year_mess_bill = models.IntegerField(default=0, help_text="2nd year mess bill")
-    second_year_scholarship = models.IntegerField(default=0, help_text="2nd year scholarship")
-    
-    # 3rd Year Data
-    third_year_mess_bill = models.IntegerField(default=0, help_text="3rd year mess bill")
-    third_year_scholarship = models.IntegerField(default=0, help_text="3rd year scholarship")
-    
-    # 4th Year Data
-    fourth_year_mess_bill = models.IntegerField(default=0, help_text="4th year mess bill")
-    fourth_year_scholarship = models.IntegerField(default=0, help_text="4th year scholarship")
-    
-    # 5th Year Data
-    fifth_year_mess_bill = models.IntegerField(default=0, help_text="5th year mess bill")
-    fifth_year_scholarship = models.IntegerField(default=0, help_text="5th year scholarship")
+
+    # Former per-year columns (see YEAR_FIELDS)
+    first_year_mess_bill = year_amount(1, 'mess_bill')
+    first_year_scholarship = year_amount(1, 'scholarship')
+    second_year_mess_bill = year_amount(2, 'mess_bill')
+    second_year_scholarship = year_amount(2, 'scholarship')
+    third_year_mess_bill = year_amount(3, 'mess_bill')
+    third_year_scholarship = year_amount(3, 'scholarship')
+    fourth_year_mess_bill = year_amount(4, 'mess_bill')
+    fourth_year_scholarship = year_amount(4, 'scholarship')
+    fifth_year_mess_bill = year_amount(5, 'mess_bill')
+    fifth_year_scholarship = year_amount(5, 'scholarship')
     
     # Payment Information (one-time per student)
     deposit = models.IntegerField(default=0, help_text="Initial deposit amount")
@@ -65,9 +145,67 @@ class HostelRecords(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = HostelRecordsQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['updated_at', 'id'], name='hostel_updated_idx')]
     
     def __str__(self):
         return f"{self.student.user.username} - Hostel Records"
+
+    def year_amounts(self):
+        """
+        {year: {'mess_bill': ..., 'scholarship': ...}} for every year with an
+        entry, plus changes not saved yet. Uses prefetch_related('year_entries')
+        when present; otherwise loaded with one query and kept until refresh_from_db().
+        """
+        if not hasattr(self, '_year_amounts'):
+            if 'year_entries' in getattr(self, '_prefetched_objects_cache', {}):
+                entries = [(e.year, e.mess_bill, e.scholarship) for e in self.year_entries.all()]
+            elif self.pk is None:
+                entries = []
+            else:
+                entries = HostelYearEntry.objects.filter(record_id=self.pk).values_list('year', 'mess_bill', 'scholarship')
+            self._year_amounts = {
+                year: {'mess_bill': mess_bill, 'scholarship': scholarship} for year, mess_bill, scholarship in entries
+            }
+            self._changed_years = set()
+        return self._year_amounts
+
+    def set_year_amount(self, year, amount, value):
+        """Change one amount of a year; written to HostelYearEntry by save()"""
+        amounts = self.year_amounts().setdefault(year, {'mess_bill': 0, 'scholarship': 0})
+        amounts[amount] = value or 0
+        self._changed_years.add(year)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.save_year_amounts()
+
+    def save_year_amounts(self):
+        """
+        Write the years changed through set_year_amount() (or the compatibility
+        attributes) to HostelYearEntry; years left without amounts lose their entry.
+        """
+        if not getattr(self, '_changed_years', None):
+            return
+        amounts = {year: self._year_amounts[year] for year in sorted(self._changed_years)}
+        HostelYearEntry.objects.bulk_create(
+            [HostelYearEntry(record=self, year=year, **values) for year, values in amounts.items() if any(values.values())],
+            update_conflicts=True, unique_fields=['record', 'year'], update_fields=['mess_bill', 'scholarship'],
+        )
+        HostelYearEntry.objects.filter(
+            record=self, year__in=[year for year, values in amounts.items() if not any(values.values())]
+        ).delete()
+        self._changed_years = set()
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None:
+            self.__dict__.pop('_year_amounts', None)
+            self.__dict__.pop('_changed_years', None)
     
     @property
     def total_challan_paid(self):
@@ -77,23 +215,44 @@ class HostelRecords(models.Model):
     @property
     def total_mess_bill(self):
         """Total mess bill across all years"""
-        return (self.first_year_mess_bill + self.second_year_mess_bill + 
-                self.third_year_mess_bill + self.fourth_year_mess_bill + 
-                self.fifth_year_mess_bill)
+        return sum(amounts['mess_bill'] for amounts in self.year_amounts().values())
     
     @property
     def total_scholarship(self):
         """Total scholarship across all years"""
-        return (self.first_year_scholarship + self.second_year_scholarship + 
-                self.third_year_scholarship + self.fourth_year_scholarship + 
-                self.fifth_year_scholarship)
+        return sum(amounts['scholarship'] for amounts in self.year_amounts().values())
     
     @property
     def total_due(self):
         """Calculate total due using the equation: deposit + total_challan + total_scholarship - total_mess_bill"""
         return self.total_mess_bill - self.deposit - self.total_challan_paid - self.total_scholarship
-    
-   
+
+
+class HostelYearEntry(models.Model):
+    """
+    One year of a student's hostel account (the source of truth for year-wise
+    amounts). Written through HostelRecords (its compatibility attributes and
+    save()), dues.payments adjustments and the admin inline, always after the
+    record's own row was written in the same transaction, so writers queue on
+    the record's row lock. HostelRecords.save() drops years left without amounts.
+    """
+    record = models.ForeignKey(HostelRecords, on_delete=models.CASCADE, related_name='year_entries')
+    year = models.PositiveSmallIntegerField(help_text="Year of study (1 = 1st year)")
+    mess_bill = models.IntegerField(default=0)
+    scholarship = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['year']
+        constraints = [
+            models.UniqueConstraint(fields=['record', 'year'], name='hostel_year_entry_unique'),
+            models.CheckConstraint(condition=models.Q(year__gte=1), name='hostel_year_entry_year_positive'),
+        ]
+        indexes = [models.Index(fields=['year', 'record'], name='hostel_year_entry_year_idx')]
+
+    def __str__(self):
+        return f"{self.record_id} - Year {self.year}"
+
+
 
 
 class LibraryRecords(models.Model):
@@ -113,6 +272,10 @@ class LibraryRecords(models.Model):
         verbose_name = "Library Record"
         verbose_name_plural = "Library Records"
         ordering = ['-borrowing_date', 'student__user__username']
+        indexes = [
+            models.Index(fields=['-borrowing_date', '-id'], name='library_borrowed_idx'),
+            models.Index(fields=['updated_at', 'id'], name='library_updated_idx'),
+        ]
     
     def __str__(self):
         status = "Returned" if self.is_returned else "Borrowed"
@@ -145,11 +308,24 @@ class LegacyAcademicRecords(models.Model):
     # Administrative information
     tc_number = models.CharField(max_length=20, blank=True, null=True, help_text="Transfer Certificate number")
     tc_issued_date = models.DateField(blank=True, null=True, help_text="Transfer Certificate issued date")
-    
+
+    # Import provenance (kept so unmatched rows can be matched later)
+    source_roll_number = models.CharField(max_length=50, blank=True, null=True, db_index=True, help_text="Roll number as given in the Admissions Excel")
+    source_name = models.CharField(max_length=255, blank=True, null=True, help_text="Student name as given in the Admissions Excel")
+    match_confidence = models.DecimalField(max_digits=4, decimal_places=3, blank=True, null=True, help_text="Student match confidence (1 = exact roll number match)")
+    source_key = models.CharField(
+        max_length=150, unique=True, blank=True, null=True,
+        help_text="Identifies the workbook row (roll number + TC number, or a hash of its content) so re-imports update it"
+    )
+
+    # Nullable so existing rows need no backfill; they count as unchanged for ?since= delta sync
+    updated_at = models.DateTimeField(auto_now=True, null=True)
+
     class Meta:
         verbose_name = "Academic Record"
         verbose_name_plural = "Academic Records"
         ordering = ['student__user__username']
+        indexes = [models.Index(fields=['updated_at', 'id'], name='legacy_updated_idx')]
     
     def __str__(self):
         if self.student:
@@ -175,6 +351,10 @@ class SportsRecords(models.Model):
         verbose_name = "Sports Record"
         verbose_name_plural = "Sports Records"
         ordering = ['-borrowing_date', 'student__user__username']
+        indexes = [
+            models.Index(fields=['-borrowing_date', '-id'], name='sports_borrowed_idx'),
+            models.Index(fields=['updated_at', 'id'], name='sports_updated_idx'),
+        ]
 
     def __str__(self):
         status = "Returned" if self.is_returned else "Borrowed"
@@ -185,3 +365,75 @@ class SportsRecords(models.Model):
         """Placeholder for return status"""
         return False
 
+
+
+class DuesSnapshot(models.Model):
+    """
+    Outstanding dues of one department aggregated per course, batch and caste,
+    kept current by dues.snapshots so dashboards read O(groups) rows.
+    Missing course/batch/caste (or an unmatched legacy record) is stored as ''.
+    """
+    DEPARTMENT_CHOICES = [
+        ('hostel', 'Hostel'),
+        ('library', 'Library'),
+        ('sports', 'Sports'),
+        ('legacy', 'Legacy academic'),
+    ]
+
+    department = models.CharField(max_length=20, choices=DEPARTMENT_CHOICES)
+    course_name = models.CharField(max_length=255, blank=True, default='')
+    batch = models.CharField(max_length=10, blank=True, default='')
+    caste = models.CharField(max_length=10, blank=True, default='')
+
+    record_count = models.PositiveIntegerField(default=0)
+    records_with_dues = models.PositiveIntegerField(default=0, help_text="Records with a positive due")
+    records_cleared = models.PositiveIntegerField(default=0, help_text="Records with a due of exactly 0")
+    total_due = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tc_issued_count = models.PositiveIntegerField(default=0, help_text="Legacy records with a TC number")
+
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Dues Snapshot"
+        verbose_name_plural = "Dues Snapshots"
+        constraints = [
+            models.UniqueConstraint(fields=['department', 'course_name', 'batch', 'caste'], name='dues_snapshot_group_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.department}: {self.course_name or '-'} / {self.batch or '-'} / {self.caste or '-'}"
+
+
+class DuesSnapshotBuild(models.Model):
+    """
+    Marks a department whose snapshots have been fully built (by
+    refresh_dues_snapshots or another full refresh). Until then statistics
+    are aggregated from the records, since the signals only maintain groups
+    touched after deployment.
+    """
+    department = models.CharField(max_length=20, choices=DuesSnapshot.DEPARTMENT_CHOICES, unique=True)
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Dues Snapshot Build"
+        verbose_name_plural = "Dues Snapshot Builds"
+
+    def __str__(self):
+        return f"{self.department}: built {self.built_at:%Y-%m-%d %H:%M}"
+
+
+class DeletedRecord(models.Model):
+    """
+    Tombstone of a deleted dues record, so ?since= delta sync can report
+    deletions. Written by dues.signals on delete; purge_deleted_records drops
+    tombstones older than DELTA_SYNC_TOMBSTONE_DAYS.
+    """
+    record_type = models.CharField(max_length=20, help_text="dues.cache.MODEL_NAMESPACES name of the records table")
+    record_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['record_type', 'deleted_at'], name='deleted_record_since_idx')]
+
+    def __str__(self):
+        return f"{self.record_type} #{self.record_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,291 @@
+"""
+Set-based payment posting for academic and hostel dues.
+
+Postings are summed per record and applied as `amount = amount + delta`
+UPDATEs (one statement per chunk of records), so concurrent clerks never
+overwrite each other and a whole bank statement posts in a handful of queries.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from .models import YEAR_FIELDS, AcademicRecords, FeeStructure, HostelRecords
+from .signals import records_changed
+
+CHUNK_SIZE = 500
+
+# Payment columns that can be posted for each record type
+PAYMENT_FIELDS = {
+    'academic': ('paid_by_student', 'paid_by_govt'),
+    'hostel': ('f_challan1', 'f_challan2', 'renewal_amount'),
+}
+
+# Amounts that can be adjusted by a signed delta through the adjust action
+# (the hostel year fields are HostelYearEntry amounts, see YEAR_FIELDS)
+ADJUSTABLE_FIELDS = {
+    'academic': ('paid_by_student', 'paid_by_govt'),
+    'hostel': (*YEAR_FIELDS, 'deposit', 'renewal_amount', 'f_challan1', 'f_challan2'),
+}
+
+RECORD_MODELS = {
+    'academic': AcademicRecords,
+    'hostel': HostelRecords,
+}
+
+
+def fee_total_subquery():
+    """Per-row total fee (tuition + special + exam) of the record's fee structure"""
+    return Subquery(
+        FeeStructure.objects.filter(pk=OuterRef('fee_structure_id')).annotate(
+            total=Coalesce('tuition_fee', 0) + Coalesce('special_fee', 0) + Coalesce('exam_fee', 0)
+        ).values('total')[:1],
+        output_field=IntegerField(),
+    )
+
+
+def recompute_payment_status(queryset):
+    """
+    Recompute AcademicRecords.payment_status in SQL from the amounts paid.
+
+    Paid when the fee is fully covered, Processing when partly paid, Unpaid otherwise.
+    Records without a fee structure are left untouched. The amounts are the
+    source of truth: clearing dues (dues.bulk) pays the remainder rather than
+    only setting the status, so this never undoes a clear.
+    """
+    paid = F('paid_by_govt') + F('paid_by_student')
+    return queryset.filter(fee_structure__isnull=False).update(
+        payment_status=Case(
+            When(GreaterThanOrEqual(paid, fee_total_subquery()), then=Value('Paid')),
+            When(Q(paid_by_govt__gt=0) | Q(paid_by_student__gt=0), then=Value('Processing')),
+            default=Value('Unpaid'),
+        )
+    )
+
+
+def resolve_record_ids(postings):
+    """
+    Resolve each posting to a record id with one query per record type.
+
+    Postings reference a record either by `record_id` or by `roll_number`
+    (plus `academic_year_label` for academic records).
+
+    Returns:
+        tuple: (list of record ids aligned with postings, dict of index -> error message)
+    """
+    errors = {}
+    wanted = defaultdict(set)
+    by_roll = defaultdict(set)
+    for posting in postings:
+        if posting.get('record_id'):
+            wanted[posting['record_type']].add(posting['record_id'])
+        else:
+            by_roll[posting['record_type']].add(posting['roll_number'])
+
+    known_ids = {
+        record_type: set(RECORD_MODELS[record_type].objects.filter(pk__in=ids).values_list('pk', flat=True))
+        for record_type, ids in wanted.items()
+    }
+    roll_lookup = {}
+    if by_roll['hostel']:
+        roll_lookup['hostel'] = dict(
+            HostelRecords.objects.filter(student__user__username__in=by_roll['hostel'])
+            .values_list('student__user__username', 'pk')
+        )
+    if by_roll['academic']:
+        academic = defaultdict(list)
+        for username, label, pk in AcademicRecords.objects.filter(
+            student__user__username__in=by_roll['academic']
+        ).values_list('student__user__username', 'academic_year_label', 'pk'):
+            academic[username].append((label, pk))
+        roll_lookup['academic'] = academic
+
+    record_ids = []
+    for index, posting in enumerate(postings):
+        record_type = posting['record_type']
+        record_id = posting.get('record_id')
+        if record_id:
+            if record_id not in known_ids[record_type]:
+                errors[index] = f"{record_type.title()} record {record_id} does not exist"
+        elif record_type == 'hostel':
+            record_id = roll_lookup['hostel'].get(posting['roll_number'])
+            if record_id is None:
+                errors[index] = f"No hostel record for roll number {posting['roll_number']}"
+        else:
+            candidates = roll_lookup['academic'].get(posting['roll_number'], [])
+            label = posting.get('academic_year_label')
+            if label:
+                candidates = [c for c in candidates if c[0] == label]
+            if len(candidates) == 1:
+                record_id = candidates[0][1]
+            elif not candidates:
+                errors[index] = f"No academic record for roll number {posting['roll_number']}"
+            else:
+                errors[index] = f"Roll number {posting['roll_number']} has several academic records; give academic_year_label"
+        record_ids.append(record_id)
+    return record_ids, errors
+
+
+def version_updates(model):
+    """UPDATE values marking a row as written: version + 1 and updated_at = now, where `model` has them"""
+    field_names = {f.name for f in model._meta.concrete_fields}
+    updates = {}
+    if 'version' in field_names:
+        updates['version'] = F('version') + 1
+    if 'updated_at' in field_names:
+        updates['updated_at'] = timezone.now()
+    return updates
+
+
+def apply_increments(model, deltas, fields, conditions=()):
+    """
+    Add per-record deltas to the given columns with `col = COALESCE(col, 0) + CASE pk ... END`.
+
+    Rows are locked in primary key order first so overlapping batches from
+    concurrent clerks queue up instead of deadlocking. Every touched row gets
+    its version bumped (so stale full-record PUTs are rejected) and, where the
+    model has one, its updated_at set.
+
+    Args:
+        model: Model class to update
+        deltas: dict of record id -> dict of field -> delta
+        fields: Columns that may be incremented
+        conditions: Extra filter expressions the UPDATE must match (rows
+            failing them are left untouched)
+
+    Returns:
+        int: Number of rows updated
+    """
+    extra_updates = version_updates(model)
+    updated = 0
+    ids = sorted(deltas)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        list(model.objects.select_for_update().filter(pk__in=chunk).order_by('pk').values_list('pk', flat=True))
+        changes = {}
+        for field in fields:
+            whens = [When(pk=pk, then=Value(deltas[pk][field])) for pk in chunk if deltas[pk].get(field)]
+            if whens:
+                changes[field] = Coalesce(F(field), 0) + Case(*whens, default=Value(0), output_field=IntegerField())
+        if changes:
+            changes.update(extra_updates)
+            updated += model.objects.filter(*conditions, pk__in=chunk).update(**changes)
+    if updated:
+        records_changed.send(sender=model, queryset=model.objects.filter(pk__in=ids))
+    return updated
+
+
+def post_payments(postings, record_ids):
+    """
+    Apply validated postings atomically.
+
+    Args:
+        postings: Validated posting dicts
+        record_ids: Record id per posting (from resolve_record_ids)
+
+    Returns:
+        dict: Summary of touched records per type
+    """
+    deltas = {record_type: defaultdict(lambda: defaultdict(int)) for record_type in PAYMENT_FIELDS}
+    for posting, record_id in zip(postings, record_ids):
+        record_type = posting['record_type']
+        for field in PAYMENT_FIELDS[record_type]:
+            if posting.get(field):
+                deltas[record_type][record_id][field] += posting[field]
+
+    summary = {}
+    with transaction.atomic():
+        if deltas['academic']:
+            apply_increments(AcademicRecords, deltas['academic'], PAYMENT_FIELDS['academic'])
+            recompute_payment_status(AcademicRecords.objects.filter(pk__in=list(deltas['academic'])))
+        if deltas['hostel']:
+            apply_increments(HostelRecords, deltas['hostel'], PAYMENT_FIELDS['hostel'])
+    for record_type, per_record in deltas.items():
+        summary[record_type] = {
+            'records_updated': len(per_record),
+            'record_ids': sorted(per_record),
+        }
+    return summary
+
+
+class NegativeAmountError(Exception):
+    """An adjustment would leave one or more amounts below zero"""
+
+    def __init__(self, fields):
+        self.fields = fields
+        super().__init__(f"Adjustment would make {', '.join(fields)} negative")
+
+
+def adjust_record(record_type, record_id, deltas):
+    """
+    Apply signed deltas to a single record without reading it first.
+
+    The UPDATE only matches if every decreased amount stays non-negative, so
+    the check holds even against concurrent adjustments of the same record.
+    Hostel year amounts live in HostelYearEntry: for those the record row is
+    locked first and the year entries are read and rewritten under that lock.
+
+    Args:
+        record_type: 'academic' or 'hostel'
+        record_id: Primary key of the record
+        deltas: dict of field -> signed delta (fields from ADJUSTABLE_FIELDS)
+
+    Returns:
+        int: 1 if the record was updated, 0 if it does not exist
+
+    Raises:
+        NegativeAmountError: If an amount would drop below zero
+    """
+    model = RECORD_MODELS[record_type]
+    year_deltas = {field: delta for field, delta in deltas.items() if record_type == 'hostel' and field in YEAR_FIELDS}
+    deltas = {field: delta for field, delta in deltas.items() if field not in year_deltas}
+    conditions = [
+        GreaterThanOrEqual(Coalesce(F(field), 0) + Value(delta), 0)
+        for field, delta in deltas.items() if delta < 0
+    ]
+    with transaction.atomic():
+        if year_deltas and not adjust_year_amounts(record_id, year_deltas):
+            return 0
+        updated = apply_increments(model, {record_id: deltas}, ADJUSTABLE_FIELDS[record_type], conditions)
+        if not updated and conditions:
+            current = model.objects.filter(pk=record_id).values(*deltas).first()
+            if current is not None:
+                raise NegativeAmountError(
+                    [field for field, delta in deltas.items() if (current[field] or 0) + delta < 0]
+                )
+        if year_deltas and not deltas:
+            model.objects.filter(pk=record_id).update(**version_updates(model))
+            records_changed.send(sender=model, queryset=model.objects.filter(pk=record_id))
+            updated = 1
+        if updated and record_type == 'academic':
+            recompute_payment_status(AcademicRecords.objects.filter(pk=record_id))
+    return updated
+
+
+def adjust_year_amounts(record_id, deltas):
+    """
+    Add signed deltas to the year amounts of a hostel record, under its row lock.
+
+    Args:
+        record_id: Primary key of the hostel record
+        deltas: dict of YEAR_FIELDS name (e.g. first_year_mess_bill) -> signed delta
+
+    Returns:
+        int: 1 if the record exists, else 0
+
+    Raises:
+        NegativeAmountError: If an amount would drop below zero
+    """
+    record = HostelRecords.objects.select_for_update().only('pk').filter(pk=record_id).first()
+    if record is None:
+        return 0
+    negative = [field for field, delta in deltas.items() if getattr(record, field) + delta < 0]
+    if negative:
+        raise NegativeAmountError(negative)
+    for field, delta in deltas.items():
+        setattr(record, field, getattr(record, field) + delta)
+    record.save_year_amounts()
+    return 1
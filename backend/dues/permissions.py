@@ -17,4 +17,9 @@ class IsStaffOfDepartment(permissions.BasePermission):
 
 class IsAdminOrStaff(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and (request.user.is_staff or request.user.is_superuser) 
\ No newline at end of file
+        return request.user and request.user.is_authenticated and (request.user.is_staff or request.user.is_superuser) 
+
+class IsSuperUser(permissions.BasePermission):
+    """Administrators (superusers) only"""
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated and request.user.is_superuser)
@@ -1,18 +1,69 @@
-from rest_framework import serializers
-from .models import FeeStructure, AcademicRecords, HostelRecords, LibraryRecords, LegacyAcademicRecords, SportsRecords
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import YEAR_FIELDS, FeeStructure, AcademicRecords, HostelRecords, LibraryRecords, LegacyAcademicRecords, SportsRecords
 from core.serializers import StudentProfileSerializer
+from utils.fieldsets import DynamicFieldsMixin
+from .signals import records_changed
 from rest_framework.permissions import IsAuthenticated, AllowAny
 import logging
 from django.contrib.auth.models import User
 
 logger = logging.getLogger(__name__)
 
-class FeeStructureSerializer(serializers.ModelSerializer):
+class StaleRecordError(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'This record was changed by someone else. Reload it and try again.'
+    default_code = 'stale_record'
+
+
+class VersionedModelSerializer(serializers.ModelSerializer):
+    """
+    Optimistic locking for records with a `version` column.
+
+    A full update (PUT) must send the version it was based on; the write is a
+    single conditional UPDATE ... WHERE version = <sent version> that also bumps
+    the version, so a stale PUT is rejected with 409 instead of silently
+    overwriting another clerk's change. PATCH may omit the version. New
+    records always start at version 0; saves elsewhere (the admin) bump it
+    in VersionedModel.save().
+    """
+    version = serializers.IntegerField(required=False, min_value=0)
+
+    def create(self, validated_data):
+        validated_data.pop('version', None)
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        expected_version = validated_data.pop('version', None)
+        if expected_version is None and not self.partial:
+            raise serializers.ValidationError({'version': 'This field is required for full updates.'})
+
+        model = type(instance)
+        queryset = model.objects.filter(pk=instance.pk)
+        if expected_version is not None:
+            queryset = queryset.filter(version=expected_version)
+
+        changes = dict(validated_data)
+        changes['version'] = F('version') + 1
+        if any(f.name == 'updated_at' for f in model._meta.concrete_fields):
+            changes['updated_at'] = timezone.now()
+        if not queryset.update(**changes):
+            raise StaleRecordError()
+        # The UPDATE bypasses post_save: tell the records_changed receivers
+        records_changed.send(sender=model, queryset=model.objects.filter(pk=instance.pk))
+        instance.refresh_from_db()
+        return instance
+
+
+class FeeStructureSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = FeeStructure
         fields = '__all__'
 
-class AcademicRecordsSerializer(serializers.ModelSerializer):
+class AcademicRecordsSerializer(DynamicFieldsMixin, VersionedModelSerializer):
     student = StudentProfileSerializer(read_only=True)
     due_amount = serializers.ReadOnlyField()
     
@@ -26,8 +77,14 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['username']
 
 
-class HostelRecordsSerializer(serializers.ModelSerializer):
+class HostelRecordsSerializer(DynamicFieldsMixin, VersionedModelSerializer):
+    """
+    Hostel records with the year amounts both as `years` (every year with an
+    entry) and as the former per-year fields first_year_mess_bill ...
+    fifth_year_scholarship, which stay writable.
+    """
     student = StudentProfileSerializer(read_only=True)
+    years = serializers.SerializerMethodField()
     total_due = serializers.ReadOnlyField()
     total_mess_bill = serializers.ReadOnlyField()
     total_scholarship = serializers.ReadOnlyField()
@@ -37,6 +94,25 @@ class HostelRecordsSerializer(serializers.ModelSerializer):
         model = HostelRecords
         fields = '__all__'
 
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in YEAR_FIELDS:
+            fields[name] = serializers.IntegerField(required=False, min_value=0)
+        return fields
+
+    def get_years(self, obj):
+        return [{'year': year, **amounts} for year, amounts in sorted(obj.year_amounts().items())]
+
+    def update(self, instance, validated_data):
+        years = {name: validated_data.pop(name) for name in YEAR_FIELDS if name in validated_data}
+        with transaction.atomic():
+            # The conditional UPDATE takes the record's row lock before the entries are written
+            instance = super().update(instance, validated_data)
+            for name, value in years.items():
+                setattr(instance, name, value)
+            instance.save_year_amounts()
+        return instance
+
 class HostelDuesSerializer(serializers.ModelSerializer):
     """
     Serializer for hostel dues with year-wise breakdown (NO per-year due calculations)
@@ -68,24 +144,10 @@ class HostelDuesSerializer(serializers.ModelSerializer):
             relevant_years = get_relevant_years_for_course(course_name)
             
             # Create dues for each relevant year (DISPLAY ONLY - no per-year due calculations)
+            year_amounts = obj.year_amounts()
             for year in relevant_years:
-                if year == 1:
-                    mess_bill = obj.first_year_mess_bill
-                    scholarship = obj.first_year_scholarship
-                elif year == 2:
-                    mess_bill = obj.second_year_mess_bill
-                    scholarship = obj.second_year_scholarship
-                elif year == 3:
-                    mess_bill = obj.third_year_mess_bill
-                    scholarship = obj.third_year_scholarship
-                elif year == 4:
-                    mess_bill = obj.fourth_year_mess_bill
-                    scholarship = obj.fourth_year_scholarship
-                elif year == 5:
-                    mess_bill = obj.fifth_year_mess_bill
-                    scholarship = obj.fifth_year_scholarship
-                else:
-                    continue
+                mess_bill = year_amounts.get(year, {}).get('mess_bill', 0)
+                scholarship = year_amounts.get(year, {}).get('scholarship', 0)
                 
                 dues.append({
                     'id': f"{obj.id}_year_{year}",
@@ -117,14 +179,14 @@ class HostelDuesSerializer(serializers.ModelSerializer):
         return obj.total_due
 
 
-class LibraryRecordsSerializer(serializers.ModelSerializer):
+class LibraryRecordsSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     student = StudentProfileSerializer(read_only=True)
     
     class Meta:
         model = LibraryRecords
         fields = '__all__'
 
-class LegacyAcademicRecordsSerializer(serializers.ModelSerializer):
+class LegacyAcademicRecordsSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     student = StudentProfileSerializer(read_only=True)
     formatted_due_amount = serializers.SerializerMethodField()
     
@@ -136,7 +198,7 @@ class LegacyAcademicRecordsSerializer(serializers.ModelSerializer):
         return f"₹{obj.due_amount:,.2f}"
 
 
-class SportsRecordsSerializer(serializers.ModelSerializer):
+class SportsRecordsSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     student = StudentProfileSerializer(read_only=True)
     
     class Meta:
@@ -154,3 +216,54 @@ class SportsRecordsSerializer(serializers.ModelSerializer):
             except StudentProfile.DoesNotExist:
                 raise serializers.ValidationError("Student not found")
         return super().create(validated_data)
+
+
+class PaymentPostingSerializer(serializers.Serializer):
+    """
+    One line of a bulk payment posting (e.g. one bank statement entry).
+    The record is referenced by record_id or by the student's roll number.
+    """
+    record_type = serializers.ChoiceField(choices=['academic', 'hostel'])
+    record_id = serializers.IntegerField(required=False, min_value=1)
+    roll_number = serializers.CharField(required=False, max_length=150)
+    academic_year_label = serializers.ChoiceField(choices=['1', '2'], required=False)
+    reference = serializers.CharField(required=False, allow_blank=True, max_length=100)
+    # Academic payments
+    paid_by_student = serializers.IntegerField(required=False, min_value=0)
+    paid_by_govt = serializers.IntegerField(required=False, min_value=0)
+    # Hostel payments
+    f_challan1 = serializers.IntegerField(required=False, min_value=0)
+    f_challan2 = serializers.IntegerField(required=False, min_value=0)
+    renewal_amount = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, data):
+        from .payments import PAYMENT_FIELDS
+        if not data.get('record_id') and not data.get('roll_number'):
+            raise serializers.ValidationError("Provide record_id or roll_number")
+        allowed = PAYMENT_FIELDS[data['record_type']]
+        other = [f for fields in PAYMENT_FIELDS.values() for f in fields if f not in allowed and data.get(f)]
+        if other:
+            raise serializers.ValidationError(
+                f"{', '.join(other)} cannot be posted to {data['record_type']} records"
+            )
+        if not any(data.get(f) for f in allowed):
+            raise serializers.ValidationError(f"Provide at least one of: {', '.join(allowed)}")
+        return data
+
+
+class DuesAdjustmentSerializer(serializers.Serializer):
+    """Signed deltas for the adjust action, e.g. {"deltas": {"f_challan1": 500, "deposit": -200}}"""
+    deltas = serializers.DictField(child=serializers.IntegerField(), allow_empty=False)
+
+    def validate_deltas(self, value):
+        from .payments import ADJUSTABLE_FIELDS
+        allowed = ADJUSTABLE_FIELDS[self.context['record_type']]
+        unknown = [field for field in value if field not in allowed]
+        if unknown:
+            raise serializers.ValidationError(
+                f"Cannot adjust {', '.join(unknown)}. Adjustable fields: {', '.join(allowed)}"
+            )
+        value = {field: delta for field, delta in value.items() if delta}
+        if not value:
+            raise serializers.ValidationError("At least one non-zero delta is required")
+        return value
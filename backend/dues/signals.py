@@ -0,0 +1,89 @@
+"""
+Keep derived dues data current: cached dashboards (dues.cache) and the
+per-group snapshots (dues.snapshots). Before migrate, the former per-year
+hostel columns are copied into the year ledger (dues.ledger).
+
+Set-based writers that bypass model signals (bulk clear, payment posting,
+feed sync, legacy import) send `records_changed` instead.
+"""
+from django.db.models.signals import post_delete, post_save, pre_migrate, pre_save
+from django.dispatch import Signal, receiver
+
+from core.models import Course, StudentProfile, User
+from .models import DeletedRecord
+from .events import MAX_STUDENT_EVENTS, publish_later
+from .ledger import copy_year_columns
+from .cache import MODEL_NAMESPACES, STUDENT_NAMESPACE, invalidate_dashboards, invalidate_namespaces
+from .snapshots import (
+    MODEL_DEPARTMENTS, batched_student_group, forget_student_group, groups_of, refresh_later, student_group,
+)
+
+# Sent with sender=<records model> and queryset=<changed rows>, or
+# queryset=None when the changes can't be narrowed down
+records_changed = Signal()
+
+
+def record_saved_or_deleted(sender, instance, **kwargs):
+    invalidate_dashboards(sender)
+    publish_later(MODEL_NAMESPACES[sender], {instance.student_id})
+    if sender in MODEL_DEPARTMENTS:
+        refresh_later(MODEL_DEPARTMENTS[sender], {batched_student_group(instance.student_id)})
+
+
+def record_deleted(sender, instance, **kwargs):
+    # Tombstone for ?since= delta sync, in the deleting transaction
+    DeletedRecord.objects.create(record_type=MODEL_NAMESPACES[sender], record_id=instance.pk)
+
+
+for model in MODEL_NAMESPACES:
+    post_save.connect(record_saved_or_deleted, sender=model, dispatch_uid=f'dues-{model.__name__}-save')
+    post_delete.connect(record_saved_or_deleted, sender=model, dispatch_uid=f'dues-{model.__name__}-delete')
+    post_delete.connect(record_deleted, sender=model, dispatch_uid=f'dues-{model.__name__}-tombstone')
+
+
+@receiver(records_changed)
+def records_bulk_changed(sender, queryset=None, **kwargs):
+    invalidate_dashboards(sender)
+    students = None
+    if queryset is not None:
+        students = set(queryset.order_by().values_list('student_id', flat=True).distinct()[:MAX_STUDENT_EVENTS + 1])
+    publish_later(MODEL_NAMESPACES[sender], students)
+    if sender in MODEL_DEPARTMENTS:
+        refresh_later(MODEL_DEPARTMENTS[sender], None if queryset is None else groups_of(queryset))
+
+
+@receiver(pre_migrate, dispatch_uid='dues-copy-year-columns')
+def copy_hostel_year_columns(sender, app_config, using, **kwargs):
+    # Ahead of the migration that drops the per-year columns of HostelRecords
+    if app_config.label == 'dues':
+        copy_year_columns(using)
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Course)
+def invalidate_student_dashboards(sender, **kwargs):
+    invalidate_namespaces(STUDENT_NAMESPACE)
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, created, **kwargs):
+    # Snapshots are keyed by course name; a rename moves whole groups
+    if not created:
+        for department in MODEL_DEPARTMENTS.values():
+            refresh_later(department)
+
+
+@receiver(pre_save, sender=StudentProfile)
+def remember_student_group(sender, instance, **kwargs):
+    instance._snapshot_group = student_group(instance.pk) if instance.pk else None
+
+
+@receiver([post_save, post_delete], sender=StudentProfile)
+def student_changed(sender, instance, **kwargs):
+    invalidate_namespaces(STUDENT_NAMESPACE)
+    forget_student_group(instance.pk)
+    before = getattr(instance, '_snapshot_group', None)
+    after = student_group(instance.pk)
+    if before is not None and before != after:
+        for department in MODEL_DEPARTMENTS.values():
+            refresh_later(department, {before, after})
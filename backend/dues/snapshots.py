@@ -0,0 +1,287 @@
+"""
+Per-department dues snapshots (DuesSnapshot) keyed by course, batch and caste.
+
+A group is refreshed by re-aggregating only that group's records and
+upserting its snapshot row. dues.signals refreshes the groups touched by a
+save/delete (or a set-based write) after commit; refresh_dues_snapshots
+rebuilds everything and is meant to run periodically as a safety net.
+
+A department's snapshots are only read once a full refresh has marked them
+built (DuesSnapshotBuild); before that, statistics aggregate the records.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from core.models import StudentProfile
+from utils.transactions import CommitBatch
+from .models import DuesSnapshot, DuesSnapshotBuild, HostelRecords, LegacyAcademicRecords, LibraryRecords, SportsRecords
+
+MODEL_DEPARTMENTS = {
+    HostelRecords: 'hostel',
+    LibraryRecords: 'library',
+    SportsRecords: 'sports',
+    LegacyAcademicRecords: 'legacy',
+}
+
+# Snapshot column -> record lookup through the student
+GROUP_FIELDS = {
+    'course_name': 'student__course__name',
+    'batch': 'student__batch',
+    'caste': 'student__caste',
+}
+UNGROUPED = ('', '', '')
+# Beyond this many touched groups a full refresh is simpler than a long OR
+MAX_PARTIAL_GROUPS = 50
+
+
+def _records(department):
+    """(queryset, due expression) for a department's records"""
+    if department == 'hostel':
+        return HostelRecords.objects.with_totals(), 'due_total'
+    if department == 'legacy':
+        return LegacyAcademicRecords.objects.all(), 'due_amount'
+    model = LibraryRecords if department == 'library' else SportsRecords
+    return model.objects.all(), 'fine_amount'
+
+
+def _group_q(group):
+    """Q matching the records of one (course_name, batch, caste) group"""
+    q = Q()
+    for value, lookup in zip(group, GROUP_FIELDS.values()):
+        if value:
+            q &= Q(**{lookup: value})
+        else:
+            q &= Q(**{f'{lookup}__isnull': True}) | Q(**{lookup: ''})
+    return q
+
+
+def groups_of(queryset):
+    """Distinct (course_name, batch, caste) groups of a records queryset"""
+    return {
+        tuple(value or '' for value in row)
+        for row in queryset.order_by().values_list(*GROUP_FIELDS.values()).distinct()
+    }
+
+
+def student_group(student_id):
+    """The group of a student's records (UNGROUPED for unmatched legacy records)"""
+    if student_id is None:
+        return UNGROUPED
+    row = StudentProfile.objects.filter(pk=student_id).values_list('course__name', 'batch', 'caste').first()
+    return tuple(value or '' for value in row) if row else UNGROUPED
+
+
+def aggregate_groups(department, groups=None):
+    """
+    Aggregate a department's records per group.
+
+    Args:
+        department: One of MODEL_DEPARTMENTS' values
+        groups: Groups to aggregate, or None for all
+
+    Returns:
+        dict: group -> dict of DuesSnapshot counter fields
+    """
+    queryset, due = _records(department)
+    if groups is not None:
+        queryset = queryset.filter(reduce(or_, (_group_q(group) for group in groups), Q(pk__in=[])))
+    tc_issued = (
+        Count('id', filter=Q(tc_number__isnull=False) & ~Q(tc_number=''))
+        if department == 'legacy' else Value(0)
+    )
+    rows = queryset.order_by().values(*GROUP_FIELDS.values()).annotate(
+        record_count=Count('id'),
+        records_with_dues=Count('id', filter=Q(**{f'{due}__gt': 0})),
+        records_cleared=Count('id', filter=Q(**{due: 0})),
+        total_due=Coalesce(Sum(due), 0, output_field=DecimalField(max_digits=14, decimal_places=2)),
+        tc_issued_count=tc_issued,
+    )
+    totals = defaultdict(lambda: {
+        'record_count': 0, 'records_with_dues': 0, 'records_cleared': 0,
+        'total_due': Decimal(0), 'tc_issued_count': 0,
+    })
+    for row in rows:
+        # NULL and '' land in the same group
+        group = tuple(row[lookup] or '' for lookup in GROUP_FIELDS.values())
+        for field, total in totals[group].items():
+            totals[group][field] = total + row[field]
+    return totals
+
+
+def refresh_snapshots(department, groups=None):
+    """
+    Recompute the snapshot rows of `groups` (all groups when None) of a department.
+
+    Returns:
+        int: Number of snapshot rows written
+    """
+    totals = aggregate_groups(department, groups)
+    snapshots = [
+        DuesSnapshot(department=department, **dict(zip(GROUP_FIELDS, group)), **values)
+        for group, values in totals.items()
+    ]
+    with transaction.atomic():
+        DuesSnapshot.objects.bulk_create(
+            snapshots,
+            update_conflicts=True,
+            unique_fields=['department', *GROUP_FIELDS],
+            update_fields=['record_count', 'records_with_dues', 'records_cleared', 'total_due', 'tc_issued_count', 'refreshed_at'],
+        )
+        # Groups that no longer have any records
+        stale = DuesSnapshot.objects.filter(department=department)
+        if groups is not None:
+            stale = stale.filter(reduce(or_, (Q(**dict(zip(GROUP_FIELDS, group))) for group in groups), Q(pk__in=[])))
+        stale_ids = [
+            pk for pk, *group in stale.values_list('pk', *GROUP_FIELDS)
+            if tuple(group) not in totals
+        ]
+        if stale_ids:
+            DuesSnapshot.objects.filter(pk__in=stale_ids).delete()
+        if groups is None:
+            DuesSnapshotBuild.objects.update_or_create(department=department)
+    return len(snapshots)
+
+
+def snapshots_built(department):
+    """Whether a full refresh has built the department's snapshots"""
+    return DuesSnapshotBuild.objects.filter(department=department).exists()
+
+
+def _flush(items):
+    pending = defaultdict(set)
+    for department, group in items:
+        pending[department].add(group)
+    for department, groups in pending.items():
+        refresh_snapshots(department, None if None in groups else groups)
+
+
+# (department, group) pairs to refresh after commit; group None means all groups
+_pending_refreshes = CommitBatch(_flush)
+
+
+def batched_student_group(student_id):
+    """
+    student_group() memoized until the pending refreshes are flushed, so a
+    cascade or queryset delete of many records costs one lookup per student.
+    """
+    memo = _pending_refreshes.scratch
+    if student_id not in memo:
+        memo[student_id] = student_group(student_id)
+    return memo[student_id]
+
+
+def forget_student_group(student_id):
+    _pending_refreshes.scratch.pop(student_id, None)
+
+
+def refresh_later(department, groups=None):
+    """Refresh `groups` (all when None) of a department once the current transaction commits"""
+    if groups is None or len(groups) > MAX_PARTIAL_GROUPS:
+        _pending_refreshes.add((department, None))
+    else:
+        _pending_refreshes.add(*((department, group) for group in groups))
+
+
+def batch_year(batch):
+    """Admission year of a batch label ('2020-22' or '2020'), or None"""
+    try:
+        return int(batch.split('-')[0]) if '-' in batch else int(batch[:4])
+    except (ValueError, IndexError):
+        return None
+
+
+def _breakdown(rows, key, label):
+    """Sum snapshot rows per `key`, shaped like the legacy statistics lists"""
+    totals = defaultdict(lambda: [0, Decimal(0)])
+    for row in rows:
+        totals[row[key]][0] += row['record_count']
+        totals[row[key]][1] += row['total_due']
+    stats = [
+        {label: value or None, 'count': count, 'total_amount': amount, 'avg_amount': amount / count if count else 0}
+        for value, (count, amount) in totals.items()
+    ]
+    stats.sort(key=lambda item: item['total_amount'], reverse=True)
+    return stats
+
+
+def _contains(value, term):
+    return str(term).lower() in (value or '').lower()
+
+
+def _live_group_rows(department):
+    """aggregate_groups() of the records, shaped like snapshot rows"""
+    return [
+        {**dict(zip(GROUP_FIELDS, group)), **values}
+        for group, values in aggregate_groups(department).items()
+    ]
+
+
+def snapshot_statistics(department, course=None, batch=None, caste=None, year=None):
+    """
+    Dashboard statistics of a department read from its snapshot rows (O(groups)),
+    or aggregated from its records while the snapshots are not built yet.
+
+    The filters match the group columns the same way the record-level
+    statistics filter students (case-insensitive containment).
+
+    Returns:
+        dict: Totals plus year, course, caste and batch breakdowns
+    """
+    # (group column, search term) pairs
+    filters = []
+    if course and course != 'all':
+        filters.append(('course_name', course))
+    if caste:
+        filters.append(('caste', caste))
+    if batch:
+        filters.append(('batch', batch))
+    if year and year != 'all':
+        filters.append(('batch', str(year)))
+
+    if snapshots_built(department):
+        snapshots = DuesSnapshot.objects.filter(department=department)
+        batches = snapshots.exclude(batch='').values_list('batch', flat=True).distinct()
+        for column, term in filters:
+            snapshots = snapshots.filter(**{f'{column}__icontains': term})
+        rows = list(snapshots.values(
+            'course_name', 'batch', 'caste', 'record_count', 'records_with_dues', 'records_cleared', 'total_due', 'tc_issued_count'
+        ))
+    else:
+        rows = _live_group_rows(department)
+        batches = {row['batch'] for row in rows if row['batch']}
+        rows = [
+            row for row in rows
+            if all(_contains(row[column], term) for column, term in filters)
+        ]
+    available_years = sorted({year for year in map(batch_year, batches) if year is not None}, reverse=True)
+
+    years = defaultdict(lambda: [0, Decimal(0)])
+    for row in rows:
+        row_year = batch_year(row['batch']) if row['batch'] else None
+        if row_year is not None:
+            years[row_year][0] += row['record_count']
+            years[row_year][1] += row['total_due']
+
+    statistics = {
+        'total_records': sum(row['record_count'] for row in rows),
+        'records_with_dues': sum(row['records_with_dues'] for row in rows),
+        'records_without_dues': sum(row['records_cleared'] for row in rows),
+        'total_due_amount': float(sum((row['total_due'] for row in rows), Decimal(0))),
+        'year_statistics': [
+            {'year': row_year, 'count': count, 'total_amount': amount, 'avg_amount': amount / count if count else 0}
+            for row_year, (count, amount) in sorted(years.items(), reverse=True)
+        ],
+        'course_statistics': _breakdown(rows, 'course_name', 'student__course__name'),
+        'caste_statistics': _breakdown(rows, 'caste', 'student__caste'),
+        'batch_statistics': _breakdown(rows, 'batch', 'student__batch'),
+        'available_years': available_years,
+    }
+    if department == 'legacy':
+        statistics['tc_issued_count'] = sum(row['tc_issued_count'] for row in rows)
+    return statistics
@@ -0,0 +1,170 @@
+"""
+Server-sent event stream of dues changes (see dues.events).
+
+An async view: each open stream is a coroutine waiting on its broker
+subscription, not a worker thread, so hundreds of dashboards can stay
+connected to one ASGI process. It must be served over ASGI (e.g.
+`uvicorn ssp.asgi:application`); under WSGI it answers 503.
+
+EventSource can't send an Authorization header, and a token in the URL ends
+up in access logs, so browsers first POST to events/ticket/ for a signed
+ticket that is only good for opening a stream, for EVENT_STREAM_TICKET_SECONDS.
+A stream ends when the access token it was opened with expires, or when the
+account loses access; the client then gets a new ticket and reconnects.
+"""
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+from core.authentication import active_users, authenticate_token
+from utils.events import get_broker
+from .cache import MODEL_NAMESPACES
+
+# Comment lines keep proxies from closing idle streams
+KEEPALIVE_SECONDS = 15
+
+TICKET_SALT = 'dues.streams.ticket'
+TICKET_SECONDS = getattr(settings, 'EVENT_STREAM_TICKET_SECONDS', 60)
+
+
+def _audience(user):
+    """(allowed, student username or None) of a dict with the role flags and username"""
+    if user['is_staff'] or user['is_superuser']:
+        return True, None
+    if user['is_student']:
+        return True, user['username']
+    return False, None
+
+
+def _still_allowed(user_id, student):
+    """Whether the stream's account is still active with the access it was opened with"""
+    account = active_users.account(user_id)
+    if not (account and account['is_active']):
+        return False
+    if student is None:
+        return account['is_staff'] or account['is_superuser']
+    return account['is_student']
+
+
+def _event_stream(broker, subscription, departments, user_id, student, expires_at):
+    async def stream():
+        try:
+            # Tell EventSource how long to wait before reconnecting
+            yield 'retry: 3000\n\n'
+            while True:
+                remaining = expires_at - time.time()
+                if remaining <= 0:
+                    yield 'event: expired\ndata: {}\n\n'
+                    return
+                event = await subscription.get(min(KEEPALIVE_SECONDS, remaining))
+                if event is None:
+                    if not await sync_to_async(_still_allowed)(user_id, student):
+                        yield 'event: expired\ndata: {}\n\n'
+                        return
+                    yield ': keepalive\n\n'
+                    continue
+                if departments and event['model'] not in departments:
+                    continue
+                if student and event.get('student') not in (student, None):
+                    continue
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+    return stream()
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def event_ticket(request):
+    """
+    POST /api/dues/events/ticket/ -> {"ticket": ..., "expires_in": <seconds>}
+
+    The ticket can open GET /api/dues/events/?ticket=<ticket> for
+    `expires_in` seconds and nothing else; the stream lasts until the access
+    token used here expires.
+    """
+    ticket = signing.dumps(
+        {'user': request.user.id, 'username': request.user.username, 'exp': request.auth['exp']},
+        salt=TICKET_SALT,
+    )
+    return Response({'ticket': ticket, 'expires_in': TICKET_SECONDS})
+
+
+def _ticket_user(ticket):
+    """(user id, account with username, stream expiry) of a valid ticket, or None"""
+    try:
+        payload = signing.loads(ticket, salt=TICKET_SALT, max_age=TICKET_SECONDS)
+    except signing.BadSignature:
+        return None
+    account = active_users.account(payload['user'])
+    if not (account and account['is_active']):
+        return None
+    return payload['user'], {**account, 'username': payload['username']}, payload['exp']
+
+
+def _bearer_user(token):
+    """(user id, ClaimsUser attributes, token expiry) of a valid access token, or None"""
+    try:
+        user = authenticate_token(token)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    attributes = {name: getattr(user, name) for name in ('is_staff', 'is_superuser', 'is_student', 'username')}
+    return user.id, attributes, user.token['exp']
+
+
+async def dues_events(request):
+    """
+    GET /api/dues/events/?ticket=<events/ticket/ ticket>[&departments=hostel,library]
+
+    An `Authorization: Bearer` header works too, for clients that can send
+    one. Staff receive every change, filterable by department; students only
+    their own. Events: `changed` {model, student, outstanding, at}, `bulk`
+    {model, at} and `expired` (the stream ends; get a new ticket).
+    """
+    if not hasattr(request, 'scope'):
+        return JsonResponse({'error': 'The event stream is only served over ASGI'}, status=503)
+
+    ticket = request.GET.get('ticket')
+    header = request.headers.get('Authorization', '')
+    if ticket:
+        identity = await sync_to_async(_ticket_user)(ticket)
+    elif header.startswith('Bearer '):
+        identity = await sync_to_async(_bearer_user)(header[7:])
+    else:
+        return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=401)
+    if identity is None:
+        return JsonResponse({'error': 'Invalid or expired ticket or token'}, status=401)
+    user_id, user, expires_at = identity
+
+    departments = {name for name in request.GET.get('departments', '').split(',') if name}
+    unknown = departments - set(MODEL_NAMESPACES.values())
+    if unknown:
+        return JsonResponse({'error': f"Unknown department(s): {', '.join(sorted(unknown))}"}, status=400)
+    allowed, student = _audience(user)
+    if not allowed:
+        return JsonResponse({'error': 'You do not have permission to perform this action.'}, status=403)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    broker = get_broker()
+    subscription = broker.subscribe(last_event_id)
+    response = StreamingHttpResponse(
+        _event_stream(broker, subscription, departments, user_id, student, expires_at),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,231 @@
+"""
+Incremental, checksum-based sync of the weekly library and sports feeds.
+
+Each feed row is identified by a natural key (student roll number + book ID or
+equipment name + borrowing date) and carries content (the fine amount). Both are
+hashed, for the feed and for the stored records alike, so a full dump can be
+diffed against the table and only real inserts, updates and deletes are written.
+The stored side is hashed from its columns on every run, so edits made outside
+the sync (admin, bulk clear) are diffed like any other.
+
+Deletions are guarded: a feed without a single usable row deletes nothing, and
+one that would delete more than FEED_SYNC_MAX_DELETE_FRACTION of the stored
+records is refused unless the caller allows a mass delete.
+"""
+import csv
+import hashlib
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import StudentProfile
+from .models import LibraryRecords, SportsRecords
+from .signals import records_changed
+
+CHUNK_SIZE = 2000
+
+
+@dataclass
+class FeedSpec:
+    model: type
+    item_field: str        # book_id / equipment_name
+    item_aliases: tuple    # accepted feed header spellings for the item column
+
+
+FEEDS = {
+    'library': FeedSpec(LibraryRecords, 'book_id', ('book_id', 'bookid', 'book', 'accession_no')),
+    'sports': FeedSpec(SportsRecords, 'equipment_name', ('equipment_name', 'equipment', 'item')),
+}
+
+ROLL_ALIASES = ('roll_number', 'rollno', 'roll_no', 'username', 'student')
+DATE_ALIASES = ('borrowing_date', 'borrowed_on', 'date', 'issue_date')
+FINE_ALIASES = ('fine_amount', 'fine', 'amount')
+
+
+class MassDeleteError(ValueError):
+    """A sync would delete (nearly) everything; raised before anything is written"""
+
+
+@dataclass
+class SyncResult:
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    unknown_students: int = 0
+    invalid_rows: int = 0
+    unknown_rolls: set = field(default_factory=set)
+
+
+def _digest(*parts):
+    return hashlib.blake2b('\x1f'.join(parts).encode(), digest_size=16).hexdigest()
+
+
+def natural_key(roll_number, item, borrowing_date):
+    """Hash of the row identity: roll number, book ID / equipment name and date"""
+    return _digest(roll_number.strip().upper(), item.strip().lower(), borrowing_date.isoformat())
+
+
+def content_hash(fine_amount):
+    """Hash of the synced content columns"""
+    return _digest(f"{Decimal(fine_amount):.2f}")
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    for fmt in ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(str(value).strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _pick(header, aliases):
+    normalized = {h.strip().lower().replace(' ', '_'): h for h in header if h}
+    for alias in aliases:
+        if alias in normalized:
+            return normalized[alias]
+    return None
+
+
+def read_feed(path, spec):
+    """Yield (roll_number, item, borrowing_date, fine_amount) from a CSV feed; None for unparseable rows"""
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        reader = csv.DictReader(handle)
+        header = reader.fieldnames or []
+        columns = [_pick(header, aliases) for aliases in (ROLL_ALIASES, spec.item_aliases, DATE_ALIASES, FINE_ALIASES)]
+        if None in columns[:3]:
+            raise ValueError(
+                f"Feed must have roll number, {spec.item_field} and borrowing date columns (got: {', '.join(header)})"
+            )
+        roll_col, item_col, date_col, fine_col = columns
+        for row in reader:
+            roll = (row.get(roll_col) or '').strip()
+            item = (row.get(item_col) or '').strip()
+            borrowed = _parse_date(row.get(date_col))
+            try:
+                fine = Decimal((row.get(fine_col) or '0').replace(',', '').strip() or '0') if fine_col else Decimal('0')
+            except InvalidOperation:
+                fine = None
+            if not roll or not item or borrowed is None or fine is None:
+                yield None
+                continue
+            yield roll, item, borrowed, fine
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _check_deletes(missing, stored, seen, allow_mass_delete):
+    """Raise MassDeleteError if deleting `missing` of `stored` records looks like a broken feed"""
+    if not missing:
+        return
+    if not seen:
+        raise MassDeleteError(
+            f"The feed has no rows for known students; refusing to delete all {missing} stored records"
+        )
+    limit = getattr(settings, 'FEED_SYNC_MAX_DELETE_FRACTION', 0.2)
+    if not allow_mass_delete and missing > stored * limit:
+        raise MassDeleteError(
+            f"The feed would delete {missing} of {stored} stored records (more than {limit:.0%}); "
+            f"check the dump, or allow a mass delete"
+        )
+
+
+def sync_feed(feed, rows, delete_missing=True, dry_run=False, allow_mass_delete=False):
+    """
+    Diff feed rows against the stored records and apply only the changes.
+
+    Args:
+        feed: 'library' or 'sports'
+        rows: Iterable from read_feed()
+        delete_missing: Delete stored records that are absent from the feed (full dumps)
+        dry_run: Compute the diff without writing
+        allow_mass_delete: Delete more than FEED_SYNC_MAX_DELETE_FRACTION of the stored records
+
+    Returns:
+        SyncResult: Counts of what changed
+
+    Raises:
+        MassDeleteError: The feed would delete everything, or too much without allow_mass_delete
+    """
+    spec = FEEDS[feed]
+    model = spec.model
+    result = SyncResult()
+
+    students = {
+        username.upper(): student_id
+        for student_id, username in StudentProfile.objects.values_list('id', 'user__username').iterator(chunk_size=10000)
+    }
+
+    # key -> (id, content hash) for everything already stored
+    existing = {}
+    duplicates = []
+    stored = model.objects.values_list(
+        'id', 'student__user__username', spec.item_field, 'borrowing_date', 'fine_amount'
+    ).order_by().iterator(chunk_size=10000)
+    for pk, username, item, borrowed, fine in stored:
+        key = natural_key(username, item, borrowed)
+        if key in existing:
+            duplicates.append(pk)
+            continue
+        existing[key] = (pk, content_hash(fine))
+
+    inserts, updates, seen = {}, {}, set()
+    now = timezone.now()
+    for row in rows:
+        if row is None:
+            result.invalid_rows += 1
+            continue
+        roll, item, borrowed, fine = row
+        student_id = students.get(roll.upper())
+        if student_id is None:
+            result.unknown_students += 1
+            result.unknown_rolls.add(roll)
+            continue
+        key, digest = natural_key(roll, item, borrowed), content_hash(fine)
+        seen.add(key)
+        if key not in existing:
+            # Duplicates within the feed: the last row wins
+            inserts[key] = model(**{
+                'student_id': student_id, spec.item_field: item, 'borrowing_date': borrowed, 'fine_amount': fine,
+            })
+        elif existing[key][1] != digest:
+            updates[key] = model(id=existing[key][0], fine_amount=fine, updated_at=now)
+        else:
+            updates.pop(key, None)
+
+    result.inserted = len(inserts)
+    result.updated = len(updates)
+    result.unchanged = len(seen) - len(inserts) - len(updates)
+    deletes = []
+    if delete_missing:
+        missing = [pk for key, (pk, _) in existing.items() if key not in seen]
+        _check_deletes(len(missing), len(existing), seen, allow_mass_delete)
+        deletes = missing + duplicates
+    result.deleted = len(deletes)
+
+    if dry_run:
+        return result
+
+    with transaction.atomic():
+        if inserts:
+            model.objects.bulk_create(list(inserts.values()), batch_size=CHUNK_SIZE)
+        if updates:
+            model.objects.bulk_update(list(updates.values()), ['fine_amount', 'updated_at'], batch_size=CHUNK_SIZE)
+        for chunk in _chunks(deletes):
+            model.objects.filter(id__in=chunk).delete()
+        if inserts or updates:
+            # Deletes already went through post_delete
+            records_changed.send(sender=model)
+    return result
@@ -0,0 +1,83 @@
+"""Background jobs of the dues app (run by `manage.py run_workers`, see jobs.registry)"""
+import os
+import uuid
+from dataclasses import asdict
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+
+from jobs.registry import register
+from .exports import build_no_dues_workbook
+from .snapshots import MODEL_DEPARTMENTS, refresh_snapshots
+from .sync import FEEDS, read_feed, sync_feed
+
+
+@register('refresh_dues_snapshots', public=True)
+def refresh_dues_snapshots(context, departments=None):
+    """Rebuild the snapshots of `departments` (default: all)"""
+    departments = departments or sorted(MODEL_DEPARTMENTS.values())
+    unknown = set(departments) - set(MODEL_DEPARTMENTS.values())
+    if unknown:
+        raise ValueError(f"Unknown department(s): {', '.join(sorted(unknown))}")
+    groups = {}
+    for done, department in enumerate(departments):
+        context.progress(done, len(departments), f'Refreshing {department}')
+        groups[department] = refresh_snapshots(department)
+    context.progress(len(departments), len(departments), 'Done')
+    return {'groups': groups}
+
+
+# Deletes or overwrites records: superusers or holders of the explicit permission only
+DESTRUCTIVE = 'jobs.run_destructive_jobs'
+
+
+@register('sync_department_records', max_attempts=1, public=True, upload_field='path', permission=DESTRUCTIVE)
+def sync_department_records(context, feed, path, delete_missing=False, dry_run=False, allow_mass_delete=False):
+    """
+    Incremental sync of an uploaded library/sports dump (see dues.sync).
+    Unlike the command, a queued sync only deletes missing records when asked to.
+    """
+    if feed not in FEEDS:
+        raise ValueError(f"Unknown feed: {feed}")
+    context.progress(0, message=f'Syncing {feed} feed')
+    result = sync_feed(
+        feed, read_feed(path, FEEDS[feed]),
+        delete_missing=delete_missing, dry_run=dry_run, allow_mass_delete=allow_mass_delete,
+    )
+    result = asdict(result)
+    result['unknown_rolls'] = sorted(result['unknown_rolls'])[:100]
+    context.progress(1, 1, 'Done')
+    return result
+
+
+@register('import_legacy_records', max_attempts=1, public=True, upload_field='workbook', permission=DESTRUCTIVE)
+def import_legacy_records(context, workbook, sheet=None, dry_run=False, workers=0):
+    """
+    Import an uploaded legacy dues workbook. Fuzzy matching runs in-process
+    by default: the worker pool already provides the parallelism. At most
+    JOB_IMPORT_MAX_WORKERS matching processes are started.
+    """
+    if not os.path.exists(workbook):
+        raise ValueError(f"Workbook not found: {workbook}")
+    if isinstance(workers, bool) or not isinstance(workers, int) or workers < 0:
+        raise ValueError("workers must be a whole number of at least 0")
+    workers = min(workers, getattr(settings, 'JOB_IMPORT_MAX_WORKERS', 4))
+    context.progress(0, message='Importing workbook')
+    output = StringIO()
+    call_command(
+        'import_legacy_records', workbook, sheet=sheet, dry_run=dry_run, workers=workers,
+        stdout=output, no_color=True,
+    )
+    context.progress(1, 1, 'Done')
+    return {'output': output.getvalue().splitlines()}
+
+
+@register('export_no_dues_workbook', public=True)
+def export_no_dues_workbook(context, batch, file_format='xlsx'):
+    """Consolidated no-dues workbook of a batch, downloadable from the job"""
+    directory = os.path.join(settings.MEDIA_ROOT, 'exports')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'no-dues-{batch}-{uuid.uuid4().hex[:8]}.{file_format}')
+    counts = build_no_dues_workbook(batch, path, file_format=file_format, progress=context.progress)
+    return {'file': path, 'rows': counts}
@@ -1,95 +1,1001 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, models
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from rest_framework.test import APITestCase, APIClient
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
 from rest_framework import status
-from django.contrib.auth import get_user_model
-from core.models import Department, StudentProfile
-from .models import Dues
-
-User = get_user_model()
-
-class DuesAPITests(APITestCase):
-    def setUp(self):
-        # Create departments
-        self.department1 = Department.objects.create(name="Computer Science")
-        self.department2 = Department.objects.create(name="Mathematics")
-
-        # Create users
-        self.staff_user1 = User.objects.create_user(
-            username='staff1',
-            password='testpass123',
-            is_staff=True
-        )
-        self.staff_user2 = User.objects.create_user(
-            username='staff2',
-            password='testpass123',
-            is_staff=True
-        )
-        self.student_user = User.objects.create_user(
-            username='student1',
-            password='testpass123'
-        )
-
-        # Create staff profiles
-        self.staff_user1.staff_profile.department = self.department1
-        self.staff_user1.staff_profile.save()
-        self.staff_user2.staff_profile.department = self.department2
-        self.staff_user2.staff_profile.save()
-
-        # Create student
-        self.student = StudentProfile.objects.create(
-            user=self.student_user,
-            department=self.department1
-        )
-
-        # Create dues
-        self.dues = Dues.objects.create(
-            student=self.student,
-            department=self.department1,
-            amount=1000.00,
-            due_date='2024-12-31',
-            description='Tuition Fee',
-            created_by=self.staff_user1
-        )
-
-        # URLs
-        self.list_url = reverse('dues-list')
-        self.detail_url = reverse('dues-detail', args=[self.dues.id])
-        self.mark_paid_url = reverse('dues-mark-as-paid', args=[self.dues.id])
-
-    def test_create_dues(self):
-        self.client.force_authenticate(user=self.staff_user1)
-        data = {
-            'student': self.student.id,
-            'department': self.department1.id,
-            'amount': 500.00,
-            'due_date': '2024-12-31',
-            'description': 'Library Fee'
-        }
-        response = self.client.post(self.list_url, data)
-        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-
-    def test_cannot_create_dues_for_other_department(self):
-        self.client.force_authenticate(user=self.staff_user2)
-        data = {
-            'student': self.student.id,
-            'department': self.department1.id,
-            'amount': 500.00,
-            'due_date': '2024-12-31',
-            'description': 'Library Fee'
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework.throttling import BaseThrottle
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from core.authentication import active_users, issue_tokens
+from core.models import Course, StaffProfile, StudentProfile, User
+from jobs.registry import JobContext, enqueue
+from utils.caching import TwoTierCache
+from utils.events import InProcessBroker
+from utils.fieldsets import parse_fieldset
+from utils.renderers import ColumnarJSONRenderer, encode_table
+from .analytics import write_dataset
+from .bulk import clear_dues
+from .cache import dashboard_cache
+from .dashboard import _SummaryAccess
+from .exports import HOSTEL_SHEET, build_no_dues_workbook
+from .ledger import copy_year_columns, year_totals
+from .models import (
+    AcademicRecords, DuesSnapshot, DuesSnapshotBuild, FeeStructure, HostelRecords, HostelYearEntry, LegacyAcademicRecords,
+    LibraryRecords,
+)
+from .snapshots import refresh_snapshots
+from .streams import _event_stream, _ticket_user
+from .sync import FEEDS, MassDeleteError, read_feed, sync_feed
+from .tasks import import_legacy_records, sync_department_records
+
+
+class DuesFixtures:
+    """A staff clerk and two MBA students"""
+
+    def setUp(self):
+        cache.clear()
+        dashboard_cache.local.clear()
+        active_users.clear()
+        self.staff_user = User.objects.create(username='clerk@tu.in', is_staff=True)
+        StaffProfile.objects.create(user=self.staff_user, department='hostel', gender='M', phone_number='9000000000')
+        self.course = Course.objects.create(name='MBA', course_duration='2')
+        self.students = [
+            StudentProfile.objects.create(
+                user=User.objects.create(username=f'21MBA000{n}', is_student=True),
+                course=self.course, batch='2021-23', caste='OC',
+            )
+            for n in range(2)
+        ]
+        self.client.force_authenticate(user=self.staff_user)
+
+    def temp_path(self, suffix):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        return path
+
+
+class DuesAPITestCase(DuesFixtures, APITestCase):
+    pass
+
+
+class DuesTransactionTestCase(DuesFixtures, APITransactionTestCase):
+    """Commits for real, so the snapshot refreshes queued with on_commit run"""
+
+
+class LegacyImportTests(DuesAPITestCase):
+    HEADER = ('Roll No', 'Name', 'Batch', 'Due Amount', 'TC No')
+
+    def import_rows(self, *rows, **options):
+        path = self.temp_path('.xlsx')
+        workbook = Workbook()
+        workbook.active.title = 'Dues'
+        workbook.active.append(self.HEADER)
+        for row in rows:
+            workbook.active.append(row)
+        workbook.save(path)
+        call_command('import_legacy_records', path, workers=0, stdout=StringIO(), **options)
+
+    def test_reimport_of_reordered_workbook_updates_in_place(self):
+        known = ('21MBA0000', 'Student Zero', '2021', 500, None)
+        unknown = ('', 'Nobody Known', '2021', 300, None)
+        self.import_rows(known, unknown)
+        self.import_rows(('21MBA0001', 'Student One', '2021', 100, None), unknown, known)
+        self.assertEqual(LegacyAcademicRecords.objects.count(), 3)
+        self.assertEqual(
+            sorted(LegacyAcademicRecords.objects.values_list('due_amount', flat=True)), [100, 300, 500]
+        )
+
+    def test_reimport_keeps_linked_students_and_cleared_dues(self):
+        rows = (('21MBA0000', 'Student Zero', '2021', 500, 'TC1'), ('', 'Nobody Known', '2021', 300, None))
+        self.import_rows(*rows)
+        matched = LegacyAcademicRecords.objects.get(student=self.students[0])
+        unmatched = LegacyAcademicRecords.objects.get(student=None)
+        # A clerk clears the first due and links the second row by hand
+        LegacyAcademicRecords.objects.filter(pk=matched.pk).update(due_amount=0)
+        LegacyAcademicRecords.objects.filter(pk=unmatched.pk).update(student=self.students[1])
+
+        self.import_rows(*rows)
+        matched.refresh_from_db()
+        unmatched.refresh_from_db()
+        self.assertEqual(matched.due_amount, 0)
+        self.assertEqual(unmatched.student, self.students[1])
+        self.assertEqual(unmatched.due_amount, 300)
+
+    def test_queued_import_validates_workers(self):
+        context = JobContext(enqueue('import_legacy_records', {'workbook': ''}))
+        path = self.temp_path('.xlsx')
+        for workers in (-1, '4', True):
+            with self.assertRaisesMessage(ValueError, 'workers'):
+                import_legacy_records(context, path, workers=workers)
+
+    def test_unknown_sheet_is_a_command_error(self):
+        with self.assertRaisesMessage(CommandError, "No sheet named 'Sheet9'"):
+            self.import_rows(('21MBA0000', 'Student Zero', '2021', 500, None), sheet='Sheet9')
+        self.assertFalse(LegacyAcademicRecords.objects.exists())
+
+
+class FeedSyncTests(DuesAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.rows = [('21MBA0000', f'B{n}', f'2024-01-0{n + 1}', 10 * n) for n in range(5)]
+        sync_feed('library', read_feed(self.write_feed(self.rows), FEEDS['library']))
+
+    def write_feed(self, rows):
+        path = self.temp_path('.csv')
+        with open(path, 'w') as handle:
+            handle.write('roll_number,book_id,borrowing_date,fine_amount\n')
+            handle.writelines(','.join(map(str, row)) + '\n' for row in rows)
+        return path
+
+    def sync(self, rows, **options):
+        return sync_feed('library', read_feed(self.write_feed(rows), FEEDS['library']), **options)
+
+    def test_unchanged_feed_writes_nothing(self):
+        result = self.sync(self.rows)
+        self.assertEqual((result.inserted, result.updated, result.deleted, result.unchanged), (0, 0, 0, 5))
+
+    def test_empty_feed_deletes_nothing(self):
+        for rows in ([], [('99XX0000', 'B1', '2024-01-01', 5)]):
+            with self.assertRaises(MassDeleteError):
+                self.sync(rows, dry_run=True)
+            with self.assertRaises(MassDeleteError):
+                self.sync(rows, allow_mass_delete=True)
+        self.assertEqual(LibraryRecords.objects.count(), 5)
+
+    def test_mass_delete_needs_to_be_allowed(self):
+        with self.assertRaises(MassDeleteError):
+            self.sync(self.rows[:2])
+        self.assertEqual(LibraryRecords.objects.count(), 5)
+        self.assertEqual(self.sync(self.rows[:2], allow_mass_delete=True).deleted, 3)
+        self.assertEqual(LibraryRecords.objects.count(), 2)
+
+    def test_small_delete_goes_through(self):
+        self.assertEqual(self.sync(self.rows[1:]).deleted, 1)
+
+    def test_command_refuses_mass_delete(self):
+        with self.assertRaisesMessage(CommandError, 'would delete 4 of 5'):
+            call_command('sync_department_records', 'library', self.write_feed(self.rows[:1]), stdout=StringIO())
+        call_command(
+            'sync_department_records', 'library', self.write_feed(self.rows[:1]), allow_mass_delete=True,
+            stdout=StringIO(),
+        )
+        self.assertEqual(LibraryRecords.objects.count(), 1)
+
+    def test_queued_sync_keeps_missing_records_unless_asked(self):
+        context = JobContext(enqueue('sync_department_records', {'feed': 'library', 'path': ''}))
+        result = sync_department_records(context, 'library', self.write_feed(self.rows[:1]))
+        self.assertEqual((result['deleted'], LibraryRecords.objects.count()), (0, 5))
+        with self.assertRaises(MassDeleteError):
+            sync_department_records(context, 'library', self.write_feed(self.rows[:1]), delete_missing=True)
+        result = sync_department_records(
+            context, 'library', self.write_feed(self.rows[:1]), delete_missing=True, allow_mass_delete=True,
+        )
+        self.assertEqual(result['deleted'], 4)
+
+    def test_edits_outside_the_sync_are_diffed(self):
+        record = LibraryRecords.objects.get(borrowing_date=date(2024, 1, 3))
+        LibraryRecords.objects.filter(pk=record.pk).update(fine_amount=0)
+        result = self.sync(self.rows)
+        self.assertEqual(result.updated, 1)
+        record.refresh_from_db()
+        self.assertEqual(record.fine_amount, 20)
+
+
+class PaymentPostingTests(DuesAPITestCase):
+    def setUp(self):
+        super().setUp()
+        fee_structure = FeeStructure.objects.create(
+            course_name='MBA', academic_year='2021', category='OC', tuition_fee=1000
+        )
+        self.academic = AcademicRecords.objects.create(student=self.students[0], fee_structure=fee_structure)
+        self.hostel = HostelRecords.objects.create(student=self.students[0], first_year_mess_bill=1000)
+        self.url = reverse('payment-posting')
+
+    def post(self, *postings):
+        return self.client.post(self.url, {'postings': list(postings)}, format='json')
+
+    def test_postings_are_summed_per_record(self):
+        response = self.post(
+            {'record_type': 'academic', 'roll_number': '21MBA0000', 'paid_by_student': 300},
+            {'record_type': 'academic', 'record_id': self.academic.id, 'paid_by_govt': 200},
+            {'record_type': 'hostel', 'roll_number': '21MBA0000', 'f_challan1': 400},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.academic.refresh_from_db()
+        self.hostel.refresh_from_db()
+        self.assertEqual((self.academic.paid_by_student, self.academic.paid_by_govt), (300, 200))
+        self.assertEqual(self.academic.payment_status, 'Processing')
+        self.assertEqual(self.academic.version, 1)
+        self.assertEqual(self.hostel.f_challan1, 400)
+
+        self.post({'record_type': 'academic', 'record_id': self.academic.id, 'paid_by_student': 500})
+        self.academic.refresh_from_db()
+        self.assertEqual(self.academic.payment_status, 'Paid')
+
+    def test_one_bad_posting_applies_nothing(self):
+        response = self.post(
+            {'record_type': 'academic', 'roll_number': '21MBA0000', 'paid_by_student': 300},
+            {'record_type': 'hostel', 'roll_number': '21MBA0001', 'f_challan1': 400},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(list(response.data['errors']), [1])
+        self.academic.refresh_from_db()
+        self.assertEqual(self.academic.paid_by_student, 0)
+
+    def test_cleared_record_stays_paid(self):
+        self.post({'record_type': 'academic', 'record_id': self.academic.id, 'paid_by_govt': 200})
+        clear_dues(AcademicRecords.objects.all())
+        self.academic.refresh_from_db()
+        self.assertEqual((self.academic.paid_by_student, self.academic.payment_status), (800, 'Paid'))
+        # A later posting recomputes the status from the amounts, which now cover the fee
+        self.post({'record_type': 'academic', 'record_id': self.academic.id, 'paid_by_govt': 100})
+        self.academic.refresh_from_db()
+        self.assertEqual(self.academic.payment_status, 'Paid')
+
+
+class OptimisticLockingTests(DuesAPITestCase):
+    def setUp(self):
+        super().setUp()
+        fee_structure = FeeStructure.objects.create(
+            course_name='MBA', academic_year='2021', category='OC', tuition_fee=1000
+        )
+        self.record = AcademicRecords.objects.create(student=self.students[0], fee_structure=fee_structure)
+        self.url = reverse('academic-records-detail', args=[self.record.id])
+        self.data = {'fee_structure': fee_structure.id, 'paid_by_govt': 100, 'paid_by_student': 200}
+
+    def test_put_requires_version(self):
+        response = self.client.put(self.url, self.data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('version', response.data)
+
+    def test_put_with_current_version_bumps_it(self):
+        response = self.client.put(self.url, {**self.data, 'version': 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['version'], 1)
+        self.assertEqual(response.data['paid_by_student'], 200)
+
+    def test_put_with_stale_version_is_a_conflict(self):
+        self.client.put(self.url, {**self.data, 'version': 0}, format='json')
+        response = self.client.put(self.url, {**self.data, 'paid_by_govt': 999, 'version': 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.paid_by_govt, 100)
+
+    def test_save_bumps_version(self):
+        # As an admin change form does
+        self.record.remarks = 'Fee waiver approved'
+        self.record.save()
+        self.assertEqual(self.record.version, 1)
+        response = self.client.put(self.url, {**self.data, 'version': 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_adjust_rejects_negative_amounts(self):
+        url = reverse('academic-records-adjust', args=[self.record.id])
+        response = self.client.post(url, {'deltas': {'paid_by_govt': 100, 'paid_by_student': -1}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['fields'], ['paid_by_student'])
+
+        response = self.client.post(url, {'deltas': {'paid_by_govt': 100}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['paid_by_govt'], response.data['version']), (100, 1))
+        self.assertEqual(response.data['payment_status'], 'Processing')
+
+
+class AdminChangelistTests(DuesAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create(username='admin@tu.in', is_staff=True, is_superuser=True))
+        HostelRecords.objects.create(
+            student=self.students[0], first_year_mess_bill=3000, second_year_mess_bill=1500,
+            first_year_scholarship=500, deposit=2000, f_challan1=200, f_challan2=None,
+        )
+        HostelRecords.objects.create(student=self.students[1], first_year_mess_bill=100, deposit=100)
+
+    def test_sql_totals_match_the_properties(self):
+        for record in HostelRecords.objects.with_totals():
+            self.assertEqual(
+                (record.mess_bill_total, record.scholarship_total, record.challan_total, record.due_total),
+                (record.total_mess_bill, record.total_scholarship, record.total_challan_paid, record.total_due),
+            )
+
+    def test_hostel_changelist_filters_on_totals(self):
+        url = reverse('admin:dues_hostelrecords_changelist')
+        response = self.client.get(url, {'due_range': 'upto_2000'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([record.student for record in response.context['cl'].result_list], [self.students[0]])
+        response = self.client.get(url, {'due_range': 'zero'})
+        self.assertEqual([record.student for record in response.context['cl'].result_list], [self.students[1]])
+
+    def test_large_table_changelists_render(self):
+        LibraryRecords.objects.create(student=self.students[0], book_id='B1', borrowing_date='2024-01-01', fine_amount=50)
+        LegacyAcademicRecords.objects.create(student=self.students[0], due_amount=700, tc_number='TC1')
+        for model, params, count in (
+            ('libraryrecords', {'fine_range': 'upto_500'}, 1),
+            ('legacyacademicrecords', {'due_range': 'upto_2000', 'tc_issued': 'yes'}, 1),
+            ('sportsrecords', {}, 0),
+        ):
+            response = self.client.get(reverse(f'admin:dues_{model}_changelist'), params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, model)
+            self.assertEqual(response.context['cl'].result_count, count, model)
+
+
+class BulkClearTests(DuesTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.records = [
+            LegacyAcademicRecords.objects.create(student=student, due_amount=amount)
+            for student, amount in zip(self.students + [None], (500, 800, 300))
+        ]
+        self.url = reverse('legacy-academic-records-bulk-clear')
+
+    def snapshot_totals(self):
+        return {
+            (course_name, caste): (records_with_dues, total_due)
+            for course_name, caste, records_with_dues, total_due in DuesSnapshot.objects.filter(department='legacy')
+            .values_list('course_name', 'caste', 'records_with_dues', 'total_due')
         }
-        response = self.client.post(self.list_url, data)
+
+    def test_clear_by_ids(self):
+        response = self.client.post(self.url, {'ids': [self.records[0].id]}, format='json')
+        self.assertEqual(response.data, {'updated': 1})
+        self.assertEqual(
+            sorted(LegacyAcademicRecords.objects.values_list('due_amount', flat=True)), [0, 300, 800]
+        )
+
+    def test_selection_needs_ids_or_all_matching(self):
+        response = self.client.post(self.url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'ids': 'all'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_snapshots_follow_a_clear_filtered_on_the_cleared_column(self):
+        refresh_snapshots('legacy')
+        response = self.client.post(f'{self.url}?has_dues=true', {'all_matching': True}, format='json')
+        self.assertEqual(response.data, {'updated': 3})
+        self.assertEqual(self.snapshot_totals(), {('MBA', 'OC'): (0, 0), ('', ''): (0, 0)})
+
+    def test_admin_action_over_all_matching_rows(self):
+        self.client.force_login(User.objects.create(username='admin@tu.in', is_staff=True, is_superuser=True))
+        refresh_snapshots('legacy')
+        response = self.client.post(
+            reverse('admin:dues_legacyacademicrecords_changelist') + '?due_range=upto_500',
+            {'action': 'clear_due_amount', 'select_across': '1', 'index': '0', '_selected_action': [self.records[0].id]},
+        )
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(
+            sorted(LegacyAcademicRecords.objects.values_list('due_amount', flat=True)), [0, 0, 800]
+        )
+        self.assertEqual(self.snapshot_totals(), {('MBA', 'OC'): (1, 800), ('', ''): (0, 0)})
+
+
+@unittest.skipUnless('replica' in settings.DATABASES, 'needs a replica alias, e.g. ssp.settings_sqlite')
+@override_settings(REPLICA_DATABASE_ALIAS='replica')
+class ReplicaRoutingTests(DuesTransactionTestCase):
+    # Committed data, so the mirror's own connection can read it
+    databases = '__all__'
+
+    def setUp(self):
+        super().setUp()
+        self.record = LegacyAcademicRecords.objects.create(student=self.students[0], due_amount=500)
+        self.url = reverse('legacy-academic-records-list')
+
+    def queries_on(self, alias, request):
+        with CaptureQueriesContext(connections[alias]) as queries:
+            response = request()
+        self.assertLess(response.status_code, 300)
+        return len(queries)
+
+    def test_safe_requests_read_from_the_replica(self):
+        self.assertGreater(self.queries_on('replica', lambda: self.client.get(self.url)), 0)
+
+    def test_writers_read_their_writes_from_the_primary(self):
+        clear = reverse('legacy-academic-records-bulk-clear')
+        self.client.post(clear, {'ids': [self.record.id]}, format='json')
+        self.assertEqual(self.queries_on('replica', lambda: self.client.get(self.url)), 0)
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = TwoTierCache('test', poll_interval=0.01)
+        self.calls = 0
+
+    def compute(self, value='value', cacheable=True, delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value, cacheable
+        return compute
+
+    def test_values_are_cached_per_namespace_version(self):
+        self.assertEqual(self.cache.get_or_compute(('a',), 'k', self.compute('one')), 'one')
+        self.assertEqual(self.cache.get_or_compute(('a',), 'k', self.compute('two')), 'one')
+        self.cache.bump('b')
+        self.assertEqual(self.cache.get_or_compute(('a',), 'k', self.compute('two')), 'one')
+        self.cache.bump('a')
+        self.assertEqual(self.cache.get_or_compute(('a', 'b'), 'k', self.compute('two')), 'two')
+        self.assertEqual(self.calls, 2)
+
+    def test_other_workers_see_bumps_after_version_ttl(self):
+        other = TwoTierCache('test', version_ttl=0)
+        self.cache.get_or_compute(('a',), 'k', self.compute('one'))
+        other.bump('a')
+        self.cache.local.clear()
+        self.cache._versions.clear()
+        self.assertEqual(self.cache.get_or_compute(('a',), 'k', self.compute('two')), 'two')
+
+    def test_uncacheable_results_are_not_stored(self):
+        self.cache.get_or_compute(('a',), 'k', self.compute('error', cacheable=False))
+        self.assertEqual(self.cache.get_or_compute(('a',), 'k', self.compute('value')), 'value')
+        self.assertEqual(self.calls, 2)
+
+    def test_cold_key_is_computed_once(self):
+        results = []
+        workers = [
+            threading.Thread(target=lambda: results.append(
+                self.cache.get_or_compute(('a',), 'k', self.compute(delay=0.2))
+            ))
+            for _ in range(8)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(self.calls, 1)
+
+
+class DashboardCacheTests(DuesTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.record = LegacyAcademicRecords.objects.create(student=self.students[0], due_amount=500)
+        self.url = reverse('legacy-academic-records-statistics')
+
+    def total_due(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['total_due_amount']
+
+    def test_statistics_are_served_from_cache_until_a_save(self):
+        self.assertEqual(self.total_due(), 500)
+        # A raw UPDATE sends no signal, so the cached aggregate stays
+        LegacyAcademicRecords.objects.filter(pk=self.record.pk).update(due_amount=700)
+        self.assertEqual(self.total_due(), 500)
+        self.record.due_amount = 900
+        self.record.save()
+        self.assertEqual(self.total_due(), 900)
+
+    def test_set_based_writers_invalidate(self):
+        self.assertEqual(self.total_due(), 500)
+        clear_dues(LegacyAcademicRecords.objects.filter(pk=self.record.pk))
+        self.assertEqual(self.total_due(), 0)
+
+
+class SnapshotStatisticsTests(DuesAPITestCase):
+    def setUp(self):
+        super().setUp()
+        for student, fine in zip(self.students, (10, 20)):
+            LibraryRecords.objects.create(student=student, book_id='B1', borrowing_date='2024-01-01', fine_amount=fine)
+        self.url = reverse('library-records-statistics')
+
+    def test_live_statistics_until_snapshots_are_built(self):
+        # A partial refresh (as the signals do) must not switch to the snapshots
+        refresh_snapshots('library', groups={('MBA', '2021-23', 'OC')})
+        LibraryRecords.objects.filter(student=self.students[0]).update(fine_amount=0)
+        response = self.client.get(self.url)
+        self.assertFalse(DuesSnapshotBuild.objects.filter(department='library').exists())
+        self.assertEqual(response.data['total_records'], 2)
+        self.assertEqual(response.data['total_due_amount'], 20.0)
+        self.assertEqual(response.data['records_without_dues'], 1)
+
+    def test_snapshot_statistics_after_full_build(self):
+        refresh_snapshots('library')
+        # Out-of-band write the snapshots can't see: the answer must come from them
+        LibraryRecords.objects.update(fine_amount=0)
+        response = self.client.get(self.url, {'course': 'mba'})
+        self.assertEqual(response.data['total_records'], 2)
+        self.assertEqual(response.data['total_due_amount'], 30.0)
+        self.assertEqual(response.data['course_statistics'][0]['total_amount'], Decimal('30.00'))
+
+
+class SnapshotRefreshTests(DuesTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.record = LibraryRecords.objects.create(
+            student=self.students[0], book_id='B1', borrowing_date='2024-01-01', fine_amount=10,
+        )
+        call_command('refresh_dues_snapshots', 'library', stdout=StringIO())
+
+    def library_totals(self):
+        return list(DuesSnapshot.objects.filter(department='library').values_list('record_count', 'total_due'))
+
+    def test_saves_and_deletes_update_their_group(self):
+        self.assertEqual(self.library_totals(), [(1, Decimal('10.00'))])
+        LibraryRecords.objects.create(student=self.students[1], book_id='B2', borrowing_date='2024-01-01', fine_amount=5)
+        self.record.fine_amount = 40
+        self.record.save()
+        self.assertEqual(self.library_totals(), [(2, Decimal('45.00'))])
+        self.record.delete()
+        self.assertEqual(self.library_totals(), [(1, Decimal('5.00'))])
+
+    def test_unknown_department_is_a_command_error(self):
+        with self.assertRaises(CommandError):
+            call_command('refresh_dues_snapshots', 'canteen', stdout=StringIO())
+
+
+class NoDuesWorkbookTests(DuesAPITestCase):
+    def setUp(self):
+        super().setUp()
+        HostelRecords.objects.create(student=self.students[0], first_year_mess_bill=1000, deposit=100)
+        for student, fine in ((self.students[1], '12.50'), (self.students[0], '3.00')):
+            LibraryRecords.objects.create(student=student, book_id='B1', borrowing_date='2024-01-01', fine_amount=fine)
+        other_batch = StudentProfile.objects.create(
+            user=User.objects.create(username='22MBA0000', is_student=True), course=self.course, batch='2022-24',
+        )
+        LibraryRecords.objects.create(student=other_batch, book_id='B2', borrowing_date='2024-01-01', fine_amount=99)
+
+    def test_workbook_has_a_sheet_per_department(self):
+        path = self.temp_path('.xlsx')
+        call_command('export_no_dues_workbook', '2021-23', output=path, workers=0, stdout=StringIO())
+        workbook = load_workbook(path, read_only=True)
+        self.assertEqual(workbook.sheetnames, ['Hostel', 'Library', 'Sports', 'Academic', 'Legacy'])
+
+        library = list(workbook['Library'].iter_rows(values_only=True))
+        self.assertEqual(library[0][-3:], ('Book ID', 'Borrowing Date', 'Fine Amount'))
+        self.assertEqual([(row[0], row[-1]) for row in library[1:]], [('21MBA0000', 3), ('21MBA0001', 12.5)])
+
+        hostel = list(workbook['Hostel'].iter_rows(values_only=True))
+        self.assertEqual(len(hostel), 2)
+        self.assertEqual(hostel[1][-1], HostelRecords.objects.with_totals().get().due_total)
+        self.assertEqual(len(list(workbook['Sports'].iter_rows())), 1)
+
+    def test_zip_of_csvs(self):
+        path = self.temp_path('.zip')
+        counts = build_no_dues_workbook('2021-23', path, file_format='zip', workers=0)
+        self.assertEqual(counts, {'Hostel': 1, 'Library': 2, 'Sports': 0, 'Academic': 0, 'Legacy': 0})
+        with zipfile.ZipFile(path) as archive:
+            self.assertIn('2021-23-library.csv', archive.namelist())
+            rows = list(csv.reader(io.TextIOWrapper(archive.open('2021-23-library.csv'))))
+        self.assertEqual([row[-1] for row in rows], ['Fine Amount', '3.00', '12.50'])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            build_no_dues_workbook('2021-23', self.temp_path('.pdf'), file_format='pdf', workers=0)
+
+
+class CSVExportTests(DuesAPITestCase):
+    def export(self, basename, **params):
+        response = self.client.get(reverse(f'{basename}-export'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename=', response['Content-Disposition'])
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_legacy_export_applies_the_list_filters(self):
+        LegacyAcademicRecords.objects.create(student=self.students[0], due_amount=500, tc_number='TC1')
+        LegacyAcademicRecords.objects.create(student=self.students[1], due_amount=0)
+        rows = self.export('legacy-academic-records', has_dues='true')
+        self.assertEqual(rows[0][:2], ['Roll Number', 'Name'])
+        self.assertEqual([(row[0], row[4], row[5]) for row in rows[1:]], [('21MBA0000', '500.00', 'TC1')])
+        self.assertEqual(len(self.export('legacy-academic-records')), 3)
+
+    def test_hostel_export_filters_on_the_computed_due(self):
+        HostelRecords.objects.create(student=self.students[0], first_year_mess_bill=1000)
+        HostelRecords.objects.create(student=self.students[1])
+        rows = self.export('hostel-records', has_dues='false')
+        self.assertEqual([row[0] for row in rows[1:]], ['21MBA0001'])
+        self.assertEqual(rows[0][-1], 'Total Due')
+
+    def test_students_cannot_export(self):
+        self.client.force_authenticate(user=self.students[0].user)
+        response = self.client.get(reverse('library-records-export'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@unittest.skipIf(pyarrow is None, 'needs pyarrow')
+class AnalyticsExportTests(DuesAPITestCase):
+    def setUp(self):
+        super().setUp()
+        for student, fine in zip(self.students, ('12.50', '0.05')):
+            LibraryRecords.objects.create(student=student, book_id='B1', borrowing_date='2024-01-01', fine_amount=fine)
+        self.admin = User.objects.create(username='admin@tu.in', is_staff=True, is_superuser=True)
+
+    def test_decimals_and_dates_stay_typed(self):
+        sink = io.BytesIO()
+        self.assertEqual(write_dataset('library', sink, 'arrow', chunk_size=1), 2)
+        table = pyarrow.ipc.open_file(io.BytesIO(sink.getvalue())).read_all()
+        self.assertEqual(str(table.schema.field('fine_amount').type), 'decimal128(10, 2)')
+        self.assertEqual(table.column('fine_amount').to_pylist(), [Decimal('12.50'), Decimal('0.05')])
+        self.assertEqual(table.column('borrowing_date').to_pylist(), [date(2024, 1, 1)] * 2)
+        self.assertEqual(table.column('roll_number').to_pylist(), ['21MBA0000', '21MBA0001'])
+
+    def test_parquet_download_is_for_superusers(self):
+        url = reverse('analytics-export', args=['library'])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        table = pyarrow.parquet.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.num_rows, 2)
+
+    def test_unknown_dataset_and_format(self):
+        self.client.force_authenticate(user=self.admin)
+        self.assertEqual(
+            self.client.get(reverse('analytics-export', args=['canteen'])).status_code, status.HTTP_404_NOT_FOUND
+        )
+        response = self.client.get(reverse('analytics-export', args=['library']), {'file_format': 'csv'})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
-    def test_student_can_view_own_dues(self):
-        self.client.force_authenticate(user=self.student_user)
-        response = self.client.get(self.list_url)
+
+class DeltaSyncTests(DuesAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.since = (timezone.now() - timedelta(minutes=1)).isoformat()
+        self.records = [
+            LegacyAcademicRecords.objects.create(student=student, due_amount=500) for student in self.students
+        ]
+        self.url = reverse('legacy-academic-records-list')
+
+    def test_deleted_records_are_reported(self):
+        deleted_id = self.records[0].id
+        self.records[0].delete()
+        response = self.client.get(self.url, {'since': self.since})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data['deleted'], [deleted_id])
+        self.assertEqual([record['id'] for record in response.data['changed']], [self.records[1].id])
+
+    def test_records_leaving_the_filters_are_removed(self):
+        clear_dues(LegacyAcademicRecords.objects.filter(pk=self.records[0].pk))
+        response = self.client.get(self.url, {'since': self.since, 'has_dues': 'true'})
+        self.assertEqual([record['id'] for record in response.data['changed']], [self.records[1].id])
+        self.assertEqual(response.data['removed'], [self.records[0].id])
+
+        response = self.client.get(self.url, {'since': self.since})
+        self.assertEqual(response.data['removed'], [])
+
+    def test_rows_without_updated_at_count_as_changed(self):
+        LegacyAcademicRecords.objects.filter(pk=self.records[0].pk).update(updated_at=None)
+        response = self.client.get(self.url, {'since': timezone.now().isoformat()})
+        self.assertEqual([record['id'] for record in response.data['changed']], [self.records[0].id])
+
+    def test_old_token_must_reload(self):
+        response = self.client.get(self.url, {'since': (timezone.now() - timedelta(days=365)).isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+
+class RecordingBroker(InProcessBroker):
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def has_subscribers(self):
+        return True
+
+    def publish(self, event):
+        self.published.append(event)
+
+
+class EventStreamTests(DuesTransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.broker = RecordingBroker()
+        self.enterContext(mock.patch('dues.events.get_broker', return_value=self.broker))
+
+    def test_saves_publish_the_new_outstanding_amount(self):
+        record = LibraryRecords.objects.create(
+            student=self.students[0], book_id='B1', borrowing_date='2024-01-01', fine_amount='12.50',
+        )
+        record.delete()
+        self.assertEqual(
+            [(event['type'], event['student'], Decimal(event['outstanding'])) for event in self.broker.published],
+            [('changed', '21MBA0000', Decimal('12.5')), ('changed', '21MBA0000', 0)],
+        )
+
+    def test_bulk_writes_publish_one_bulk_event(self):
+        LegacyAcademicRecords.objects.create(student=self.students[0], due_amount=500)
+        self.broker.published.clear()
+        clear_dues(LegacyAcademicRecords.objects.all())
+        self.assertEqual([event['type'] for event in self.broker.published], ['changed'])
+        self.broker.published.clear()
+        with mock.patch('dues.events.MAX_STUDENT_EVENTS', 0):
+            clear_dues(LegacyAcademicRecords.objects.all())
+        self.assertEqual([(event['type'], event['model']) for event in self.broker.published], [('bulk', 'legacy')])
+
+    def test_tickets_are_signed_and_need_an_active_account(self):
+        access = issue_tokens(self.staff_user).access_token
+        self.client.force_authenticate(user=None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        ticket = self.client.post(reverse('dues-event-ticket')).data['ticket']
+        user_id, user, _ = _ticket_user(ticket)
+        self.assertEqual((user_id, user['username'], user['is_staff']), (self.staff_user.id, 'clerk@tu.in', True))
+        self.assertIsNone(_ticket_user(ticket[:-2] + 'xx'))
+        User.objects.filter(pk=self.staff_user.pk).update(is_active=False)
+        active_users.clear()
+        self.assertIsNone(_ticket_user(ticket))
+
+    def test_stream_needs_asgi(self):
+        self.assertEqual(self.client.get(reverse('dues-events')).status_code, 503)
+
+
+class EventStreamFilterTests(SimpleTestCase):
+    def read(self, events, departments=(), student=None, count=1):
+        async def run():
+            broker = InProcessBroker()
+            subscription = broker.subscribe()
+            for event in events:
+                broker.publish(event)
+            stream = _event_stream(broker, subscription, set(departments), 1, student, time.time() + 60)
+            chunks = [await anext(stream) for _ in range(count + 1)]
+            await stream.aclose()
+            return chunks[1:], broker.has_subscribers()
+        return asyncio.run(run())
+
+    def test_events_are_filtered_by_department_and_student(self):
+        events = [
+            {'type': 'changed', 'model': 'hostel', 'student': '21MBA0000'},
+            {'type': 'changed', 'model': 'library', 'student': '21MBA0001'},
+            {'type': 'bulk', 'model': 'library'},
+        ]
+        chunks, subscribed = self.read(events, departments={'library'}, student='21MBA0000')
+        self.assertIn('event: bulk', chunks[0])
+        self.assertFalse(subscribed)
+        chunks, _ = self.read(events, count=3)
+        self.assertEqual([chunk.split('\n')[1] for chunk in chunks], ['event: changed', 'event: changed', 'event: bulk'])
 
-    def test_mark_as_paid(self):
-        self.client.force_authenticate(user=self.staff_user1)
-        response = self.client.post(self.mark_paid_url)
+
+class DenyAll(BaseThrottle):
+    def allow_request(self, request, view):
+        return False
+
+
+class DashboardSummaryTests(DuesTransactionTestCase):
+    # Sections run on pool threads, which only see committed rows
+    def setUp(self):
+        super().setUp()
+        LegacyAcademicRecords.objects.create(student=self.students[0], due_amount=500)
+        LegacyAcademicRecords.objects.create(student=self.students[1], due_amount=0)
+        self.url = reverse('dues-summary')
+
+    def test_sections_are_summed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertTrue(data['complete'])
+        self.assertEqual(
+            data['sections']['legacy'],
+            {'total_records': 2, 'records_with_dues': 1, 'records_without_dues': 1, 'total_due_amount': 500.0},
+        )
+        self.assertEqual(data['sections']['hostel']['total_records'], 0)
+
+    def test_drf_authentication_permissions_and_throttles(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {issue_tokens(self.staff_user).access_token}')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+        self.client.credentials()
+        self.client.force_authenticate(user=self.students[0].user)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(user=self.staff_user)
+        with mock.patch.object(_SummaryAccess, 'throttle_classes', [DenyAll]):
+            self.assertEqual(self.client.get(self.url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_failed_section_has_a_generic_error(self):
+        def aggregate(name):
+            if name == 'sports':
+                raise RuntimeError('relation "dues_sportsrecords" does not exist')
+            return {'total_records': 0}
+
+        with mock.patch('dues.dashboard._aggregate', side_effect=aggregate), self.assertLogs('dues.dashboard'):
+            data = self.client.get(self.url).json()
+        self.assertFalse(data['complete'])
+        self.assertEqual(data['sections']['sports'], {'error': 'Failed to load this section'})
+        self.assertEqual(data['sections']['library'], {'total_records': 0})
+
+
+class SparseFieldsetTests(DuesAPITestCase):
+    def setUp(self):
+        super().setUp()
+        for student in self.students:
+            LibraryRecords.objects.create(student=student, book_id='B1', borrowing_date='2024-01-01', fine_amount=5)
+        self.url = reverse('library-records-list')
+
+    def get(self, **params):
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data, [query['sql'] for query in queries]
+
+    def test_parse_fieldset(self):
+        self.assertEqual(
+            parse_fieldset('id, student.user.username,student.batch,'),
+            {'id': {}, 'student': {'user': {'username': {}}, 'batch': {}}},
+        )
+
+    def test_fields_prune_the_response_and_the_query(self):
+        data, queries = self.get(fields='id,fine_amount,student.user.username')
+        self.assertEqual(data[0], {'id': data[0]['id'], 'fine_amount': '5.00', 'student': {'user': {'username': '21MBA0000'}}})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('mobile_number', queries[0])
+        self.assertNotIn('book_id', queries[0])
+
+    def test_exclude_drops_the_related_columns(self):
+        data, queries = self.get(exclude='student')
+        self.assertNotIn('student', data[0])
+        self.assertIn('book_id', data[0])
+        selected = queries[0].split(' FROM ')[0]
+        self.assertNotIn('core_studentprofile', selected)
+        self.assertNotIn('core_user', selected)
+
+    def test_unknown_names_are_ignored(self):
+        data, _ = self.get(fields='id,nope,student.nope')
+        self.assertEqual(set(data[0]), {'id', 'student'})
+
+
+class ColumnarFormatTests(DuesAPITestCase):
+    def test_encode_table(self):
+        table = encode_table([
+            {'name': 'A', 'course': 'MBA', 'user': {'username': 'a'}, 'records': [{'id': 1}, {'id': 2}]},
+            {'name': 'B', 'course': None, 'user': {'username': 'b'}, 'records': []},
+            {'name': 'C', 'course': 'MBA', 'user': {'username': 'c'}, 'records': [{'id': 3}]},
+        ], dictionary_columns=('course',))
+        self.assertEqual(table['columns'], ['name', 'course', 'user.username'])
+        self.assertEqual(table['values'], [['A', 'B', 'C'], [0, None, 0], ['a', 'b', 'c']])
+        self.assertEqual(table['dictionaries'], {'course': ['MBA']})
+        self.assertEqual(
+            table['children']['records'],
+            {'length': 3, 'columns': ['_parent', 'id'], 'values': [[0, 0, 2], [1, 2, 3]]},
+        )
+
+    def test_only_lists_and_pages_are_encoded(self):
+        renderer = ColumnarJSONRenderer()
+        self.assertEqual(json.loads(renderer.render({'error': 'nope'})), {'error': 'nope'})
+        page = json.loads(renderer.render({'count': 1, 'results': [{'id': 1}]}))
+        self.assertEqual((page['count'], page['results']['values']), (1, [[1]]))
+
+    def test_grouped_listing_as_columnar(self):
+        for student in self.students:
+            LibraryRecords.objects.create(student=student, book_id='B1', borrowing_date='2024-01-01', fine_amount=5)
+        url = reverse('library-records-grouped-by-student')
+        plain = self.client.get(url)
+        self.assertEqual(len(plain.json()), 2)
+
+        response = self.client.get(url, {'format': 'columnar'})
+        self.assertEqual(response['Content-Type'], 'application/vnd.columnar+json')
+        table = response.json()
+        self.assertEqual(table['length'], 2)
+        self.assertEqual(table['dictionaries'], {'course': ['MBA'], 'batch': ['2021-23']})
+        column = table['columns'].index('total_fine_amount')
+        self.assertEqual(table['values'][column], [5.0, 5.0])
+        self.assertEqual(table['children']['records']['length'], 2)
+
+
+class HostelLedgerTests(DuesAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.record = HostelRecords.objects.create(
+            student=self.students[0], first_year_mess_bill=1000, first_year_scholarship=200, deposit=100
+        )
+
+    def entries(self):
+        return {
+            year: (mess_bill, scholarship)
+            for year, mess_bill, scholarship in HostelYearEntry.objects.filter(record=self.record)
+            .values_list('year', 'mess_bill', 'scholarship')
+        }
+
+    def test_put_writes_the_year_entries(self):
+        url = reverse('hostel-records-detail', args=[self.record.id])
+        response = self.client.put(
+            url, {'version': 0, 'first_year_scholarship': 0, 'third_year_mess_bill': 500}, format='json'
+        )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.dues.refresh_from_db()
-        self.assertTrue(self.dues.is_paid) 
\ No newline at end of file
+        self.assertEqual(self.entries(), {1: (1000, 0), 3: (500, 0)})
+        self.assertEqual((response.data['version'], response.data['third_year_mess_bill']), (1, 500))
+        self.assertEqual(response.data['total_due'], 1400)
+
+    def test_adjust_writes_the_year_entries(self):
+        url = reverse('hostel-records-adjust', args=[self.record.id])
+        response = self.client.post(
+            url, {'deltas': {'first_year_mess_bill': -1000, 'second_year_scholarship': 300}}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.entries(), {1: (0, 200), 2: (0, 300)})
+        self.record.refresh_from_db()
+        self.assertEqual(self.record.version, 1)
+
+    def test_adjust_rejects_negative_year_amounts(self):
+        url = reverse('hostel-records-adjust', args=[self.record.id])
+        response = self.client.post(
+            url, {'deltas': {'first_year_scholarship': -300, 'deposit': 50}}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['fields'], ['first_year_scholarship'])
+        self.record.refresh_from_db()
+        self.assertEqual((self.record.deposit, self.record.version, self.entries()), (100, 0, {1: (1000, 200)}))
+
+    def test_a_sixth_year_counts_everywhere(self):
+        HostelYearEntry.objects.create(record=self.record, year=6, mess_bill=700)
+        totals = HostelRecords.objects.with_totals().get(pk=self.record.pk)
+        self.assertEqual((totals.mess_bill_total, totals.due_total), (1700, 1400))
+        self.assertEqual(HostelRecords.objects.get(pk=self.record.pk).total_due, 1400)
+        self.assertEqual([row['year'] for row in year_totals()], [1, 6])
+
+        response = self.client.get(reverse('hostel-records-detail', args=[self.record.id]))
+        self.assertEqual([year['year'] for year in response.data['years']], [1, 6])
+
+    def test_list_reads_the_prefetched_entries(self):
+        HostelRecords.objects.create(student=self.students[1], second_year_mess_bill=300)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('hostel-records-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sum('dues_hostelyearentry' in query['sql'] for query in queries), 1)
+
+    def test_exports_flatten_the_first_five_years(self):
+        HostelYearEntry.objects.create(record=self.record, year=3, scholarship=50)
+        row = HOSTEL_SHEET.rows(HostelRecords.objects.filter(pk=self.record.pk)).get()
+        years = dict(zip(HOSTEL_SHEET.headers, row))
+        self.assertEqual(
+            (years['First Year Mess Bill'], years['Third Year Scholarship'], years['Fifth Year Mess Bill']),
+            (1000, 50, 0),
+        )
+
+
+class HostelYearColumnCopyTests(DuesTransactionTestCase):
+    """copy_year_columns() against a table that still has the former per-year columns"""
+
+    columns = ('first_year_mess_bill', 'first_year_scholarship', 'second_year_mess_bill', 'second_year_scholarship')
+
+    def alter_table(self, action):
+        with connection.cursor() as cursor:
+            for column in self.columns:
+                cursor.execute(f'ALTER TABLE dues_hostelrecords {action.format(column=connection.ops.quote_name(column))}')
+
+    def setUp(self):
+        super().setUp()
+        self.alter_table('ADD COLUMN {column} integer NOT NULL DEFAULT 0')
+        self.addCleanup(self.alter_table, 'DROP COLUMN {column}')
+
+    def test_columns_are_moved_into_the_ledger(self):
+        copied = HostelRecords.objects.create(student=self.students[0])
+        untouched = HostelRecords.objects.create(student=self.students[1], second_year_mess_bill=400)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE dues_hostelrecords SET first_year_mess_bill = 900, second_year_scholarship = 50 WHERE id = %s',
+                [copied.pk],
+            )
+        self.assertEqual(copy_year_columns(), 2)
+        rows = HostelYearEntry.objects.order_by('record_id', 'year').values_list('record_id', 'year', 'mess_bill', 'scholarship')
+        self.assertEqual(list(rows), [(copied.pk, 1, 900, 0), (copied.pk, 2, 0, 50), (untouched.pk, 2, 400, 0)])
+
+        # The copied columns are zeroed, so a second run leaves later edits alone
+        HostelYearEntry.objects.filter(record=copied, year=1).update(mess_bill=950)
+        self.assertEqual(copy_year_columns(), 0)
+        self.assertEqual(HostelYearEntry.objects.get(record=copied, year=1).mess_bill, 950)
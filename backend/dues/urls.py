@@ -1,8 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .dashboard import dues_summary
+from .streams import dues_events, event_ticket
 from .views import (
     FeeStructureViewSet, AcademicRecordsViewSet, HostelRecordsViewSet,
-    LibraryRecordsViewSet, LegacyAcademicRecordsViewSet, SportsRecordsViewSet
+    LibraryRecordsViewSet, LegacyAcademicRecordsViewSet, SportsRecordsViewSet,
+    PaymentPostingView, AnalyticsExportView
 )
 
 router = DefaultRouter()
@@ -14,5 +17,10 @@ router.register(r'legacy-academic-records', LegacyAcademicRecordsViewSet, basena
 router.register(r'sports-records', SportsRecordsViewSet, basename='sports-records')
 
 urlpatterns = [
+    path('payments/', PaymentPostingView.as_view(), name='payment-posting'),
+    path('analytics/<str:dataset>/', AnalyticsExportView.as_view(), name='analytics-export'),
+    path('events/', dues_events, name='dues-events'),
+    path('events/ticket/', event_ticket, name='dues-event-ticket'),
+    path('summary/', dues_summary, name='dues-summary'),
     path('', include(router.urls)),
 ] 
\ No newline at end of file
@@ -2,25 +2,197 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+from rest_framework.settings import api_settings
 from django.db.models import Sum, Q, Count
 from django.utils import timezone
-from datetime import datetime
+from django.utils.dateparse import parse_datetime
+from django.conf import settings
+from datetime import datetime, timedelta
+import tempfile
+from django.http import FileResponse
 from .models import FeeStructure, AcademicRecords, HostelRecords, LibraryRecords, LegacyAcademicRecords, SportsRecords
 from .serializers import (
     FeeStructureSerializer, AcademicRecordsSerializer, HostelRecordsSerializer,
-    HostelDuesSerializer, LibraryRecordsSerializer, LegacyAcademicRecordsSerializer, SportsRecordsSerializer
+    HostelDuesSerializer, LibraryRecordsSerializer, LegacyAcademicRecordsSerializer, SportsRecordsSerializer,
+    PaymentPostingSerializer, DuesAdjustmentSerializer
 )
+from .permissions import IsAdminOrStaff, IsSuperUser
+from .payments import resolve_record_ids, post_payments, adjust_record, NegativeAmountError
+from .bulk import clear_dues
+from .ledger import year_totals
+from .cache import MODEL_NAMESPACES, cached_dashboard
+from .models import DeletedRecord
+from .snapshots import snapshot_statistics, snapshots_built
+from .analytics import DATASETS, FORMATS, ArrowUnavailable, write_dataset
+from .exports import ACADEMIC_SHEET, HOSTEL_SHEET, LEGACY_SHEET, LIBRARY_SHEET, SPORTS_SHEET
 from core.models import StudentProfile
+from utils.fieldsets import SparseFieldsetMixin
+from utils.renderers import ColumnarJSONRenderer
+from utils.replica import ReplicaReadMixin
+from utils.streaming import stream_csv
 
-class FeeStructureViewSet(viewsets.ModelViewSet):
+# The grouped listings also render as ?format=columnar (see utils.renderers)
+GROUPED_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, ColumnarJSONRenderer]
+
+class FeeStructureViewSet(ReplicaReadMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = FeeStructure.objects.all()
     serializer_class = FeeStructureSerializer
     permission_classes = [IsAuthenticated]
 
-class AcademicRecordsViewSet(viewsets.ModelViewSet):
+class DuesAdjustmentMixin:
+    """
+    Adds POST <record>/adjust/ which applies signed deltas with F() expressions,
+    so several clerks can adjust the same student's amounts concurrently.
+    Deltas that would take an amount below zero are rejected with 400.
+    """
+    adjustment_record_type = None
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAdminOrStaff])
+    def adjust(self, request, pk=None):
+        serializer = DuesAdjustmentSerializer(
+            data=request.data, context={'record_type': self.adjustment_record_type}
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            record_id = int(pk)
+        except ValueError:
+            record_id = None
+        try:
+            updated = record_id is not None and adjust_record(
+                self.adjustment_record_type, record_id, serializer.validated_data['deltas']
+            )
+        except NegativeAmountError as exc:
+            return Response(
+                {'error': str(exc), 'fields': exc.fields}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if not updated:
+            return Response({'error': 'Record not found'}, status=status.HTTP_404_NOT_FOUND)
+        record = self.get_queryset().model.objects.get(pk=record_id)
+        return Response(self.get_serializer(record).data)
+
+class BulkClearMixin:
+    """
+    Adds POST <records>/bulk_clear/ which clears dues (see dues.bulk.CLEAR_VALUES)
+    in a single UPDATE, either for {"ids": [...]} or, with {"all_matching": true},
+    for every record matching the list filters given as query parameters.
+    """
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminOrStaff])
+    def bulk_clear(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+                return Response({'error': 'ids must be a list of record ids'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(pk__in=ids)
+        elif request.data.get('all_matching') is not True:
+            return Response(
+                {'error': 'Provide ids, or all_matching: true to clear every record matching the filters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'updated': clear_dues(queryset)})
+
+class SnapshotStatisticsMixin:
+    """
+    Adds GET <records>/statistics/ served from the department's DuesSnapshot
+    rows (aggregated from the records until they are built), filterable by
+    course, batch, caste and year.
+    """
+    snapshot_department = None
+    snapshot_filters = ('course', 'batch', 'caste', 'year')
+
+    def get_snapshot_statistics(self, request):
+        filters = {name: request.query_params.get(name) for name in self.snapshot_filters}
+        return snapshot_statistics(self.snapshot_department, **filters)
+
+    @action(detail=False, methods=['get'])
+    def statistics(self, request):
+        return Response(self.get_snapshot_statistics(request))
+
+class CSVExportMixin:
+    """
+    Adds GET <records>/export/ which streams the records matching the list
+    filters as CSV (columns of `export_sheet`, see dues.exports), straight
+    from values_list() without building model instances.
+    """
+    export_sheet = None
+
+    def get_export_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminOrStaff])
+    def export(self, request):
+        queryset = self.get_export_queryset()
+        if not queryset.ordered:
+            queryset = queryset.order_by('student__user__username', 'pk')
+        # Rows are read after the view returns: pin the database chosen for this request
+        queryset = queryset.using(queryset.db)
+        rows = self.export_sheet.rows(queryset).iterator(chunk_size=2000)
+        filename = f"{self.export_sheet.title.lower()}-records-{timezone.localdate().isoformat()}.csv"
+        return stream_csv(self.export_sheet.headers, rows, filename)
+
+class DeltaSyncMixin:
+    """
+    GET <records>/?since=<sync_token> returns only what changed since an
+    earlier sync instead of the whole list:
+
+        {"changed": [<records created or updated>], "deleted": [<ids>],
+         "removed": [<ids>], "sync_token": "<pass as ?since= next time>"}
+
+    Changes come from the (updated_at, id) index and deletions from the
+    DeletedRecord tombstones. Academic and legacy rows saved before their
+    updated_at column existed have none (NULL) and count as changed until
+    their next save. With list filters, `changed` only holds records that
+    match them; records updated since then that don't match now (e.g.
+    dues cleared under ?has_dues=true) are listed in `removed`, and clients
+    drop them like deletions. `removed` is not limited to records the
+    client was sent, so clients must ignore ids they don't hold. A token
+    older than the tombstone retention gets 410 Gone and the client must
+    reload the full list. Records may be reported more than once across
+    syncs; clients upsert by id.
+    """
+
+    def list(self, request, *args, **kwargs):
+        since = request.query_params.get('since')
+        if since is None:
+            return super().list(request, *args, **kwargs)
+        since = parse_datetime(since.replace(' ', '+'))
+        if since is None:
+            return Response({'error': 'since must be an ISO 8601 timestamp (a sync_token)'}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        now = timezone.now()
+        if since < now - timedelta(days=getattr(settings, 'DELTA_SYNC_TOMBSTONE_DAYS', 30)):
+            return Response({'error': 'since is too old, reload the full list'}, status=status.HTTP_410_GONE)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # select_related/only() come from SparseFieldsetMixin
+        changed = queryset.filter(Q(updated_at__gte=since) | Q(updated_at__isnull=True)).order_by('updated_at', 'id')
+        deleted = DeletedRecord.objects.filter(
+            record_type=MODEL_NAMESPACES[queryset.model], deleted_at__gte=since
+        ).values_list('record_id', flat=True).distinct()
+        removed = []
+        if queryset.query.has_filters():
+            removed = queryset.model.objects.filter(updated_at__gte=since).exclude(
+                pk__in=changed.order_by().values('pk')
+            ).order_by('updated_at', 'id').values_list('pk', flat=True)
+        # Rows committed after this read may carry an updated_at a little
+        # before `now`; reaching back keeps the next sync from missing them
+        sync_token = now - timedelta(seconds=getattr(settings, 'DELTA_SYNC_OVERLAP_SECONDS', 10))
+        return Response({
+            'changed': self.get_serializer(changed, many=True).data,
+            'deleted': list(deleted),
+            'removed': list(removed),
+            'sync_token': max(sync_token, since).isoformat(),
+        })
+
+class AcademicRecordsViewSet(ReplicaReadMixin, DeltaSyncMixin, SparseFieldsetMixin, DuesAdjustmentMixin, BulkClearMixin, CSVExportMixin, viewsets.ModelViewSet):
     queryset = AcademicRecords.objects.all()
     serializer_class = AcademicRecordsSerializer
     permission_classes = [IsAuthenticated]
+    adjustment_record_type = 'academic'
+    export_sheet = ACADEMIC_SHEET
 
     def get_queryset(self):
         queryset = AcademicRecords.objects.all()
@@ -29,47 +201,72 @@ class AcademicRecordsViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(student__user__username=student_username)
         return queryset
 
-class HostelRecordsViewSet(viewsets.ModelViewSet):
+class HostelRecordsViewSet(ReplicaReadMixin, DeltaSyncMixin, SparseFieldsetMixin, DuesAdjustmentMixin, SnapshotStatisticsMixin, CSVExportMixin, viewsets.ModelViewSet):
     queryset = HostelRecords.objects.all()
     serializer_class = HostelRecordsSerializer
     permission_classes = [IsAuthenticated]
+    snapshot_department = 'hostel'
+    adjustment_record_type = 'hostel'
+    export_sheet = HOSTEL_SHEET
 
     def get_queryset(self):
-        queryset = HostelRecords.objects.all()
+        # Year amounts (and the compatibility fields) come from the prefetched entries
+        queryset = HostelRecords.objects.prefetch_related('year_entries')
         student_username = self.request.query_params.get('student_id', None)
         if student_username:
             queryset = queryset.filter(student__user__username=student_username)
         return queryset
 
+    def filter_dues(self, queryset):
+        """The get_hostel_dues filters: student_name, course and has_dues (in SQL, on due_total)"""
+        student_name = self.request.query_params.get('student_name', None)
+        if student_name:
+            queryset = queryset.filter(
+                Q(student__user__first_name__icontains=student_name) |
+                Q(student__user__last_name__icontains=student_name) |
+                Q(student__user__username__icontains=student_name)  # Add roll number search
+            )
+
+        course = self.request.query_params.get('course', None)
+        if course and course != 'all':
+            queryset = queryset.filter(student__course__name=course)
+
+        has_dues = self.request.query_params.get('has_dues', None)
+        if has_dues is not None:
+            queryset = queryset.with_totals()
+            if has_dues.lower() == 'true':
+                queryset = queryset.filter(due_total__gt=0)
+            elif has_dues.lower() == 'false':
+                queryset = queryset.filter(due_total=0)
+        return queryset.order_by('-student__batch', 'student__user__username')
+
+    def get_export_queryset(self):
+        return self.filter_dues(self.get_queryset())
+
     @action(detail=False, methods=['get'])
+    @cached_dashboard(HostelRecords)
+    def year_statistics(self, request):
+        """
+        Mess bill and scholarship totals per year of study, from the year ledger.
+        Filterable by batch plus the get_hostel_dues filters, e.g. ?batch=2021-23&course=MBA
+        """
+        queryset = self.filter_dues(self.get_queryset())
+        batch = request.query_params.get('batch', None)
+        if batch:
+            queryset = queryset.filter(student__batch=batch)
+        return Response({'years': year_totals(queryset)})
+
+    @action(detail=False, methods=['get'], renderer_classes=GROUPED_RENDERERS)
+    @cached_dashboard(HostelRecords)
     def get_hostel_dues(self, request):
         """Get hostel dues grouped by student with year-wise breakdown, pagination, and sorting"""
         try:
-            queryset = self.get_queryset().select_related(
+            # Filters (including has_dues) and batch-descending order, in SQL
+            queryset = self.filter_dues(self.get_queryset()).select_related(
                 'student__user', 
                 'student__course'
             )
             
-            # Apply filters
-            student_name = request.query_params.get('student_name', None)
-            if student_name:
-                queryset = queryset.filter(
-                    Q(student__user__first_name__icontains=student_name) |
-                    Q(student__user__last_name__icontains=student_name) |
-                    Q(student__user__username__icontains=student_name)  # Add roll number search
-                )
-            
-            course = request.query_params.get('course', None)
-            if course and course != 'all':
-                queryset = queryset.filter(student__course__name=course)
-            
-            # Filter by has_dues (if provided)
-            # Note: This is applied after grouping, so we'll handle it in Python
-            has_dues_param = request.query_params.get('has_dues', None)
-            
-            # Sort by batch descending (latest batch first)
-            queryset = queryset.order_by('-student__batch', 'student__user__username')
-            
             # Group by student and transform data
             grouped_data = {}
             
@@ -110,13 +307,6 @@ class HostelRecordsViewSet(viewsets.ModelViewSet):
             # Convert to list and maintain batch order
             grouped_list = list(grouped_data.values())
             
-            # Apply has_dues filter if provided (after grouping)
-            if has_dues_param is not None:
-                if has_dues_param.lower() == 'true':
-                    grouped_list = [item for item in grouped_list if item['due_amount'] > 0]
-                elif has_dues_param.lower() == 'false':
-                    grouped_list = [item for item in grouped_list if item['due_amount'] == 0]
-            
             # Calculate statistics
             total_count = len(grouped_list)
             records_with_dues = sum(1 for item in grouped_list if item['due_amount'] > 0)
@@ -156,19 +346,25 @@ class HostelRecordsViewSet(viewsets.ModelViewSet):
             print(f"Error in get_hostel_dues: {str(e)}")
             return Response({'error': 'Failed to get hostel dues'}, status=500)
 
-class LibraryRecordsViewSet(viewsets.ModelViewSet):
+class LibraryRecordsViewSet(ReplicaReadMixin, DeltaSyncMixin, SparseFieldsetMixin, BulkClearMixin, SnapshotStatisticsMixin, CSVExportMixin, viewsets.ModelViewSet):
     queryset = LibraryRecords.objects.all()
     serializer_class = LibraryRecordsSerializer
     permission_classes = [IsAuthenticated]
+    snapshot_department = 'library'
+    export_sheet = LIBRARY_SHEET
 
     def get_queryset(self):
         queryset = LibraryRecords.objects.all()
         student_username = self.request.query_params.get('student_id', None)
         if student_username:
             queryset = queryset.filter(student__user__username=student_username)
+        course = self.request.query_params.get('course', None)
+        if course and course != 'all':
+            queryset = queryset.filter(student__course__name=course)
         return queryset
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], renderer_classes=GROUPED_RENDERERS)
+    @cached_dashboard(LibraryRecords)
     def grouped_by_student(self, request):
         """Get library records grouped by student for frontend display, including total_fine_amount"""
         try:
@@ -203,10 +399,14 @@ class LibraryRecordsViewSet(viewsets.ModelViewSet):
             print(f"Error in grouped_by_student: {str(e)}")
             return Response({'error': 'Failed to group library records'}, status=500)
 
-class LegacyAcademicRecordsViewSet(viewsets.ModelViewSet):
+class LegacyAcademicRecordsViewSet(ReplicaReadMixin, DeltaSyncMixin, SparseFieldsetMixin, BulkClearMixin, SnapshotStatisticsMixin, CSVExportMixin, viewsets.ModelViewSet):
     queryset = LegacyAcademicRecords.objects.all()
     serializer_class = LegacyAcademicRecordsSerializer
     permission_classes = [IsAuthenticated]  
+    snapshot_department = 'legacy'
+    export_sheet = LEGACY_SHEET
+    # get_queryset filters that the per-group snapshots can't answer
+    record_level_filters = {'student_username', 'student_name', 'has_dues', 'tc_number', 'min_amount', 'max_amount'}
 
     def get_queryset(self):
         # Start with all records by default
@@ -273,8 +473,13 @@ class LegacyAcademicRecordsViewSet(viewsets.ModelViewSet):
         return queryset
     
     @action(detail=False, methods=['get'])
+    @cached_dashboard(LegacyAcademicRecords)
     def statistics(self, request):
         """Get comprehensive statistics about legacy academic records with filter support"""
+        # Filters on the student's course/batch/caste only: answer from the snapshots
+        if not self.record_level_filters.intersection(request.query_params) \
+                and snapshots_built(self.snapshot_department):
+            return Response(self.get_snapshot_statistics(request))
         try:
             # Get the same filters as the main queryset
             queryset = self.get_queryset()
@@ -398,7 +603,7 @@ class LegacyAcademicRecordsViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], renderer_classes=GROUPED_RENDERERS)
     def grouped_by_student(self, request):
         """Get legacy records grouped by student for frontend display"""
         try:
@@ -450,7 +655,7 @@ class LegacyAcademicRecordsViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], renderer_classes=GROUPED_RENDERERS)
     def paginated_grouped(self, request):
         """Get paginated and filtered legacy records grouped by student"""
         try:
@@ -524,16 +729,21 @@ class LegacyAcademicRecordsViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class SportsRecordsViewSet(viewsets.ModelViewSet):
+class SportsRecordsViewSet(ReplicaReadMixin, DeltaSyncMixin, SparseFieldsetMixin, BulkClearMixin, SnapshotStatisticsMixin, CSVExportMixin, viewsets.ModelViewSet):
     queryset = SportsRecords.objects.all()
     serializer_class = SportsRecordsSerializer
     permission_classes = [IsAuthenticated]
+    snapshot_department = 'sports'
+    export_sheet = SPORTS_SHEET
 
     def get_queryset(self):
         queryset = SportsRecords.objects.all()
         student_username = self.request.query_params.get('student_id', None)
         if student_username:
             queryset = queryset.filter(student__user__username=student_username)
+        course = self.request.query_params.get('course', None)
+        if course and course != 'all':
+            queryset = queryset.filter(student__course__name=course)
         return queryset
 
     def get_serializer_context(self):
@@ -545,7 +755,8 @@ class SportsRecordsViewSet(viewsets.ModelViewSet):
                 context['student_id'] = student_id
         return context
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], renderer_classes=GROUPED_RENDERERS)
+    @cached_dashboard(SportsRecords)
     def grouped_by_student(self, request):
         """Get sports records grouped by student for frontend display, including total_fine_amount"""
         try:
@@ -579,4 +790,71 @@ class SportsRecordsViewSet(viewsets.ModelViewSet):
         except Exception as e:
             print(f"Error in grouped_by_student: {str(e)}")
             return Response({'error': 'Failed to group sports records'}, status=500)
-        
+
+
+class PaymentPostingView(ReplicaReadMixin, APIView):
+    """
+    Post a batch of payments (e.g. a day's bank statement) in one request.
+
+    POST body: {"postings": [{"record_type": "academic", "roll_number": "...",
+    "academic_year_label": "1", "paid_by_student": 5000}, ...]}
+
+    All postings are validated first; if any fails nothing is applied.
+    """
+    permission_classes = [IsAdminOrStaff]
+    max_postings = 10000
+
+    def post(self, request):
+        postings = request.data.get('postings') if isinstance(request.data, dict) else request.data
+        if not isinstance(postings, list) or not postings:
+            return Response({'error': 'postings must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(postings) > self.max_postings:
+            return Response(
+                {'error': f'At most {self.max_postings} postings per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = PaymentPostingSerializer(data=postings, many=True)
+        if not serializer.is_valid():
+            errors = {index: error for index, error in enumerate(serializer.errors) if error}
+            return Response({'error': 'Invalid postings', 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        validated = serializer.validated_data
+        record_ids, errors = resolve_record_ids(validated)
+        if errors:
+            return Response({'error': 'Invalid postings', 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        summary = post_payments(validated, record_ids)
+        return Response({'posted': len(validated), **summary})
+
+class AnalyticsExportView(ReplicaReadMixin, APIView):
+    """
+    GET analytics/<dataset>/?file_format=parquet|arrow
+
+    One dues table joined with the student dimensions as a Parquet (zstd) or
+    Arrow IPC file with typed columns (decimal amounts, dates), for loading
+    straight into pandas/polars. Written to a temporary file one record
+    batch at a time, then streamed.
+    """
+    permission_classes = [IsSuperUser]
+
+    def get(self, request, dataset):
+        file_format = request.query_params.get('file_format', 'parquet')
+        if dataset not in DATASETS:
+            return Response(
+                {'error': f"Unknown dataset. Choose one of: {', '.join(DATASETS)}"}, status=status.HTTP_404_NOT_FOUND
+            )
+        if file_format not in FORMATS:
+            return Response(
+                {'error': f"file_format must be one of: {', '.join(FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        output = tempfile.TemporaryFile()
+        try:
+            write_dataset(dataset, output, file_format)
+        except ArrowUnavailable as e:
+            output.close()
+            return Response({'error': str(e)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        output.seek(0)
+        extension = 'parquet' if file_format == 'parquet' else 'arrow'
+        filename = f"{dataset}-records-{timezone.localdate().isoformat()}.{extension}"
+        return FileResponse(output, as_attachment=True, filename=filename, content_type='application/octet-stream')
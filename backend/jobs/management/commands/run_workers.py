@@ -0,0 +1,123 @@
+import logging
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections
+
+from jobs.worker import requeue_stale_jobs, work
+from utils.processes import spawn_process
+
+logger = logging.getLogger(__name__)
+
+
+class StaleJobSweeper:
+    """Calls requeue_stale_jobs() at most every `interval` seconds from the supervising loop"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.last_run = None
+
+    def tick(self):
+        now = time.monotonic()
+        if self.last_run is not None and now - self.last_run < self.interval:
+            return
+        self.last_run = now
+        try:
+            requeued = requeue_stale_jobs()
+        except DatabaseError:
+            logger.exception("Could not requeue stale jobs")
+            requeued = 0
+        finally:
+            close_old_connections()
+        if requeued:
+            logger.warning("Recovered %d jobs abandoned by stopped workers", requeued)
+
+
+def _run_threads(threads, poll_interval, once, stop_event, sweeper=None):
+    workers = [
+        threading.Thread(target=work, args=(stop_event, poll_interval, once), name=f'job-worker-{n}', daemon=True)
+        for n in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    while any(worker.is_alive() for worker in workers):
+        if sweeper is not None:
+            sweeper.tick()
+        for worker in workers:
+            if worker.is_alive():
+                # join() with a timeout keeps the main thread responsive to signals
+                worker.join(1)
+                break
+
+
+def _child(threads, poll_interval, once):
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    _run_threads(threads, poll_interval, once, stop_event)
+
+
+class Command(BaseCommand):
+    help = (
+        'Run background job workers: claims queued jobs from the database (FOR UPDATE SKIP LOCKED) '
+        'and runs them in a pool of threads, optionally in several processes. The supervising '
+        'process requeues jobs of dead workers every JOB_STALE_SWEEP_SECONDS and restarts worker '
+        'processes that exit'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=2, help='Worker threads per process')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Worker processes; use more than one for CPU-bound jobs')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between polls of an idle queue')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is runnable (cron / tests)')
+
+    def handle(self, *args, **options):
+        threads, processes = options['threads'], options['processes']
+        if threads < 1 or processes < 1:
+            raise CommandError('--threads and --processes must be at least 1')
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(threadName)s %(levelname)s %(message)s')
+
+        sweeper = StaleJobSweeper(getattr(settings, 'JOB_STALE_SWEEP_SECONDS', 60))
+        sweeper.tick()
+        self.stdout.write(f'Starting {processes} process(es) x {threads} thread(s)')
+
+        stop_event = threading.Event()
+        if processes == 1:
+            signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+            signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+            _run_threads(threads, options['poll_interval'], options['once'], stop_event, sweeper)
+        else:
+            self._supervise(processes, threads, options['poll_interval'], options['once'], stop_event, sweeper)
+        self.stdout.write(self.style.SUCCESS('Workers stopped'))
+
+    def _supervise(self, processes, threads, poll_interval, once, stop_event, sweeper):
+        def spawn():
+            # Spawned, not forked (see utils.processes): a fork would copy the
+            # supervisor's database connections and any lock held at the time
+            return spawn_process(f'{__name__}._child', (threads, poll_interval, once))
+
+        children = [spawn() for _ in range(processes)]
+
+        def stop(*_):
+            stop_event.set()
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        while not stop_event.is_set() and (not once or any(child.is_alive() for child in children)):
+            if not once:
+                for index, child in enumerate(children):
+                    if not child.is_alive():
+                        child.join()
+                        logger.warning("Worker process %s exited with code %s; restarting it", child.pid, child.exitcode)
+                        children[index] = spawn()
+            sweeper.tick()
+            stop_event.wait(1)
+        for child in children:
+            child.join()
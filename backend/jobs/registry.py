@@ -0,0 +1,108 @@
+"""
+Job functions and enqueueing.
+
+A job function is registered under a name and called by a worker as
+fn(context, **payload); whatever it returns (JSON-serializable) is stored as
+the job's result. Long jobs report progress through the context, which is
+also where a cancel request is noticed.
+"""
+from dataclasses import dataclass
+
+from django.utils import timezone
+
+from .models import Job
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when its cancellation was requested"""
+
+
+@dataclass(frozen=True)
+class TaskSpec:
+    name: str
+    func: object
+    max_attempts: int = 3
+    # Whether staff may enqueue it through the API
+    public: bool = False
+    # Payload key that receives the path of a file uploaded with the job
+    upload_field: str = None
+    # Permission (app_label.codename) needed to enqueue it through the API,
+    # e.g. jobs.run_destructive_jobs; superusers have every permission
+    permission: str = None
+
+    def allowed_for(self, user):
+        return self.permission is None or user.has_perm(self.permission)
+
+
+_tasks = {}
+
+
+def register(name, max_attempts=3, public=False, upload_field=None, permission=None):
+    """Register a job function under `name`"""
+    def decorator(func):
+        _tasks[name] = TaskSpec(name, func, max_attempts, public, upload_field, permission)
+        return func
+    return decorator
+
+
+def get_task(name):
+    """The TaskSpec registered under `name`, or None"""
+    return _tasks.get(name)
+
+
+def public_tasks():
+    return sorted(name for name, spec in _tasks.items() if spec.public)
+
+
+def enqueue(name, payload=None, user_id=None, run_after=None, priority=0):
+    """
+    Queue a run of the job function registered under `name`.
+
+    Args:
+        name: Registered job name
+        payload: JSON-serializable keyword arguments for the function
+        user_id: User the job is run for (owner of its status/result)
+        run_after: Don't start before this datetime
+        priority: Higher priority jobs are claimed first
+
+    Returns:
+        Job: The queued job
+    """
+    spec = get_task(name)
+    if spec is None:
+        raise ValueError(f"Unknown job: {name}")
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        created_by_id=user_id,
+        run_after=run_after or timezone.now(),
+        priority=priority,
+        max_attempts=spec.max_attempts,
+    )
+
+
+class JobContext:
+    """Handed to a running job function for progress reporting"""
+
+    def __init__(self, job):
+        self.job = job
+
+    @property
+    def attempt(self):
+        return self.job.attempts
+
+    def progress(self, current, total=None, message=None):
+        """
+        Record progress (and refresh the worker heartbeat).
+
+        Raises:
+            JobCancelled: If the job was cancelled meanwhile
+        """
+        values = {'progress_current': current, 'heartbeat_at': timezone.now()}
+        if total is not None:
+            values['progress_total'] = total
+        if message is not None:
+            values['progress_message'] = message[:255]
+        Job.objects.filter(pk=self.job.pk).update(**values)
+        if Job.objects.filter(pk=self.job.pk, cancel_requested=True).exists():
+            raise JobCancelled()
@@ -0,0 +1,36 @@
+from rest_framework import serializers
+
+from .models import Job
+from .registry import get_task
+
+
+class JobSerializer(serializers.ModelSerializer):
+    progress_percent = serializers.ReadOnlyField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'name', 'payload', 'status', 'priority', 'attempts', 'max_attempts', 'cancel_requested',
+            'progress_current', 'progress_total', 'progress_percent', 'progress_message',
+            'result', 'error', 'download_url', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = [field for field in fields if field not in ('name', 'payload')]
+
+    def get_download_url(self, obj):
+        if obj.status != Job.SUCCEEDED or not isinstance(obj.result, dict) or not obj.result.get('file'):
+            return None
+        request = self.context.get('request')
+        path = f'/api/jobs/{obj.pk}/download/'
+        return request.build_absolute_uri(path) if request else path
+
+    def validate_name(self, value):
+        spec = get_task(value)
+        if spec is None or not spec.public:
+            raise serializers.ValidationError(f'Unknown job: {value}')
+        return value
+
+    def validate_payload(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('Payload must be an object.')
+        return value
@@ -0,0 +1,143 @@
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import Permission
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.authentication import active_users
+from core.models import User
+from .models import Job
+from .registry import enqueue, register
+from .worker import claim_job, requeue_stale_jobs, run_job
+
+
+@register('test_flaky', max_attempts=2)
+def flaky(context, fail=True):
+    if fail:
+        raise RuntimeError('boom')
+    return {'ok': True}
+
+
+@register('test_progress')
+def report_progress(context, steps=3):
+    for step in range(steps):
+        context.progress(step, steps, f'step {step}')
+    return {'steps': steps}
+
+
+class JobAPITests(APITestCase):
+    def setUp(self):
+        active_users.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.staff = User.objects.create(username='clerk@tu.in', is_staff=True)
+        self.client.force_authenticate(user=self.staff)
+        self.url = reverse('jobs-list')
+
+    def queue_sync(self):
+        feed = SimpleUploadedFile('library.csv', b'roll_number,book_id,borrowing_date,fine_amount\n')
+        return self.client.post(
+            self.url, {'name': 'sync_department_records', 'payload': '{"feed": "library"}', 'file': feed},
+            format='multipart',
+        )
+
+    def test_staff_queue_public_jobs(self):
+        response = self.client.post(self.url, {'name': 'refresh_dues_snapshots', 'payload': {}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(Job.objects.get().created_by, self.staff)
+
+    def test_unknown_and_private_jobs_are_rejected(self):
+        for name in ('nope', 'test_flaky'):
+            response = self.client.post(self.url, {'name': name}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Job.objects.exists())
+
+    def test_destructive_jobs_need_permission(self):
+        self.assertEqual(self.queue_sync().status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Job.objects.exists())
+
+        self.staff.user_permissions.add(Permission.objects.get(codename='run_destructive_jobs'))
+        self.staff = User.objects.get(pk=self.staff.pk)
+        self.client.force_authenticate(user=self.staff)
+        self.assertEqual(self.queue_sync().status_code, status.HTTP_202_ACCEPTED)
+
+        self.client.force_authenticate(user=User.objects.create(username='admin@tu.in', is_staff=True, is_superuser=True))
+        self.assertEqual(self.queue_sync().status_code, status.HTTP_202_ACCEPTED)
+        # Queued syncs only delete missing records when asked to
+        self.assertNotIn('delete_missing', Job.objects.first().payload)
+
+    def test_staff_only_see_their_own_jobs(self):
+        enqueue('refresh_dues_snapshots', user_id=self.staff.pk)
+        enqueue('refresh_dues_snapshots', user_id=User.objects.create(username='other@tu.in', is_staff=True).pk)
+        self.assertEqual(len(self.client.get(self.url).data), 1)
+
+    def test_cancel_queued_job(self):
+        job = enqueue('refresh_dues_snapshots', user_id=self.staff.pk)
+        response = self.client.post(reverse('jobs-cancel', args=[job.pk]))
+        self.assertEqual(response.data['status'], Job.CANCELLED)
+        self.assertIsNone(claim_job('worker'))
+        response = self.client.post(reverse('jobs-cancel', args=[job.pk]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+
+class WorkerTests(TestCase):
+    def test_a_claimed_job_is_not_claimed_again(self):
+        job = enqueue('test_progress')
+        self.assertEqual(claim_job('one'), job)
+        self.assertIsNone(claim_job('two'))
+
+    def test_higher_priority_first_and_run_after_respected(self):
+        enqueue('test_progress', run_after=timezone.now() + timedelta(hours=1), priority=9)
+        low = enqueue('test_progress')
+        high = enqueue('test_progress', priority=5)
+        self.assertEqual([claim_job('w'), claim_job('w'), claim_job('w')], [high, low, None])
+
+    def test_failed_job_is_retried_then_fails(self):
+        job = enqueue('test_flaky')
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            run_job(claim_job('w'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIsNone(claim_job('w'))
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            run_job(claim_job('w'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('RuntimeError: boom', job.error)
+
+    def test_success_records_result_and_progress(self):
+        job = enqueue('test_progress', {'steps': 4})
+        run_job(claim_job('w'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (Job.SUCCEEDED, {'steps': 4}))
+        self.assertEqual((job.progress_current, job.progress_total, job.progress_message), (3, 4, 'step 3'))
+
+    def test_cancel_is_noticed_at_the_next_progress_report(self):
+        job = enqueue('test_progress')
+        claimed = claim_job('w')
+        Job.objects.filter(pk=job.pk).update(cancel_requested=True)
+        run_job(claimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.CANCELLED)
+
+    def test_stale_jobs_are_requeued_or_failed(self):
+        retry, exhausted = enqueue('test_flaky'), enqueue('test_progress')
+        for job in (claim_job('dead'), claim_job('dead')):
+            self.assertIsNotNone(job)
+        Job.objects.filter(pk=exhausted.pk).update(attempts=3)
+        Job.objects.update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(timeout=60), 2)
+        retry.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual((retry.status, retry.worker), (Job.QUEUED, ''))
+        self.assertEqual(exhausted.status, Job.FAILED)
@@ -0,0 +1,91 @@
+import json
+import os
+import uuid
+
+from django.conf import settings
+from django.http import FileResponse
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.response import Response
+
+from dues.permissions import IsAdminOrStaff
+from .models import Job
+from .registry import enqueue, get_task
+from .serializers import JobSerializer
+
+
+def save_upload(upload):
+    """Store an uploaded file for a job; returns its path"""
+    directory = os.path.join(settings.MEDIA_ROOT, 'job_uploads')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{uuid.uuid4().hex}{os.path.splitext(upload.name)[1]}')
+    with open(path, 'wb') as destination:
+        for chunk in upload.chunks():
+            destination.write(chunk)
+    return path
+
+
+class JobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Background jobs: enqueue a registered job, poll its status/progress,
+    cancel it and download the file it produced.
+
+    POST {"name": ..., "payload": {...}} as JSON, or as multipart with a
+    `file` part for jobs that process an upload (payload as a JSON string).
+    """
+    serializer_class = JobSerializer
+    permission_classes = [IsAdminOrStaff]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+
+    def get_queryset(self):
+        queryset = Job.objects.all()
+        if not self.request.user.is_superuser:
+            queryset = queryset.filter(created_by_id=self.request.user.pk)
+        job_status = self.request.query_params.get('status')
+        if job_status:
+            queryset = queryset.filter(status=job_status)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        data = {'name': request.data.get('name'), 'payload': request.data.get('payload') or {}}
+        if isinstance(data['payload'], str):
+            try:
+                data['payload'] = json.loads(data['payload'])
+            except ValueError:
+                return Response({'error': 'payload must be valid JSON'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+
+        name, payload = serializer.validated_data['name'], serializer.validated_data['payload']
+        spec = get_task(name)
+        if not spec.allowed_for(request.user):
+            return Response({'error': f'You do not have permission to run {name}'}, status=status.HTTP_403_FORBIDDEN)
+        if spec.upload_field:
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'error': f'{name} requires a file upload'}, status=status.HTTP_400_BAD_REQUEST)
+            payload[spec.upload_field] = save_upload(upload)
+
+        job = enqueue(name, payload, user_id=request.user.pk)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Cancel a queued job now, or ask a running one to stop at its next progress report"""
+        job = self.get_object()
+        if job.status in Job.FINISHED:
+            return Response({'error': f'Job already {job.status}'}, status=status.HTTP_409_CONFLICT)
+        Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(status=Job.CANCELLED, cancel_requested=True)
+        Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(cancel_requested=True)
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """The file a finished job produced (result['file'])"""
+        job = self.get_object()
+        path = job.result.get('file') if job.status == Job.SUCCEEDED and isinstance(job.result, dict) else None
+        if not path or not os.path.exists(path):
+            return Response({'error': 'This job has no file to download'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
@@ -0,0 +1,160 @@
+"""
+Claiming and running queued jobs.
+
+Workers poll the Job table. A job is claimed with SELECT ... FOR UPDATE SKIP
+LOCKED, so any number of worker threads and processes (on any host) can
+poll concurrently without two of them picking the same row or waiting on
+each other's locks. The claim is then committed by a conditional UPDATE,
+which also keeps claiming safe on databases without row locks (SQLite).
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+from .registry import JobCancelled, JobContext, get_task
+
+logger = logging.getLogger(__name__)
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"[:100]
+
+
+def retry_delay(attempts):
+    """Exponential backoff before the retry following attempt number `attempts` (seconds)"""
+    base = getattr(settings, 'JOB_RETRY_BASE_SECONDS', 30)
+    return min(base * 2 ** (attempts - 1), 3600)
+
+
+def claim_job(worker):
+    """
+    Claim the next runnable job for `worker`.
+
+    Returns:
+        Job: The claimed job (status running), or None if nothing is runnable
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = (
+            Job.objects
+            .filter(status=Job.QUEUED, run_after__lte=now)
+            .order_by('-priority', 'id')
+            .values_list('pk', flat=True)
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        for pk in candidates[:5]:
+            claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+                status=Job.RUNNING, worker=worker, attempts=F('attempts') + 1,
+                started_at=now, heartbeat_at=now, finished_at=None,
+            )
+            if claimed:
+                return Job.objects.get(pk=pk)
+    return None
+
+
+def _heartbeat(job, stop_event):
+    """Keep a running job's heartbeat fresh even if it never reports progress"""
+    interval = getattr(settings, 'JOB_HEARTBEAT_TIMEOUT', 600) / 4
+    try:
+        while not stop_event.wait(interval):
+            Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(heartbeat_at=timezone.now())
+    finally:
+        connection.close()
+
+
+def _finish(job, **values):
+    # Only the claiming worker may finish a job (it may have been requeued as stale)
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(
+        finished_at=timezone.now(), heartbeat_at=timezone.now(), **values
+    )
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome (success, retry, failure or cancellation)"""
+    spec = get_task(job.name)
+    if spec is None:
+        _finish(job, status=Job.FAILED, error=f"Unknown job: {job.name}")
+        return
+    if job.cancel_requested:
+        _finish(job, status=Job.CANCELLED)
+        return
+
+    logger.info("Running job %s (attempt %s/%s)", job, job.attempts, job.max_attempts)
+    beating = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job, beating), daemon=True).start()
+    try:
+        result = spec.func(JobContext(job), **job.payload)
+    except JobCancelled:
+        logger.info("Job %s cancelled", job)
+        _finish(job, status=Job.CANCELLED)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            delay = retry_delay(job.attempts)
+            logger.warning("Job %s failed, retrying in %ss", job, delay, exc_info=True)
+            Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(
+                status=Job.QUEUED, error=error, worker='',
+                run_after=timezone.now() + timedelta(seconds=delay),
+            )
+        else:
+            logger.error("Job %s failed after %s attempts", job, job.attempts, exc_info=True)
+            _finish(job, status=Job.FAILED, error=error)
+    else:
+        _finish(job, status=Job.SUCCEEDED, result=result, error='')
+    finally:
+        beating.set()
+
+
+def requeue_stale_jobs(timeout=None):
+    """
+    Requeue running jobs whose worker stopped sending heartbeats (killed or
+    crashed); each requeue still counts as an attempt.
+
+    Returns:
+        int: Number of jobs requeued or failed
+    """
+    timeout = timeout or getattr(settings, 'JOB_HEARTBEAT_TIMEOUT', 600)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=timezone.now(), error='Worker stopped responding'
+    )
+    requeued = stale.update(status=Job.QUEUED, worker='', run_after=timezone.now())
+    return failed + requeued
+
+
+def work(stop_event, poll_interval=2.0, once=False):
+    """
+    Worker loop: claim and run jobs until `stop_event` is set (or, with
+    `once`, until the queue has nothing runnable).
+    """
+    name = worker_name()
+    try:
+        while not stop_event.is_set():
+            close_old_connections()
+            try:
+                job = claim_job(name)
+            except DatabaseError:
+                # Database restarting / unreachable: back off instead of dying
+                logger.exception("Could not claim a job")
+                connection.close()
+                stop_event.wait(poll_interval)
+                continue
+            if job is None:
+                if once:
+                    break
+                stop_event.wait(poll_interval)
+                continue
+            run_job(job)
+    finally:
+        connection.close()
@@ -56,6 +56,7 @@ INSTALLED_APPS = [
     'core',
     'django_filters',
     'dues',
+    'jobs',
 ]
 
 MIDDLEWARE = [
@@ -107,6 +108,80 @@ DATABASES = {
     }
 }
 
+# Optional read replica for dashboard/statistics reads (see ssp.db_router)
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.getenv('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.getenv('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['ssp.db_router.ReplicaRouter']
+REPLICA_DATABASE_ALIAS = 'replica'
+# After a write, the user's reads stay on the primary this long (read-your-writes)
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 30))
+# Tests read from the primary only (see ssp.test_runner)
+TEST_RUNNER = 'ssp.test_runner.PrimaryOnlyTestRunner'
+
+# The default per-process cache is fine for a single worker (development);
+# with several workers point CACHE_BACKEND at a shared cache (e.g.
+# django.core.cache.backends.redis.RedisCache) so invalidations reach all of
+# them. settings_production defaults to a shared file cache, and
+# `manage.py check --deploy` fails on a per-process cache (core.checks)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Lifetime of cached /api/profile/ and /api/staff/profile/ payloads (seconds)
+PROFILE_CACHE_SECONDS = int(os.getenv('PROFILE_CACHE_SECONDS', 300))
+
+# Department dashboard aggregates (dues.cache): lifetime, and how long a
+# worker may miss an invalidation made by another worker (seconds)
+DASHBOARD_CACHE_SECONDS = int(os.getenv('DASHBOARD_CACHE_SECONDS', 300))
+DASHBOARD_CACHE_VERSION_TTL = int(os.getenv('DASHBOARD_CACHE_VERSION_TTL', 2))
+
+# Combined /api/dues/summary/: how long each department's query may take
+# (seconds), and the per-process thread pool its queries share
+DASHBOARD_SECTION_TIMEOUT = float(os.getenv('DASHBOARD_SECTION_TIMEOUT', 5))
+DASHBOARD_SUMMARY_THREADS = int(os.getenv('DASHBOARD_SUMMARY_THREADS', 10))
+
+# Background jobs (manage.py run_workers): backoff before the first retry
+# (doubling per attempt), how long a running job may go without a
+# heartbeat before it is considered abandoned, and how often run_workers
+# looks for such jobs (seconds)
+JOB_RETRY_BASE_SECONDS = int(os.getenv('JOB_RETRY_BASE_SECONDS', 30))
+JOB_HEARTBEAT_TIMEOUT = int(os.getenv('JOB_HEARTBEAT_TIMEOUT', 600))
+JOB_STALE_SWEEP_SECONDS = int(os.getenv('JOB_STALE_SWEEP_SECONDS', 60))
+# Upper bound on the fuzzy-matching processes a queued legacy import may start
+JOB_IMPORT_MAX_WORKERS = int(os.getenv('JOB_IMPORT_MAX_WORKERS', 4))
+
+# ?since= delta sync on the dues lists: how long deletions are remembered
+# (older `since` values get 410 and must reload in full), and how far each
+# sync token reaches back to catch rows committed late by long transactions
+DELTA_SYNC_TOMBSTONE_DAYS = int(os.getenv('DELTA_SYNC_TOMBSTONE_DAYS', 30))
+DELTA_SYNC_OVERLAP_SECONDS = int(os.getenv('DELTA_SYNC_OVERLAP_SECONDS', 10))
+
+# Library/sports feed sync (dues.sync): the largest share of the stored
+# records a dump may delete without --allow-mass-delete
+FEED_SYNC_MAX_DELETE_FRACTION = float(os.getenv('FEED_SYNC_MAX_DELETE_FRACTION', 0.2))
+
+# /api/dues/events/ (dues.streams) is only served under ASGI. The current
+# deployment runs gunicorn (WSGI), where it answers 503, so the event stream
+# is off until an ASGI server (e.g. uvicorn ssp.asgi:application) serves that
+# path. The in-process broker only reaches streams in the process that made
+# the change; with the API under WSGI and the stream under a separate ASGI
+# server use utils.events.CacheBroker, which requires a Redis or Memcached
+# CACHE_BACKEND. Stream tickets (events/ticket/) are valid this many seconds
+EVENT_BROKER = os.getenv('EVENT_BROKER', 'utils.events.InProcessBroker')
+EVENT_STREAM_TICKET_SECONDS = int(os.getenv('EVENT_STREAM_TICKET_SECONDS', 60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -127,6 +202,20 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing cost (PBKDF2 iterations). Existing hashes are upgraded or
+# downgraded transparently on each user's next login. Benchmark with
+# `python manage.py benchmark_login` before changing it.
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', 1000000))
+
+PASSWORD_HASHERS = [
+    'core.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -159,7 +248,7 @@ AUTHENTICATION_BACKENDS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -178,8 +267,17 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': False,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Checks core.revocation before minting new access tokens
+    'TOKEN_REFRESH_SERIALIZER': 'core.serializers.RevocationAwareTokenRefreshSerializer',
 }
 
+# How long a worker trusts its cached User.is_active before re-checking (seconds)
+JWT_ACTIVE_CHECK_SECONDS = int(os.getenv('JWT_ACTIVE_CHECK_SECONDS', 60))
+
+# How often each worker pulls new token revocations, and rebuilds its filter (seconds)
+JWT_REVOCATION_REFRESH_SECONDS = int(os.getenv('JWT_REVOCATION_REFRESH_SECONDS', 5))
+JWT_REVOCATION_REBUILD_SECONDS = int(os.getenv('JWT_REVOCATION_REBUILD_SECONDS', 3600))
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
@@ -3,8 +3,11 @@ Production settings for ssp project.
 """
 
 from .settings import *
+import importlib.util
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
 
@@ -28,6 +31,37 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Database connections
+# Reuse each worker's connection across requests instead of paying the
+# connect + TLS + auth round trips every time; health checks replace a
+# connection the server dropped before it is handed to a request.
+for database in DATABASES.values():
+    database['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', 600))
+    database['CONN_HEALTH_CHECKS'] = True
+
+# Alternatively DB_POOL=1 uses psycopg 3's connection pool (needs
+# `pip install "psycopg[binary,pool]"`); each worker process keeps its own pool.
+if os.getenv('DB_POOL', '').lower() in ('1', 'true', 'yes'):
+    if importlib.util.find_spec('psycopg_pool') is None:
+        raise ImproperlyConfigured('DB_POOL requires psycopg 3 with the pool extra ("psycopg[binary,pool]")')
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 0  # Django refuses persistent connections with a pool
+        database['OPTIONS'] = {**database.get('OPTIONS', {}), 'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+        }}
+
+# Caches must be shared by all gunicorn workers for invalidation (profiles,
+# dashboards, replica stickiness) to reach every worker. Without an explicit
+# CACHE_BACKEND use a file cache, which every worker on this host shares.
+if not os.getenv('CACHE_BACKEND'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_LOCATION') or '/var/tmp/ssp-cache',
+    }
+
 # Security settings
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
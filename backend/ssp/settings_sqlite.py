@@ -0,0 +1,24 @@
+"""
+Local settings with a SQLite primary and a SQLite "replica", for trying the
+read-replica routing without PostgreSQL.
+
+    DJANGO_SETTINGS_MODULE=ssp.settings_sqlite python manage.py migrate
+    cp db.sqlite3 replica.sqlite3      # "replicate"; repeat to catch the replica up
+
+Writes only go to db.sqlite3, so until the file is copied again the replica
+lags behind, which makes stickiness after a write easy to observe.
+"""
+
+from .settings import *
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
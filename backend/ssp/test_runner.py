@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class PrimaryOnlyTestRunner(DiscoverRunner):
+    """
+    Run the tests with every read on the primary.
+
+    The replica is a TEST MIRROR of the primary, but on its own connection,
+    which can't see a TestCase's uncommitted data (with SQLite it even
+    deadlocks on the shared in-memory database). Tests that exercise the
+    routing opt back in with override_settings(REPLICA_DATABASE_ALIAS=...).
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._replica_alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+        settings.REPLICA_DATABASE_ALIAS = None
+
+    def teardown_test_environment(self, **kwargs):
+        settings.REPLICA_DATABASE_ALIAS = self._replica_alias
+        super().teardown_test_environment(**kwargs)
@@ -24,6 +24,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('core.urls')),
     path('api/dues/', include('dues.urls')),
+    path('api/jobs/', include('jobs.urls')),
     
     # # Dashboard routes
     # path('dashboard/library/', TemplateView.as_view(template_name='dashboard/library.html'), name='library_dashboard'),
@@ -0,0 +1,161 @@
+# Two-tier caching for expensive, shared read-only aggregates
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache as shared_cache
+
+
+class LocalLRU:
+    """Small thread-safe in-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TwoTierCache:
+    """
+    Per-process LRU in front of Django's shared cache, with namespace
+    versions and single-flight recomputation.
+
+    Keys embed the current version of every namespace they depend on, so
+    bumping a namespace (on a model save/delete) makes all its entries
+    unreachable at once without deleting anything. A worker caches the
+    version numbers it reads for `version_ttl` seconds, which bounds how
+    long it can serve an entry another worker has invalidated.
+
+    On a miss in both tiers only the worker that wins a `cache.add` lock
+    recomputes; the others wait for its result, so a cold key under load
+    is computed once instead of once per request.
+
+    Single-flight and race-free bumps need a shared cache with atomic add()
+    and incr(), i.e. Redis or Memcached. On the file cache (the production
+    default without CACHE_BACKEND) both are read-then-write: two workers can
+    occasionally both win the lock and compute the same value, and two
+    simultaneous bumps can collapse into one, leaving an entry computed
+    between them cached until it expires. Single-flight is best-effort there.
+
+    Args:
+        prefix: Key prefix in the shared cache
+        timeout: Lifetime of cached values (seconds)
+        local_timeout: Lifetime of values in the in-process tier (seconds)
+        version_ttl: How long a worker trusts a namespace version it read (seconds)
+        lock_timeout: Expiry of the recompute lock, in case its holder dies
+        wait_timeout: How long a waiter polls before computing itself
+    """
+
+    def __init__(self, prefix, timeout=300, local_timeout=30, version_ttl=2,
+                 lock_timeout=60, wait_timeout=30, poll_interval=0.05, max_local_entries=256):
+        self.prefix = prefix
+        self.timeout = timeout
+        self.local_timeout = min(local_timeout, timeout)
+        self.version_ttl = version_ttl
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.local = LocalLRU(max_local_entries)
+        self._versions = {}
+
+    def _version_key(self, namespace):
+        return f"{self.prefix}:version:{namespace}"
+
+    def version(self, namespace):
+        """Current version of `namespace` (read from the shared cache at most every version_ttl seconds)"""
+        cached = self._versions.get(namespace)
+        now = time.monotonic()
+        if cached and now - cached[1] < self.version_ttl:
+            return cached[0]
+        key = self._version_key(namespace)
+        version = shared_cache.get(key)
+        if version is None:
+            # Missing or evicted: start from a value no earlier version can equal
+            shared_cache.add(key, time.time_ns(), None)
+            version = shared_cache.get(key)
+        self._versions[namespace] = (version, now)
+        return version
+
+    def bump(self, *namespaces):
+        """Invalidate every entry that depends on any of `namespaces`"""
+        for namespace in namespaces:
+            key = self._version_key(namespace)
+            try:
+                version = shared_cache.incr(key)
+            except ValueError:
+                version = time.time_ns()
+                shared_cache.set(key, version, None)
+            self._versions[namespace] = (version, time.monotonic())
+
+    def get_or_compute(self, namespaces, key, compute):
+        """
+        Return the cached value for `key`, computing it at most once across workers.
+
+        Args:
+            namespaces: Namespaces the value depends on
+            key: Identifies the value within those namespaces (e.g. path + query string)
+            compute: Callable returning (value, cacheable); uncacheable results
+                (errors) are returned without being stored
+
+        Returns:
+            The cached or freshly computed value
+        """
+        versions = ','.join(f"{namespace}.{self.version(namespace)}" for namespace in namespaces)
+        full_key = f"{self.prefix}:{versions}:{key}"
+
+        value = self.local.get(full_key)
+        if value is not None:
+            return value
+        value = shared_cache.get(full_key)
+        if value is not None:
+            self.local.set(full_key, value, self.local_timeout)
+            return value
+
+        lock_key = f"{full_key}:lock"
+        if shared_cache.add(lock_key, True, self.lock_timeout):
+            try:
+                return self._compute_and_store(full_key, compute)
+            finally:
+                shared_cache.delete(lock_key)
+
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            value = shared_cache.get(full_key)
+            if value is not None:
+                self.local.set(full_key, value, self.local_timeout)
+                return value
+            if shared_cache.get(lock_key) is None:
+                break
+        # The holder failed or is too slow: compute without the lock
+        return self._compute_and_store(full_key, compute)
+
+    def _compute_and_store(self, full_key, compute):
+        value, cacheable = compute()
+        if cacheable:
+            shared_cache.set(full_key, value, self.timeout)
+            self.local.set(full_key, value, self.local_timeout)
+        return value
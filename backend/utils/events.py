@@ -0,0 +1,181 @@
+"""
+Publish/subscribe of change events for server-sent event streams.
+
+Writers call get_broker().publish(event) from ordinary sync code; each open
+stream holds a Subscription, an asyncio queue on the ASGI event loop. The
+broker class is chosen by settings.EVENT_BROKER:
+
+- InProcessBroker (default): fan-out inside one process. Enough when the
+  writes and the streams are served by the same ASGI process.
+- CacheBroker: events go through Django's shared cache and every process
+  polls it once per interval (not once per client), so WSGI workers can
+  publish to streams held by a separate ASGI server. Event numbering relies
+  on an atomic cache incr(), so it requires Redis or Memcached.
+"""
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache as shared_cache
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One stream's queue of events; slow readers lose the oldest events rather than grow memory"""
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def deliver(self, event):
+        # Runs on self.loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        """Next event, or None after `timeout` seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessBroker:
+    """
+    Thread-safe in-process fan-out with a short history, so a reconnecting
+    client (Last-Event-ID) gets the events it missed.
+
+    Event ids start from the current time in milliseconds, so they keep
+    increasing across restarts.
+    """
+
+    def __init__(self, history=1000, queue_size=1000):
+        self.queue_size = queue_size
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(time.time_ns() // 1_000_000)
+
+    def publish(self, event):
+        """Send `event` (a JSON-serializable dict) to every subscriber"""
+        self.dispatch({**event, 'id': next(self._ids)})
+
+    def dispatch(self, event):
+        with self._lock:
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Its event loop is gone
+                self.unsubscribe(subscription)
+
+    def subscribe(self, last_event_id=None):
+        """New Subscription on the running event loop, primed with the events after `last_event_id`"""
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+            missed = [event for event in self._history if last_event_id is not None and event['id'] > last_event_id]
+        for event in missed:
+            subscription.deliver(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def has_subscribers(self):
+        """Whether publishing can reach anyone (lets writers skip building events)"""
+        return bool(self._subscribers)
+
+
+class CacheBroker(InProcessBroker):
+    """
+    InProcessBroker fed through the shared cache: publish() stores the event
+    under a sequence number, and one poller task per process reads new
+    sequence numbers and dispatches them to its local subscribers.
+
+    Two publishers must never get the same sequence number, so the default
+    cache has to implement incr() atomically (Redis or Memcached; the file
+    and local-memory caches read and rewrite the value).
+    """
+    atomic_cache_backends = (
+        'django.core.cache.backends.redis.RedisCache',
+        'django.core.cache.backends.memcached.PyMemcacheCache',
+        'django.core.cache.backends.memcached.PyLibMCCache',
+        'django_redis.cache.RedisCache',
+    )
+
+    def __init__(self, prefix='events', ttl=300, poll_interval=0.5, **kwargs):
+        backend = settings.CACHES.get('default', {}).get('BACKEND')
+        if backend not in self.atomic_cache_backends:
+            raise ImproperlyConfigured(
+                f"CacheBroker needs a cache with atomic incr() (Redis or Memcached), not {backend}"
+            )
+        super().__init__(**kwargs)
+        self.prefix = prefix
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._poller = None
+
+    def _key(self, name):
+        return f"{self.prefix}:{name}"
+
+    def has_subscribers(self):
+        # Subscribers may live in other processes
+        return True
+
+    def publish(self, event):
+        shared_cache.add(self._key('seq'), 0, None)
+        seq = shared_cache.incr(self._key('seq'))
+        shared_cache.set(self._key(seq), {**event, 'id': seq}, self.ttl)
+
+    def subscribe(self, last_event_id=None):
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+        return super().subscribe(last_event_id)
+
+    async def _poll(self):
+        last = await shared_cache.aget(self._key('seq')) or 0
+        while self._subscribers:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                seq = await shared_cache.aget(self._key('seq')) or 0
+                if seq < last:
+                    # The counter was evicted or the cache flushed: start over
+                    last = seq
+                if seq == last:
+                    continue
+                events = await shared_cache.aget_many([self._key(n) for n in range(last + 1, seq + 1)])
+                for n in range(last + 1, seq + 1):
+                    event = events.get(self._key(n))
+                    if event is not None:
+                        self.dispatch(event)
+                last = seq
+            except Exception:
+                logger.exception("Polling the event cache failed")
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The process-wide broker configured by settings.EVENT_BROKER"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'EVENT_BROKER', 'utils.events.InProcessBroker'))()
+    return _broker
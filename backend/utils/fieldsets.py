@@ -0,0 +1,145 @@
+"""
+Sparse fieldsets: ?fields= / ?exclude= on read endpoints.
+
+    ?fields=id,fine_amount,student.user.username
+    ?exclude=student.user.email,student.mobile_number
+
+Dotted names reach into nested serializers. DynamicFieldsMixin prunes a
+serializer's fields (nested ones included); SparseFieldsetMixin makes a
+viewset's list/retrieve query match what is left, with select_related() for
+the nested relations still serialized and only() for the columns they read,
+so narrower responses also mean narrower queries. Unknown names are ignored.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def parse_fieldset(value):
+    """'id,student.user.username' -> {'id': {}, 'student': {'user': {'username': {}}}}"""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def _nested(field):
+    field = getattr(field, 'child', field)
+    return field if isinstance(field, serializers.Serializer) else None
+
+
+def apply_fieldset(serializer, include=None, exclude=None):
+    """
+    Drop fields of `serializer` (and of its nested serializers) in place.
+
+    Args:
+        serializer: Serializer instance
+        include: parse_fieldset() tree of the fields to keep; a name with no
+            children keeps the whole (nested) field. None keeps everything
+        exclude: parse_fieldset() tree of the fields to drop
+    """
+    fields = serializer.fields
+    if include is not None:
+        for name in list(fields):
+            if name not in include:
+                fields.pop(name)
+        for name, children in include.items():
+            nested = _nested(fields[name]) if children and name in fields else None
+            if nested is not None:
+                apply_fieldset(nested, include=children)
+    for name, children in (exclude or {}).items():
+        if name not in fields:
+            continue
+        if not children:
+            fields.pop(name)
+        elif _nested(fields[name]) is not None:
+            apply_fieldset(_nested(fields[name]), exclude=children)
+
+
+class DynamicFieldsMixin:
+    """
+    Serializer mixin honouring ?fields= / ?exclude= of the request in its
+    context (safe methods only), or explicit `fields=` / `exclude=`
+    parse_fieldset() trees passed to the constructor.
+    """
+
+    def __init__(self, *args, **kwargs):
+        include = kwargs.pop('fields', None)
+        exclude = kwargs.pop('exclude', None)
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if include is None and exclude is None and request is not None and request.method in SAFE_METHODS:
+            params = getattr(request, 'query_params', request.GET)
+            include = parse_fieldset(params['fields']) if params.get('fields') else None
+            exclude = parse_fieldset(params['exclude']) if params.get('exclude') else None
+        if include is not None or exclude is not None:
+            apply_fieldset(self, include, exclude)
+
+
+def _projection(serializer, model, prefix, columns, related):
+    """Collect the only() columns and select_related() paths `serializer` reads from `model`"""
+    whole_row = False
+    columns.add(prefix + model._meta.pk.name)
+    for field in serializer.fields.values():
+        if field.source == '*':
+            # SerializerMethodField and friends get the whole object
+            whole_row = True
+            continue
+        current, path = model, prefix
+        attrs = field.source.split('.')
+        for position, attr in enumerate(attrs):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                # A property or method: it may read any column of this model
+                if current is model:
+                    whole_row = True
+                else:
+                    columns.update(path + f.name for f in current._meta.concrete_fields)
+                break
+            if not model_field.concrete:
+                # Reverse relations are loaded separately
+                break
+            columns.add(path + attr)
+            if not model_field.is_relation:
+                break
+            is_last = position == len(attrs) - 1
+            nested = _nested(field)
+            if is_last and nested is None:
+                # Serialized as the related primary key: the FK column is enough
+                break
+            related.add(path + attr)
+            current, path = model_field.related_model, f"{path}{attr}__"
+            if is_last:
+                _projection(nested, current, path, columns, related)
+    if whole_row:
+        columns.update(prefix + f.name for f in model._meta.concrete_fields)
+
+
+def project_queryset(queryset, serializer):
+    """
+    `queryset` with select_related() and only() matching the fields of
+    `serializer`, a (pruned) serializer for its model.
+    """
+    serializer = getattr(serializer, 'child', serializer)
+    columns, related = set(), set()
+    _projection(serializer, queryset.model, '', columns, related)
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    return queryset.only(*sorted(columns))
+
+
+class SparseFieldsetMixin:
+    """
+    ViewSet mixin fitting the list/retrieve query to the serialized fields
+    (after ?fields= / ?exclude= pruning by DynamicFieldsMixin).
+    """
+    sparse_fieldset_actions = ('list', 'retrieve')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method in SAFE_METHODS and self.action in self.sparse_fieldset_actions:
+            queryset = project_queryset(queryset, self.get_serializer())
+        return queryset
@@ -0,0 +1,39 @@
+# Paginators for large admin changelists
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses PostgreSQL's planner estimate (pg_class.reltuples)
+    instead of COUNT(*) for unfiltered querysets on large tables.
+
+    Filtered querysets, small tables and non-PostgreSQL databases fall back
+    to an exact count, so the numbers are only approximate where an exact
+    count would be expensive anyway.
+    """
+    # Below this many rows an exact COUNT(*) is cheap enough
+    exact_count_threshold = 50000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if getattr(queryset, 'query', None) is not None and not queryset.query.where:
+            estimate = self._estimated_count(queryset)
+            if estimate is not None and estimate > self.exact_count_threshold:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def _estimated_count(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] and row[0] > 0 else None
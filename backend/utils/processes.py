@@ -0,0 +1,64 @@
+"""
+Process pools that are safe to start from threaded processes.
+
+Forking copies a single thread out of a multi-threaded parent (the job
+workers of run_workers, gunicorn threads), along with any lock another
+thread happened to hold, such as the logging or database driver locks, and
+the child can deadlock on them. These helpers spawn fresh interpreters
+instead.
+"""
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _setup_django(initializer, initargs):
+    import django
+    django.setup()
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def spawn_pool(max_workers, initializer=None, initargs=(), django_setup=False):
+    """
+    ProcessPoolExecutor whose workers are spawned rather than forked.
+
+    Args:
+        max_workers: Number of worker processes
+        initializer: Optional callable run once in each worker
+        initargs: Arguments of `initializer` (pickled once per worker)
+        django_setup: Run django.setup() in each worker first, for tasks that
+            use the ORM (DJANGO_SETTINGS_MODULE is inherited from the parent)
+    """
+    if django_setup:
+        initializer, initargs = _setup_django, (initializer, initargs)
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=initializer,
+        initargs=initargs,
+    )
+
+
+def _run_with_django(target, args):
+    import django
+    django.setup()
+    module, _, name = target.rpartition('.')
+    getattr(importlib.import_module(module), name)(*args)
+
+
+def spawn_process(target, args=()):
+    """
+    Start a spawned process that sets Django up and calls `target`.
+
+    Args:
+        target: Dotted path of the function to run; a path rather than the
+            function, since importing its module may need the app registry
+        args: Its (picklable) arguments
+
+    Returns:
+        The started multiprocessing Process
+    """
+    process = multiprocessing.get_context('spawn').Process(target=_run_with_django, args=(target, args))
+    process.start()
+    return process
@@ -0,0 +1,97 @@
+"""
+Columnar JSON rendering (?format=columnar) for large grouped listings.
+
+A list of objects is sent as one table: the column names once, then one
+value array per column, instead of repeating every key for every object.
+
+    {"length": 2,
+     "columns": ["roll_numbers", "name", "course", "user.username", ...],
+     "values": [[["21MBA01"], ["21MBA02"]], ["A", "B"], [0, 0], ...],
+     "dictionaries": {"course": ["MBA"]},
+     "children": {"records": {"length": 3, "columns": ["_parent", "id", ...], ...}}}
+
+- Nested objects become dotted columns (user.username).
+- Lists of objects become child tables whose `_parent` column is the index
+  of the row they belong to.
+- Low-cardinality string columns (course, batch) are dictionary-encoded:
+  the values are indexes into `dictionaries[column]`, and null stays null.
+
+A paginated payload keeps its other keys and gets `results` encoded this
+way. Anything else, such as error bodies, is rendered as plain JSON.
+"""
+from rest_framework.renderers import JSONRenderer
+
+
+def _is_table(value):
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+
+def _flatten(obj, prefix, flat, children, parent):
+    for key, value in obj.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            _flatten(value, f"{name}.", flat, children, parent)
+        elif _is_table(value):
+            children.setdefault(name, []).extend({'_parent': parent, **item} for item in value)
+        else:
+            flat[name] = value
+
+
+def encode_table(rows, dictionary_columns=()):
+    """
+    Encode a list of dicts column-wise.
+
+    Args:
+        rows: List of (possibly nested) dicts
+        dictionary_columns: Column names (last dotted part) to dictionary-encode
+            when all their values are strings
+
+    Returns:
+        dict: length, columns, values and, when present, dictionaries and children
+    """
+    columns = {}
+    children = {}
+    for index, row in enumerate(rows):
+        flat = {}
+        _flatten(row, '', flat, children, index)
+        for name, value in flat.items():
+            columns.setdefault(name, [None] * index).append(value)
+        for values in columns.values():
+            if len(values) <= index:
+                values.append(None)
+    # Rows whose list was empty left a plain column behind
+    for name in children:
+        columns.pop(name, None)
+
+    dictionaries = {}
+    for name, values in columns.items():
+        if name.rsplit('.', 1)[-1] not in dictionary_columns:
+            continue
+        if not all(value is None or isinstance(value, str) for value in values):
+            continue
+        codes = {}
+        columns[name] = [None if value is None else codes.setdefault(value, len(codes)) for value in values]
+        dictionaries[name] = list(codes)
+
+    table = {'length': len(rows), 'columns': list(columns), 'values': list(columns.values())}
+    if dictionaries:
+        table['dictionaries'] = dictionaries
+    if children:
+        table['children'] = {
+            name: encode_table(child_rows, dictionary_columns) for name, child_rows in children.items()
+        }
+    return table
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """Renders lists of objects (or a page's `results`) with encode_table()"""
+    media_type = 'application/vnd.columnar+json'
+    format = 'columnar'
+    dictionary_columns = ('course', 'course_name', 'batch')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, list):
+            data = encode_table(data, self.dictionary_columns)
+        elif isinstance(data, dict) and isinstance(data.get('results'), list):
+            data = {**data, 'results': encode_table(data['results'], self.dictionary_columns)}
+        return super().render(data, accepted_media_type, renderer_context)
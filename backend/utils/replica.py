@@ -0,0 +1,72 @@
+# View-level hints for ssp.db_router.ReplicaRouter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from ssp.db_router import reads_from, replica_alias, reset_read_alias, set_read_alias
+
+
+def _pin_key(user_id):
+    return f"replica-pin:{user_id}"
+
+
+def pin_to_primary(user):
+    """Serve `user`'s reads from the primary for REPLICA_STICKY_SECONDS (read-your-writes)"""
+    if user is not None and user.is_authenticated:
+        cache.set(_pin_key(user.pk), True, getattr(settings, 'REPLICA_STICKY_SECONDS', 30))
+
+
+def read_alias_for(request):
+    """
+    Database alias the reads of `request` should use, or None for the primary.
+
+    Only safe requests are routed to the replica, and only for users who
+    haven't written recently.
+    """
+    alias = replica_alias()
+    if alias is None or request.method not in SAFE_METHODS:
+        return None
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and cache.get(_pin_key(user.pk)):
+        return None
+    return alias
+
+
+class ReplicaReadMixin:
+    """
+    Serve a viewset's GET/HEAD/OPTIONS requests from the read replica.
+
+    Authentication still reads from the primary; after a successful write
+    the user is pinned to the primary for a while so they see their change.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        alias = read_alias_for(request)
+        self._read_alias_token = set_read_alias(alias) if alias else None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_read_alias_token', None)
+        if token is not None:
+            reset_read_alias(token)
+            self._read_alias_token = None
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(getattr(request, 'user', None))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def replica_reads(view_func):
+    """
+    ReplicaReadMixin for @api_view functions; apply it below @api_view and
+    @permission_classes so it runs after authentication.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        alias = read_alias_for(request)
+        if alias is None:
+            return view_func(request, *args, **kwargs)
+        with reads_from(alias):
+            return view_func(request, *args, **kwargs)
+    return wrapper
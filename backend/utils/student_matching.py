@@ -0,0 +1,177 @@
+# Student matching helpers for spreadsheet imports
+import re
+from difflib import SequenceMatcher
+
+_NON_ALNUM = re.compile(r'[^A-Z0-9]')
+_NON_ALPHA = re.compile(r'[^A-Z ]')
+_SPACES = re.compile(r'\s+')
+
+# Honorifics and initials noise commonly found in the Admissions sheets
+_NAME_NOISE = {'MR', 'MRS', 'MS', 'SRI', 'SMT', 'KUM', 'DR'}
+
+
+def normalize_roll_number(value):
+    """
+    Normalize a roll number for exact matching.
+
+    Args:
+        value: Raw cell value (str, int or None)
+
+    Returns:
+        str: Upper-cased roll number without spaces or punctuation ('' if empty)
+    """
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return _NON_ALNUM.sub('', str(value).upper())
+
+
+def normalize_name(value):
+    """
+    Normalize a student name for fuzzy matching.
+
+    Tokens are upper-cased, stripped of punctuation and honorifics and sorted,
+    so "Ravi Kumar K." and "K RAVI KUMAR" normalize to the same string.
+    """
+    if not value:
+        return ''
+    cleaned = _NON_ALPHA.sub(' ', str(value).upper())
+    tokens = [t for t in _SPACES.split(cleaned) if t and t not in _NAME_NOISE]
+    return ' '.join(sorted(tokens))
+
+
+def normalize_batch(value):
+    """Reduce a batch value ("2020", "2020-21", 2020.0) to its four digit start year"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    match = re.search(r'(19|20)\d{2}', str(value))
+    return match.group(0) if match else ''
+
+
+def name_block_key(normalized_name):
+    """Fallback blocking key used when a row has no batch: the longest name token"""
+    if not normalized_name:
+        return ''
+    return max(normalized_name.split(' '), key=len)
+
+
+class StudentIndex:
+    """
+    In-memory blocking index over StudentProfile rows.
+
+    Built once per import from a single values_list() query so that matching a
+    row never touches the database:
+      - by_roll:  normalized roll number -> student id (exact matches)
+      - by_batch: batch year -> list of (student id, normalized name, roll)
+      - by_token: longest name token -> list of (student id, normalized name, roll)
+    """
+
+    def __init__(self):
+        self.by_roll = {}
+        self.by_batch = {}
+        self.by_token = {}
+        self.rolls = {}
+
+    @classmethod
+    def build(cls, rows):
+        """
+        Args:
+            rows: Iterable of (student_id, username, first_name, last_name, batch)
+        """
+        index = cls()
+        for student_id, username, first_name, last_name, batch in rows:
+            roll = normalize_roll_number(username)
+            name = normalize_name(f"{first_name or ''} {last_name or ''}")
+            candidate = (student_id, name, roll)
+            index.rolls[student_id] = username
+            if roll:
+                index.by_roll[roll] = student_id
+            if not name:
+                continue
+            batch_key = normalize_batch(batch)
+            if batch_key:
+                index.by_batch.setdefault(batch_key, []).append(candidate)
+            index.by_token.setdefault(name_block_key(name), []).append(candidate)
+        return index
+
+    def __len__(self):
+        return len(self.rolls)
+
+    def exact(self, roll):
+        return self.by_roll.get(roll) if roll else None
+
+    def candidates(self, block_key):
+        """Candidates of a block_for() key"""
+        kind, _, value = block_key.partition(':')
+        return (self.by_batch if kind == 'b' else self.by_token).get(value, [])
+
+    def block_for(self, name, batch):
+        """Return (block key, candidates) for a row that needs fuzzy matching"""
+        if batch and batch in self.by_batch:
+            return f"b:{batch}", self.by_batch[batch]
+        token = name_block_key(name)
+        return f"t:{token}", self.by_token.get(token, [])
+
+
+def fuzzy_match_rows(task):
+    """
+    Fuzzy-match a chunk of rows against their candidate blocks.
+
+    Args:
+        task: (rows, index, min_confidence, min_margin) where rows is a list of
+              (row_key, normalized_name, normalized_roll, block_key) and index is
+              the StudentIndex the block keys came from
+
+    Returns:
+        list: (row_key, student_id or None, confidence) per input row
+    """
+    rows, index, min_confidence, min_margin = task
+    results = []
+    for row_key, name, roll, block_key in rows:
+        best_id, best_score, second_score = None, 0.0, 0.0
+        matcher = SequenceMatcher(autojunk=False)
+        matcher.set_seq2(name)
+        for student_id, candidate_name, candidate_roll in index.candidates(block_key):
+            matcher.set_seq1(candidate_name)
+            boost = bool(roll and candidate_roll)
+            # quick_ratio is an upper bound, so skip candidates that cannot place
+            bound = matcher.quick_ratio()
+            if boost:
+                bound = (bound + 1) / 2
+            if bound < second_score:
+                continue
+            score = matcher.ratio()
+            if boost:
+                # A near-identical roll number (typo) strengthens a name match
+                score = max(score, (score + SequenceMatcher(None, roll, candidate_roll).ratio()) / 2)
+            if score > best_score:
+                best_id, best_score, second_score = student_id, score, best_score
+            elif score > second_score:
+                second_score = score
+        if best_id is not None and best_score >= min_confidence and best_score - second_score >= min_margin:
+            results.append((row_key, best_id, round(best_score, 3)))
+        else:
+            results.append((row_key, None, round(best_score, 3)))
+    return results
+
+
+# Set in each ProcessPoolExecutor worker by init_match_worker
+_worker_index = None
+
+
+def init_match_worker(index):
+    """Pool initializer: hand each worker the StudentIndex once instead of with every task"""
+    global _worker_index
+    _worker_index = index
+
+
+def fuzzy_match_rows_in_worker(task):
+    """
+    fuzzy_match_rows() for a pool started with init_match_worker; top-level
+    (picklable), and the task carries only (rows, min_confidence, min_margin)
+    """
+    rows, min_confidence, min_margin = task
+    return fuzzy_match_rows((rows, _worker_index, min_confidence, min_margin))
@@ -0,0 +1,46 @@
+# Deferring side effects until the surrounding transaction commits
+import threading
+
+from django.db import transaction
+
+
+class CommitBatch:
+    """
+    Collect items during a transaction and hand them to `flush` once, after commit.
+
+    Outside a transaction `flush` runs immediately. Items added inside a
+    savepoint that rolls back are dropped along with it, since Django drops
+    the queued on_commit callback.
+
+    Args:
+        flush: Callable receiving the set of collected items
+    """
+
+    def __init__(self, flush):
+        self.flush = flush
+        self._local = threading.local()
+
+    def _run(self):
+        items, self._local.items = self._local.items, set()
+        self._local.scratch = {}
+        self.flush(items)
+
+    def _queued(self, connection):
+        return connection.in_atomic_block and any(func == self._run for _, func, _ in connection.run_on_commit)
+
+    @property
+    def scratch(self):
+        """Dict for memoizing lookups while collecting; starts empty for every batch"""
+        if not self._queued(transaction.get_connection()):
+            self._local.scratch = {}
+        return self._local.scratch
+
+    def add(self, *items):
+        connection = transaction.get_connection()
+        if not connection.in_atomic_block:
+            self.flush(set(items))
+            return
+        if not self._queued(connection):
+            self._local.items = set()
+            transaction.on_commit(self._run)
+        self._local.items.update(items)